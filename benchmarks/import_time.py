@@ -0,0 +1,82 @@
+"""
+Benchmark: cold-start import time of the utils package.
+
+Each case runs several times, each in a fresh interpreter. A run reports the
+time its statements took and whether they pulled in the Anthropic SDK,
+httpx or NumPy. Interpreter startup is not counted. Compare against another
+checkout by pointing --repo at it.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 20 --repo /path/to/other/checkout
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    "import utils": "import utils",
+    "retry_with_backoff": "from utils import retry_with_backoff",
+    "RateLimiter": "from utils import RateLimiter",
+    "Ledger": "from utils import Ledger",
+    "ClaudeClient()": "from utils import ClaudeClient; ClaudeClient(api_key='benchmark')",
+    "ClaudeClient().client": "from utils import ClaudeClient; ClaudeClient(api_key='benchmark').client",
+}
+
+# Heavy dependencies whose presence after a case is reported
+WATCHED = ("anthropic", "httpx", "numpy")
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {watched!r} if m in sys.modules]}}))
+"""
+
+
+def measure(statement: str, repo: str, repeat: int) -> Dict[str, object]:
+    """Median/min milliseconds of ``statement`` over ``repeat`` fresh interpreters."""
+    times: List[float] = []
+    loaded: List[str] = []
+    env = dict(os.environ, PYTHONPATH=repo, PYTHONDONTWRITEBYTECODE="")
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD.format(statement=statement, watched=WATCHED)],
+            cwd=repo, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["ms"])
+        loaded = result["loaded"]
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "loaded": loaded}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the utils package")
+    parser.add_argument("--repeat", type=int, default=10, help="Fresh interpreters per case")
+    parser.add_argument("--repo", default=REPO_ROOT, help="Checkout to measure (default: this one)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    # One throwaway run so every case sees warm .pyc files
+    measure("import utils; from utils import *", args.repo, 1)
+    results = {name: measure(statement, args.repo, args.repeat) for name, statement in CASES.items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"⏱️  Import time in {args.repo} ({args.repeat} fresh interpreters per case)\n")
+    print(f"{'case':<24} {'median ms':>10} {'min ms':>8}  loads")
+    for name, result in results.items():
+        loaded = ", ".join(result["loaded"]) or "-"
+        print(f"{name:<24} {result['median_ms']:>10.1f} {result['min_ms']:>8.1f}  {loaded}")
+
+
+if __name__ == "__main__":
+    main()
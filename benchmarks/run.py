@@ -0,0 +1,356 @@
+"""
+Load-test benchmark suite for the client utilities and example workloads.
+
+Every scenario runs in a fresh child process against its own local mock
+API server (utils/mock_server.py), so no tokens are spent and client-side
+CPU and memory are measured in isolation. Results are written as JSON to
+benchmarks/results/ and can be compared to spot regressions.
+
+Usage:
+    python benchmarks/run.py                                  # all scenarios
+    python benchmarks/run.py --scenarios client_chat async_chat --concurrency 16
+    python benchmarks/run.py --latency lognormal:0.05,0.5 --label with-latency
+    python benchmarks/run.py --compare benchmarks/results/a.json benchmarks/results/b.json
+
+Scenarios:
+    client_chat       ClaudeClient.chat
+    client_stream     ClaudeClient.chat_stream, fully consumed
+    async_chat        AsyncClaudeClient.chat
+    retry_decorator   retry_with_backoff around a call with 20% injected 429s
+    example:<name>    one full run of examples/<name>.py per request
+"""
+
+import argparse
+import asyncio
+import datetime
+import glob
+import itertools
+import json
+import os
+import platform
+import resource
+import runpy
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+FIXTURES = os.path.join(BENCH_DIR, "fixtures", "examples.json")
+
+sys.path.insert(0, REPO_ROOT)
+
+# Metrics where a higher number is worse, used by --compare
+LOWER_IS_BETTER = ("cpu_ms_per_req", "p50_ms", "p99_ms", "peak_rss_mb")
+HIGHER_IS_BETTER = ("rps",)
+
+# Mock server options per scenario (on top of the suite-wide latency setting)
+MOCK_OPTIONS = {
+    "retry_decorator": ["--rate-limit-rate", "0.2", "--retry-after", "0.01"],
+}
+
+
+def example_names() -> List[str]:
+    paths = sorted(glob.glob(os.path.join(REPO_ROOT, "examples", "[0-9]*.py")))
+    return [os.path.splitext(os.path.basename(p))[0] for p in paths]
+
+
+def all_scenarios() -> List[str]:
+    return ["client_chat", "client_stream", "async_chat", "retry_decorator"] + [f"example:{n}" for n in example_names()]
+
+
+# ----- workloads (run inside the child process) -----
+
+def make_operation(name: str, base_url: str) -> Callable[[], Any]:
+    """Build the callable for one request of a synchronous scenario."""
+    from utils import ClaudeClient, retry_with_backoff
+
+    if name == "client_chat":
+        client = ClaudeClient(api_key="benchmark", base_url=base_url)
+        return lambda: client.chat("Benchmark prompt", max_tokens=256)
+
+    if name == "client_stream":
+        client = ClaudeClient(api_key="benchmark", base_url=base_url)
+
+        def stream() -> None:
+            with client.chat_stream("Benchmark prompt", max_tokens=256) as s:
+                for _ in s:
+                    pass
+        return stream
+
+    if name == "retry_decorator":
+        from anthropic import Anthropic
+
+        # SDK-level retries are disabled so the decorator does the retrying
+        client = Anthropic(api_key="benchmark", base_url=base_url, max_retries=0)
+
+        @retry_with_backoff(max_retries=6, initial_delay=0.01, backoff_factor=2.0)
+        def call() -> Any:
+            return client.messages.create(
+                model="claude-sonnet-4-20250514",
+                max_tokens=256,
+                messages=[{"role": "user", "content": "Benchmark prompt"}],
+            )
+        return call
+
+    if name.startswith("example:"):
+        path = os.path.join(REPO_ROOT, "examples", name.split(":", 1)[1] + ".py")
+        return lambda: runpy.run_path(path, run_name="__main__")
+
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def run_threaded(operation: Callable[[], Any], concurrency: int, requests: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = [0]
+    tickets = itertools.count()
+    lock = threading.Lock()
+
+    def worker() -> None:
+        while next(tickets) < requests:
+            started = time.perf_counter()
+            try:
+                operation()
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"latencies": latencies, "errors": errors[0]}
+
+
+def make_async_runner(base_url: str, concurrency: int, requests: int) -> Callable[[], Dict[str, Any]]:
+    """Warm up an AsyncClaudeClient on its own loop; the returned callable runs the load."""
+    from utils import AsyncClaudeClient
+
+    latencies: List[float] = []
+    errors = [0]
+    loop = asyncio.new_event_loop()
+    client = AsyncClaudeClient(api_key="benchmark", base_url=base_url)
+    loop.run_until_complete(client.chat("Benchmark prompt", max_tokens=256))  # warm-up: imports, connection setup
+
+    async def main() -> None:
+        tickets = itertools.count()
+
+        async def worker() -> None:
+            while next(tickets) < requests:
+                started = time.perf_counter()
+                try:
+                    await client.chat("Benchmark prompt", max_tokens=256)
+                except Exception:
+                    errors[0] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    def run() -> Dict[str, Any]:
+        try:
+            loop.run_until_complete(main())
+        finally:
+            loop.run_until_complete(client.close())
+            loop.close()
+        return {"latencies": latencies, "errors": errors[0]}
+
+    return run
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def child(name: str, base_url: str, concurrency: int, requests: int) -> Dict[str, Any]:
+    """Run one scenario in this (fresh) process and return its metrics."""
+    os.environ["ANTHROPIC_API_KEY"] = "benchmark"
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    # Examples that pause for a reader (09) would otherwise time the pause
+    os.environ["EXAMPLE_READING_SECONDS"] = "0"
+
+    # Examples and the error handlers print a lot; keep it out of the measurements
+    sys.stdout = open(os.devnull, "w")
+
+    if name == "async_chat":
+        runner = make_async_runner(base_url, concurrency, requests)
+    else:
+        operation = make_operation(name, base_url)
+        operation()  # warm-up: imports, connection setup
+        runner = lambda: run_threaded(operation, concurrency, requests)  # noqa: E731
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    outcome = runner()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    done = len(outcome["latencies"])
+    return {
+        "requests": done,
+        "errors": outcome["errors"],
+        "concurrency": concurrency,
+        "wall_s": round(wall, 4),
+        "rps": round(done / wall, 2) if wall else 0.0,
+        "cpu_ms_per_req": round(cpu * 1000 / max(1, done), 3),
+        "p50_ms": round(percentile(outcome["latencies"], 50) * 1000, 3),
+        "p99_ms": round(percentile(outcome["latencies"], 99) * 1000, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+# ----- orchestration (parent process) -----
+
+def start_mock(latency: str, extra: List[str]) -> Tuple[subprocess.Popen, str]:
+    command = [
+        sys.executable, "-m", "utils.mock_server", "--port", "0",
+        "--latency", latency, "--fixtures", FIXTURES, "--seed", "1",
+    ] + extra
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    return process, line.strip().rsplit(" ", 1)[-1]
+
+
+def run_scenario(name: str, args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    mock, base_url = start_mock(args.latency, MOCK_OPTIONS.get(name, []))
+    requests = args.example_runs if name.startswith("example:") else args.requests
+    try:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", name, "--base-url", base_url,
+             "--concurrency", str(args.concurrency), "--requests", str(requests)],
+            cwd=REPO_ROOT, capture_output=True, text=True,
+        )
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    if result.returncode != 0:
+        print(f"❌ {name} failed:\n{result.stderr.strip()[-2000:]}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    header = f"{'scenario':<32} {'req/s':>9} {'cpu ms/req':>11} {'p50 ms':>9} {'p99 ms':>9} {'rss MB':>8} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<32} {r['rps']:>9.1f} {r['cpu_ms_per_req']:>11.2f} {r['p50_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['peak_rss_mb']:>8.1f} {r['errors']:>7}")
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    """Print per-metric changes between two result files. Returns 1 if anything regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+    with open(candidate_path) as f:
+        candidate = json.load(f)["scenarios"]
+
+    regressions = 0
+    print(f"{'scenario':<32} {'metric':<15} {'baseline':>10} {'candidate':>10} {'change':>9}")
+    for name in sorted(set(baseline) & set(candidate)):
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            old, new = baseline[name].get(metric), candidate[name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = change < -threshold if metric in HIGHER_IS_BETTER else change > threshold
+            flag = "  ⚠️" if worse else ""
+            regressions += worse
+            print(f"{name:<32} {metric:<15} {old:>10.2f} {new:>10.2f} {change:>+8.1f}%{flag}")
+
+    print(f"\n{regressions} regression(s) beyond {threshold:.0f}%")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the client utilities against a local mock API")
+    parser.add_argument("--scenarios", nargs="*", help="Scenario names (default: all)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400, help="Requests per client scenario")
+    parser.add_argument("--example-runs", type=int, default=40, help="Runs per example scenario")
+    parser.add_argument("--latency", default="0", help="Mock latency spec (see utils.mock_server.parse_latency)")
+    parser.add_argument("--label", help="Name for the results file (default: timestamp)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"))
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        metrics = child(args.child, args.base_url, args.concurrency, args.requests)
+        sys.__stdout__.write(json.dumps(metrics) + "\n")
+        return
+
+    if args.compare:
+        sys.exit(compare(args.compare[0], args.compare[1], args.threshold))
+
+    names = args.scenarios or all_scenarios()
+    unknown = set(names) - set(all_scenarios())
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in names:
+        print(f"▶ {name}", flush=True)
+        metrics = run_scenario(name, args)
+        if metrics is not None:
+            results[name] = metrics
+
+    print()
+    print_table(results)
+
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    report = {
+        "meta": {
+            "timestamp": stamp,
+            "label": args.label,
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "anthropic": _sdk_version(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "example_runs": args.example_runs,
+            "latency": args.latency,
+        },
+        "scenarios": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{args.label or stamp}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {os.path.relpath(path, REPO_ROOT)}")
+
+
+def _sdk_version() -> Optional[str]:
+    try:
+        import anthropic
+        return anthropic.__version__
+    except ImportError:
+        return None
+
+
+if __name__ == "__main__":
+    main()
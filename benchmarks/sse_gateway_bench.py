@@ -0,0 +1,103 @@
+"""
+Benchmark: SSE gateway fan-out against the local mock API.
+
+Starts the mock Messages API and the SSE gateway in-process, then opens
+many concurrent generations with several subscribers each and reports
+time to first frame, throughput and how well deltas were coalesced.
+No API key or network access is needed.
+
+Usage:
+    python benchmarks/sse_gateway_bench.py --generations 200 --subscribers 3 --flush-interval 0.02
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.client import AsyncClaudeClient  # noqa: E402
+from utils.mock_server import MockAnthropicServer  # noqa: E402
+from utils.sse_gateway import SSEGateway  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def subscribe(http: httpx.AsyncClient, url: str, started: float, results: dict) -> None:
+    first = None
+    frames = 0
+    async with http.stream("GET", url) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                frames += 1
+                if first is None:
+                    first = time.perf_counter() - started
+    results["ttff"].append(first or 0.0)
+    results["frames"].append(frames)
+
+
+async def one_generation(http: httpx.AsyncClient, base: str, subscribers: int, results: dict) -> None:
+    started = time.perf_counter()
+    response = await http.post(f"{base}/v1/generations", json={"message": "Benchmark prompt", "max_tokens": 1024})
+    url = base + response.json()["events_url"]
+    await asyncio.gather(*(subscribe(http, url, started, results) for _ in range(subscribers)))
+    results["latency"].append(time.perf_counter() - started)
+
+
+async def run(args: argparse.Namespace) -> None:
+    mock = MockAnthropicServer(output_tokens=args.tokens, token_delay=args.token_delay)
+    await mock.start()
+
+    client = AsyncClaudeClient(api_key="benchmark", base_url=mock.base_url)
+    gateway = SSEGateway(client, flush_interval=args.flush_interval, cancel_when_unsubscribed=False)
+    port = await gateway.start("127.0.0.1", 0)
+    base = f"http://127.0.0.1:{port}"
+
+    results = {"ttff": [], "frames": [], "latency": []}
+    limits = httpx.Limits(max_connections=args.generations * (args.subscribers + 1))
+    async with httpx.AsyncClient(timeout=60, limits=limits) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(one_generation(http, base, args.subscribers, results) for _ in range(args.generations)))
+        elapsed = time.perf_counter() - started
+
+    stats = gateway.get_stats()
+    await gateway.close()
+    await client.close()
+    await mock.stop()
+
+    print("SSE gateway benchmark")
+    print("=" * 50)
+    print(f"Generations:          {args.generations} x {args.subscribers} subscribers")
+    print(f"Upstream requests:    {mock.requests_served}")
+    print(f"Wall time:            {elapsed:.2f}s ({args.generations / elapsed:.1f} generations/s)")
+    print(f"Time to first frame:  p50 {percentile(results['ttff'], 50) * 1000:.1f}ms, p99 {percentile(results['ttff'], 99) * 1000:.1f}ms")
+    print(f"Generation latency:   p50 {percentile(results['latency'], 50) * 1000:.1f}ms, p99 {percentile(results['latency'], 99) * 1000:.1f}ms")
+    print(f"Deltas received:      {stats['deltas_received']}")
+    print(f"Frames published:     {stats['frames_published']} ({stats['deltas_received'] / max(1, stats['frames_published']):.1f} deltas/frame)")
+    print(f"Frames per client:    {statistics.mean(results['frames']):.1f}")
+    print(f"Socket writes:        {stats['socket_writes']} ({stats['bytes_written'] / 1024:.0f} KiB)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--generations", type=int, default=100)
+    parser.add_argument("--subscribers", type=int, default=3)
+    parser.add_argument("--tokens", type=int, default=200, help="Text deltas per upstream response")
+    parser.add_argument("--token-delay", type=float, default=0.001, help="Mock seconds between deltas")
+    parser.add_argument("--flush-interval", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,9 @@ Claude: The capital of France is Paris. It has been the capital since...
 """
 
 import os
-from anthropic import Anthropic
+
+from utils import get_client
+from utils.ledger import estimate_cost
 
 # Load API key from environment variable
 # Make sure to set ANTHROPIC_API_KEY in your .env file
@@ -24,7 +26,7 @@ if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
 # Initialize the client
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
 # Send a message and get a response
 message = client.messages.create(
@@ -47,4 +49,5 @@ print(f"\n--- Metadata ---")
 print(f"Model: {message.model}")
 print(f"Input tokens: {message.usage.input_tokens}")
 print(f"Output tokens: {message.usage.output_tokens}")
+print(f"Estimated cost: ${estimate_cost(message.model, message.usage):.6f}")
 print(f"Stop reason: {message.stop_reason}")
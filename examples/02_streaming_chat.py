@@ -20,14 +20,16 @@ Benefits of streaming:
 """
 
 import os
-from anthropic import Anthropic
+
+from utils import get_client
+from utils.ledger import estimate_cost
 
 # Initialize client
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
 print("Claude: ", end="", flush=True)
 
@@ -52,4 +54,5 @@ print("\n")  # New line after response completes
 final_message = stream.get_final_message()
 print(f"--- Metadata ---")
 print(f"Total tokens used: {final_message.usage.input_tokens + final_message.usage.output_tokens}")
+print(f"Estimated cost: ${estimate_cost(final_message.model, final_message.usage):.6f}")
 print(f"Stop reason: {final_message.stop_reason}")
@@ -15,13 +15,14 @@ Professional Claude: Thank you for your inquiry. The world's oceans include...
 """
 
 import os
-from anthropic import Anthropic
+
+from utils import get_client
 
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
 # Example 1: Role-playing system prompt
 print("=== Example 1: Pirate Assistant ===\n")
@@ -20,13 +20,14 @@ Sample output:
 
 import os
 import json
-from anthropic import Anthropic
+
+from utils import get_client
 
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
 # Example 1: Extract structured data from text
 print("=== Example 1: Extract Structured Data ===\n")
@@ -8,35 +8,39 @@ This example shows:
 - Security vulnerability detection
 - Best practice recommendations
 - Actionable improvement suggestions
+- Several review lenses (general, security, performance, style) in one request
 
 Sample output:
 ---------------
-🔍 Code Review for example.py
-━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-✓ STRENGTHS:
-- Good error handling with try/except
-- Clear function naming
-
-⚠️  ISSUES FOUND:
-1. [SECURITY] SQL injection vulnerability on line 12
-2. [PERFORMANCE] Inefficient loop on line 25
-3. [STYLE] Missing docstrings
-
-💡 SUGGESTIONS:
-- Use parameterized queries for database access
-- Consider using list comprehension instead of loop
-- Add type hints for better code clarity
+🔍 Code Review Session
+==================================================
+Fetches user rows from SQLite and doubles the positive numbers in a list.
+
+🧭 GENERAL (1)
+- line 4: [medium] Connection is not closed if the query fails. Fix: use a with block
+
+🔒 SECURITY (1)
+- line 9: [critical] SQL injection via f-string query. Fix: cursor.execute("... WHERE id = ?", (user_id,))
+
+⚡ PERFORMANCE (1)
+- line 19: [low] Loop with append. Fix: [item * 2 for item in items if item > 0]
+
+🎨 STYLE (1)
+- line 2: [low] Missing docstrings and type hints. Fix: document parameters and return values
+
+📊 1 API call, 412 input tokens
 """
 
 import os
-from anthropic import Anthropic
+
+from utils import get_client
+from utils.code_review import review_code
 
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
 # Code to review (intentionally has issues for demonstration)
 code_to_review = """
@@ -66,56 +70,34 @@ def process_items(items):
 print("🔍 Code Review Session")
 print("=" * 50)
 
-message = client.messages.create(
+# One request reviews the code through every lens. The code is sent (and
+# billed) once, so adding a lens only adds its findings to the reply instead
+# of a full re-send of the code.
+review = review_code(
+    code_to_review,
+    lenses=["general", "security", "performance", "style"],
+    client=client,
     model="claude-sonnet-4-20250514",
-    max_tokens=2048,
-    temperature=0.3,  # Lower temperature for more consistent technical analysis
-    system="""You are an expert code reviewer with deep knowledge of security, performance, and best practices.
-
-Review code and provide:
-1. A brief summary of what the code does
-2. Security vulnerabilities (mark as [SECURITY])
-3. Performance issues (mark as [PERFORMANCE])
-4. Code quality issues (mark as [STYLE])
-5. Specific, actionable suggestions for improvement
-
-Format your review clearly with sections and bullet points.""",
-    messages=[
-        {
-            "role": "user",
-            "content": f"Please review this Python code:\n\n```python\n{code_to_review}\n```"
-        }
-    ]
 )
 
-print(message.content[0].text)
+print(review.summary)
 
-# Example 2: Get a specific security audit
-print("\n\n🔒 Security-Focused Review")
-print("=" * 50)
+icons = {"general": "🧭", "security": "🔒", "performance": "⚡", "style": "🎨"}
+for lens, findings in review.lenses.items():
+    print(f"\n{icons.get(lens, '•')} {lens.upper()} ({len(findings)})")
+    for finding in findings:
+        severity = f"[{finding.severity}] " if finding.severity else ""
+        print(f"- line {finding.line}: {severity}{finding.message}")
 
-message = client.messages.create(
-    model="claude-sonnet-4-20250514",
-    max_tokens=1024,
-    temperature=0.2,
-    system="""You are a security auditor. Focus exclusively on security vulnerabilities.
-For each issue found, provide:
-- Severity level (Critical/High/Medium/Low)
-- Description of the vulnerability
-- Concrete code example showing the fix""",
-    messages=[
-        {
-            "role": "user",
-            "content": f"Security audit this code:\n\n```python\n{code_to_review}\n```"
-        }
-    ]
-)
+print(f"\n📊 {review.stats['calls']} API call, {review.stats['input_tokens']} input tokens")
 
-print(message.content[0].text)
+# For long files, mode="cached" makes one call per lens instead, with the code
+# as a cached prompt prefix: calls after the first read it from the cache.
 
 # Pro tips for code review:
 # - Use temperature 0.2-0.3 for more consistent technical analysis
 # - Be specific about what aspects to focus on (security, performance, style)
+# - Ask for all lenses in one request rather than re-sending the code per lens
 # - Provide context about the codebase or framework when relevant
 # - Ask for specific code examples in the suggestions
 # - Can also ask for refactored versions of the code
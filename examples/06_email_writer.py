@@ -8,6 +8,7 @@ This example shows:
 - Tone and formality control
 - Different email types (cold outreach, follow-up, etc.)
 - Personalization
+- Bulk generation from a template and a contact list
 
 Sample output:
 ---------------
@@ -20,14 +21,19 @@ I hope this email finds you well. I'm reaching out to explore...
 [Professional, well-structured email follows]
 """
 
+import csv
+import json
 import os
-from anthropic import Anthropic
+import tempfile
+
+from utils import get_client
+from utils.bulk import BulkGenerator, PromptTemplate
 
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
 # Example 1: Cold outreach email
 print("=== Example 1: Cold Outreach Email ===\n")
@@ -129,6 +135,46 @@ message = client.messages.create(
 
 print(message.content[0].text)
 
+# Example 4: Personalized emails in bulk
+print("\n\n=== Example 4: Bulk Personalized Emails ===\n")
+
+# The template is compiled once: the system prompt and the text before the
+# first {slot} are a cacheable static prefix, and only the row values change.
+template = PromptTemplate(
+    system="""You are a professional email writer. Generate emails that are:
+- Professional but warm
+- Concise and scannable
+- Include a clear call-to-action
+- Include both subject line and body""",
+    template="""Write a cold outreach email from Alex Chen at Acme Solutions proposing a partnership for AI integration.
+Our AI platform has helped 50+ companies reduce costs by 30%. Keep it under 120 words.
+
+Recipient: {name}, {role} at {company}""",
+)
+
+with tempfile.TemporaryDirectory() as workdir:
+    # In a real campaign this is your CRM export; rows are streamed, not loaded at once
+    contacts_path = os.path.join(workdir, "contacts.csv")
+    with open(contacts_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["email", "name", "role", "company"])
+        writer.writerow(["sarah@techcorp.com", "Sarah Johnson", "CTO", "TechCorp"])
+        writer.writerow(["raj@datawave.io", "Raj Patel", "VP Engineering", "DataWave"])
+        writer.writerow(["mia@brightops.com", "Mia Wong", "Head of Operations", "BrightOps"])
+
+    # Results are appended to the output as they finish; re-running skips done rows
+    output_path = os.path.join(workdir, "emails.jsonl")
+    generator = BulkGenerator(template, client=client, temperature=0.7, concurrency=4, requests_per_minute=50)
+    stats = generator.run(contacts_path, output_path, id_field="email")
+
+    with open(output_path) as f:
+        for line in f:
+            record = json.loads(line)
+            print(f"--- {record['id']} ---")
+            print(record.get("output", record.get("error")), "\n")
+
+print(f"Generated {stats['generated']} emails in {stats['seconds']}s")
+
 # Pro tips for email generation:
 # - Adjust temperature based on formality (0.6-0.7 for business, 0.8-0.9 for creative)
 # - Provide context about the relationship and previous interactions
@@ -136,3 +182,4 @@ print(message.content[0].text)
 # - Set word limits to keep emails concise
 # - Ask for subject lines when needed
 # - Can generate multiple variations and choose the best one
+# - For campaigns, use one template with {slots} instead of an f-string per email
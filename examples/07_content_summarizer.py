@@ -8,6 +8,8 @@ This example shows:
 - Key points extraction
 - Different summary lengths
 - Summary formatting options
+- Chunked summaries in a streaming pipeline
+- Progressive summaries of text that is still arriving
 
 Sample output:
 ---------------
@@ -24,13 +26,16 @@ Start with just 15 minutes daily and gradually increase.
 """
 
 import os
-from anthropic import Anthropic
+import json
+import tempfile
+
+from utils import get_client
 
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
 # Sample article to summarize
 long_article = """
@@ -138,10 +143,64 @@ Create summaries that:
 
 print(message.content[0].text)
 
+# Example 5: Summarize section by section in a streaming pipeline
+# Chunks are summarized concurrently and written to a JSONL file as they
+# finish; inputs are read lazily, so the same chain works on a file of any size
+# (e.g. source("articles.jsonl")).
+print("\n\n=== Example 5: Section Summaries with a Pipeline ===\n")
+
+from utils.pipeline import source
+
+with tempfile.TemporaryDirectory() as workdir:
+    # In a real job, sink to wherever the summaries should go
+    summaries_path = os.path.join(workdir, "section_summaries.jsonl")
+    stats = (
+        source([{"id": "ai-healthcare", "text": long_article}])
+        .chunk(tokens=200, kind="inline")  # "inline": no worker processes needed for one article
+        .map_llm(
+            client=client,
+            system="Summarize the passage in one sentence.",
+            prompt="{text}",
+            max_tokens=150,
+            concurrency=4,
+            temperature=0.3,
+        )
+        .sink(summaries_path)
+    )
+    with open(summaries_path) as f:
+        first = json.loads(f.readline())["response"]
+
+print(f"💾 {stats['written']} section summaries written in {stats['seconds']}s; first: {first[:100]}")
+for stage, counters in stats["stages"].items():
+    print(f"  {stage}: {counters['items_out']} out, {counters['items_per_second']}/s")
+
+# Example 6: Progressive summary of a live stream
+# The article arrives paragraph by paragraph, as a transcript or log would.
+# The rolling summary is updated per chunk, with a prompt that never holds
+# more than the summary so far plus one chunk, so the first summary shows up
+# after one chunk however long the input turns out to be.
+print("\n\n=== Example 6: Progressive Summary of a Live Stream ===\n")
+
+from utils.summarizer import ProgressiveSummarizer
+
+def live_paragraphs():
+    """Stand-in for a live source: yields the article a paragraph at a time."""
+    for paragraph in long_article.strip().split("\n\n"):
+        yield paragraph + "\n\n"
+
+summarizer = ProgressiveSummarizer(client, chunk_tokens=150, summary_tokens=200, temperature=0.3)
+for event in summarizer.stream(live_paragraphs()):
+    if event.final:
+        print(f"✅ Final summary after {event.index} updates ({event.chars} chars read)")
+        break
+    print(f"🔄 Update {event.index} ({event.chars} chars read, {event.seconds}s):")
+    print(f"{event.summary}\n")
+
 # Pro tips for content summarization:
 # - Use temperature 0.3-0.4 for factual accuracy
 # - Specify the desired length (sentences, words, paragraphs)
 # - Tailor the summary to the audience (executives, technical, general)
 # - Can ask for specific formats (bullet points, paragraphs, tables)
 # - For very long content, consider chunking and summarizing sections
+# - For live or unbounded input, keep a rolling summary (ProgressiveSummarizer)
 # - Can extract specific information (dates, names, numbers) separately
@@ -8,6 +8,8 @@ This example shows:
 - Data extraction patterns
 - Validation and formatting
 - Handling missing data
+- Routing simple extractions to a smaller model, escalating on invalid output
+- Columnar aggregation of extraction results
 
 Sample output:
 ---------------
@@ -23,13 +25,20 @@ Extracted Information:
 
 import os
 import json
-from anthropic import Anthropic
+import tempfile
+
+from utils import get_client
+from utils.routing import ModelRouter
 
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
+
+# Extraction is routed to a small, fast model first. Only answers that are not
+# valid JSON with the required keys are retried on the larger model.
+router = ModelRouter(client)
 
 # Example 1: Extract contact information
 print("=== Example 1: Contact Information Extraction ===\n")
@@ -51,9 +60,9 @@ After yesterday's meeting, here are the contacts you need:
 Thanks!
 """
 
-message = client.messages.create(
-    model="claude-sonnet-4-20250514",
-    max_tokens=1024,
+message, contacts_data, decision = router.create(
+    task="extract",
+    required=["contacts"],
     temperature=0.2,
     system="""You are a data extraction specialist. Extract contact information and return ONLY valid JSON.
 
@@ -80,7 +89,7 @@ Include only information explicitly mentioned. Use null for missing data.""",
     ]
 )
 
-contacts_data = json.loads(message.content[0].text)
+print(f"🧭 Answered by {decision.model}" + (f" after {decision.reasons}" if decision.escalated else ""))
 print(json.dumps(contacts_data, indent=2))
 
 print("\n📇 Formatted Contacts:")
@@ -112,9 +121,9 @@ Major deals closed:
 - Global Systems: $220K annual contract (enterprise tier)
 """
 
-message = client.messages.create(
-    model="claude-sonnet-4-20250514",
-    max_tokens=1024,
+message, financial_data, decision = router.create(
+    task="extract",
+    required=["period", "metrics", "deals"],
     temperature=0.1,  # Very low for precise number extraction
     system="""You are a financial data extraction specialist. Extract all financial metrics and return ONLY valid JSON.
 
@@ -150,7 +159,7 @@ All amounts in USD. Percentages as numbers (35, not 0.35).""",
     ]
 )
 
-financial_data = json.loads(message.content[0].text)
+print(f"🧭 Answered by {decision.model}" + (f" after {decision.reasons}" if decision.escalated else ""))
 print(json.dumps(financial_data, indent=2))
 
 print("\n💰 Summary:")
@@ -175,9 +184,9 @@ April 1, 2024 - Q1 board meeting. Financial reports due March 28th.
 Note: The April 10th customer advisory board meeting has been moved to April 17th.
 """
 
-message = client.messages.create(
-    model="claude-sonnet-4-20250514",
-    max_tokens=1024,
+message, events_data, decision = router.create(
+    task="extract",
+    required=["events"],
     temperature=0.2,
     system="""Extract all events with dates. Return ONLY valid JSON.
 
@@ -204,7 +213,7 @@ Use ISO date format (YYYY-MM-DD). Include all mentioned details.""",
     ]
 )
 
-events_data = json.loads(message.content[0].text)
+print(f"🧭 Answered by {decision.model}" + (f" after {decision.reasons}" if decision.escalated else ""))
 print(json.dumps(events_data, indent=2))
 
 print("\n📅 Calendar Summary:")
@@ -215,6 +224,40 @@ for event in sorted(events_data['events'], key=lambda x: x['date']):
     if event.get('location'):
         print(f"  Location: {event['location']}")
 
+# Example 4: Aggregate extraction results column-wise
+# At volume, keep results in typed columns instead of lists of dicts: amounts
+# become floats, dates become datetime64 and company names are dictionary-encoded,
+# so totals, filters and sorts run as array operations.
+print("\n\n=== Example 4: Columnar Results ===\n")
+
+try:
+    from utils.columnar import ExtractionTable
+except ImportError:
+    print("ℹ️  Install NumPy for columnar results: pip install numpy")
+else:
+    deals = ExtractionTable(
+        {"company": "category", "amount": "amount", "currency": "currency", "duration_years": "int"},
+        financial_data["deals"],
+    )
+    print(f"Total Deals: ${deals.sum('amount'):,.0f} across {len(deals)} contracts")
+    print(f"Multi-year: ${deals.sum('amount', where=deals['duration_years'] > 1):,.0f}")
+    for company, amount in sorted(deals.aggregate("amount", by="company").items(), key=lambda kv: -kv[1]):
+        print(f"  {company}: ${amount:,.0f}")
+
+    events = ExtractionTable({"date": "date", "title": "str", "location": "str"}, events_data["events"])
+    march = events.filter(events.between("date", "2024-03-01", "2024-03-31"))
+    print(f"\n📅 {len(march)} of {len(events)} events in March; first: {march.sort('date').to_records()[:1]}")
+    with tempfile.TemporaryDirectory() as workdir:
+        # In a real pipeline, write to your own output path (or .to_parquet with pyarrow)
+        csv_path = os.path.join(workdir, "deals.csv")
+        deals.to_csv(csv_path)
+        with open(csv_path) as f:
+            print(f"💾 deals.csv: {f.readline().strip()} ...")
+
+stats = router.stats()
+print(f"\n🧭 Routing: {stats['escalations']}/{stats['requests']} escalated, "
+      f"${stats['cost']:.4f} spent vs ${stats['baseline_cost']:.4f} on the large model alone")
+
 # Pro tips for data extraction:
 # - Use very low temperature (0.1-0.2) for accuracy
 # - Be explicit about the JSON schema you want
@@ -8,6 +8,8 @@ This example shows:
 - Context retention
 - Building interactive chat interfaces
 - Memory management for long conversations
+- Compact history that is serialized once per turn
+- Opt-in prefetching of likely follow-up questions
 
 Sample output:
 ---------------
@@ -19,16 +21,22 @@ Assistant: Paris has approximately 2.2 million people...
 """
 
 import os
-from anthropic import Anthropic
+import time
+
+from utils import get_client
+from utils.history import History
+from utils.speculative import SpeculativeChat
 
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
-# Conversation history - stores all messages
-conversation_history = []
+# Conversation history - stores all messages. Each turn is kept as the JSON
+# sent to the API, so a request body is built by concatenating the turns
+# instead of re-encoding the whole conversation every time.
+conversation_history = History()
 
 def chat(user_message: str, system_prompt: str = None) -> str:
     """
@@ -42,32 +50,21 @@ def chat(user_message: str, system_prompt: str = None) -> str:
         Claude's response
     """
     # Add user message to history
-    conversation_history.append({
-        "role": "user",
-        "content": user_message
-    })
+    conversation_history.add_user(user_message)
     
     # Create the API request
     params = {
         "model": "claude-sonnet-4-20250514",
         "max_tokens": 2048,
-        "messages": conversation_history
     }
     
     if system_prompt:
         params["system"] = system_prompt
     
-    # Get response
-    message = client.messages.create(**params)
-    assistant_response = message.content[0].text
-    
-    # Add assistant response to history
-    conversation_history.append({
-        "role": "assistant",
-        "content": assistant_response
-    })
+    # Get response (the assistant's reply is added to the history)
+    message = conversation_history.create(client, **params)
     
-    return assistant_response
+    return message.content[0].text
 
 # Example 1: Basic multi-turn conversation
 print("=== Example 1: Multi-Turn Conversation ===\n")
@@ -154,32 +151,20 @@ def chat_with_memory_limit(user_message: str, max_history: int = 10) -> str:
         Claude's response
     """
     # Add user message
-    conversation_history.append({
-        "role": "user",
-        "content": user_message
-    })
+    conversation_history.add_user(user_message)
     
-    # Trim history if too long (keep pairs of user/assistant messages)
+    # Trim history if too long (the kept part still starts with a user message)
     if len(conversation_history) > max_history:
-        # Keep the system context if it exists, trim old messages
-        conversation_history[:] = conversation_history[-max_history:]
+        conversation_history.trim(max_history)
     
-    # Get response
-    message = client.messages.create(
+    # Get response (added to the history)
+    message = conversation_history.create(
+        client,
         model="claude-sonnet-4-20250514",
-        max_tokens=2048,
-        messages=conversation_history
+        max_tokens=2048
     )
     
-    assistant_response = message.content[0].text
-    
-    # Add assistant response
-    conversation_history.append({
-        "role": "assistant",
-        "content": assistant_response
-    })
-    
-    return assistant_response
+    return message.content[0].text
 
 conversation_history.clear()
 
@@ -197,12 +182,44 @@ print(f"After message 3: {len(conversation_history)} messages\n")
 response = chat_with_memory_limit("What are some applications?", max_history=6)
 print(f"After message 4: {len(conversation_history)} messages (trimmed to max_history)")
 
+# Example 5: Speculative prefetch of likely follow-ups (opt-in)
+print("\n=== Example 5: Prefetching Likely Follow-Ups ===\n")
+
+# While the user reads a reply, answers to the likeliest next messages are
+# requested in the background. Here the guesses come from rules matched
+# against the reply; pass suggest_model="claude-haiku-4-5-20251001" to let a
+# cheap model guess too. Unused guesses cost tokens: check wasted_tokens.
+with SpeculativeChat(
+    client,
+    k=2,
+    rules=[
+        (r"(?i)(example|show you)[^.?!]*\?\s*$", ["Yes, please show me an example"]),
+        (r"(?i)any (other )?questions\?\s*$", ["Can you give me an exercise to practice?"]),
+    ],
+    system="You are a concise Python tutor. End every answer by offering an example.",
+    model="claude-sonnet-4-20250514",
+    max_tokens=1024,
+) as tutor:
+    print(f"Assistant: {tutor.send('What is a Python dictionary?')}\n")
+
+    # The user reads the answer; the prefetch runs meanwhile (benchmarks set this to 0)
+    time.sleep(float(os.environ.get("EXAMPLE_READING_SECONDS", "5")))
+
+    started = time.time()
+    reply = tutor.send("Yes, please show me an example")
+    print(f"Assistant ({time.time() - started:.2f}s): {reply}\n")
+
+    stats = tutor.stats()
+    print(f"Hit rate: {stats['hit_rate']:.0%}, saved {stats['seconds_saved']}s, "
+          f"wasted {stats['wasted_tokens']} speculative tokens")
+
 # Pro tips for multi-turn conversations:
-# - Store conversation history in a list of message dicts
+# - Store conversation history in a History (or a list of message dicts)
 # - Each message has "role" (user/assistant) and "content"
 # - System prompts can only be set at the conversation start
 # - Monitor message count to avoid hitting token limits
 # - Consider summarizing old messages for very long conversations
+# - Prefetch predictable follow-ups only where the hit rate pays for the wasted tokens
 # - Save conversation history to disk for persistence
 # - Can implement "forgot" commands to remove context
 # - Use temperature control for consistent personalities
@@ -8,6 +8,10 @@ This example shows:
 - Function calling workflow
 - Handling tool results
 - Multi-step tool usage
+- Keeping a tool loop's history compact and serialized once per turn
+- Tool schemas generated from type hints, with validated inputs
+- Async tools awaited directly on the event loop
+- Running tools in sandboxed, pre-warmed worker processes
 
 Sample output:
 ---------------
@@ -19,45 +23,39 @@ Weather: 18°C, Partly cloudy
 Claude: The weather in San Francisco is currently 18°C and partly cloudy...
 """
 
+import asyncio
 import os
 import json
-from anthropic import Anthropic
+from typing import Literal
+
+from utils import ToolRegistry, get_async_client, get_client
+from utils.history import History
+from utils.sandbox import SandboxPool
 
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise ValueError("Please set ANTHROPIC_API_KEY environment variable")
 
-client = Anthropic(api_key=api_key)
+client = get_client(api_key)
 
 # Example 1: Simple tool use
 print("=== Example 1: Weather Tool ===\n")
 
-# Define available tools
-tools = [
-    {
-        "name": "get_weather",
-        "description": "Get the current weather for a location. Returns temperature and conditions.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "location": {
-                    "type": "string",
-                    "description": "The city and state, e.g. San Francisco, CA"
-                },
-                "unit": {
-                    "type": "string",
-                    "enum": ["celsius", "fahrenheit"],
-                    "description": "The temperature unit"
-                }
-            },
-            "required": ["location"]
-        }
-    }
-]
+# Tools are registered with a decorator: the JSON schema is built once from
+# the type hints and the docstring's Args section, and inputs are validated
+# against it before the function runs.
+weather_tools = ToolRegistry()
 
 # Simulated weather function (in real app, this would call an API)
-def get_weather(location: str, unit: str = "celsius") -> dict:
-    """Simulated weather API - replace with real API call."""
+@weather_tools.tool
+def get_weather(location: str, unit: Literal["celsius", "fahrenheit"] = "celsius") -> dict:
+    """
+    Get the current weather for a location. Returns temperature and conditions.
+
+    Args:
+        location: The city and state, e.g. San Francisco, CA
+        unit: The temperature unit
+    """
     # In a real app, you'd call a weather API here
     mock_data = {
         "San Francisco": {"temp": 18, "condition": "Partly cloudy"},
@@ -66,7 +64,7 @@ def get_weather(location: str, unit: str = "celsius") -> dict:
     }
     
     city = location.split(",")[0]
-    data = mock_data.get(city, {"temp": 20, "condition": "Unknown"})
+    data = dict(mock_data.get(city, {"temp": 20, "condition": "Unknown"}))
     
     if unit == "fahrenheit":
         data["temp"] = round(data["temp"] * 9/5 + 32)
@@ -78,6 +76,10 @@ def get_weather(location: str, unit: str = "celsius") -> dict:
         "condition": data["condition"]
     }
 
+# The generated definitions, ready for tools=
+tools = weather_tools.tools
+print(f"Generated schema: {json.dumps(tools[0]['input_schema'])}\n")
+
 # Initial request with tool definition
 message = client.messages.create(
     model="claude-sonnet-4-20250514",
@@ -103,9 +105,9 @@ if message.stop_reason == "tool_use":
     print(f"Claude wants to use: {tool_name}")
     print(f"Arguments: {json.dumps(tool_input, indent=2)}\n")
     
-    # Execute the function
-    if tool_name == "get_weather":
-        result = get_weather(**tool_input)
+    # Execute the function (the input is validated against the schema first)
+    if tool_name in weather_tools:
+        result = weather_tools.call(tool_name, tool_input)
         print(f"Weather: {result['temperature']}°{result['unit'][0].upper()}, {result['condition']}\n")
         
         # Send the result back to Claude
@@ -140,94 +142,67 @@ if message.stop_reason == "tool_use":
 # Example 2: Multiple tools
 print("\n\n=== Example 2: Calculator Tools ===\n")
 
-calculator_tools = [
-    {
-        "name": "add",
-        "description": "Add two numbers together",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "a": {"type": "number", "description": "First number"},
-                "b": {"type": "number", "description": "Second number"}
-            },
-            "required": ["a", "b"]
-        }
-    },
-    {
-        "name": "multiply",
-        "description": "Multiply two numbers",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "a": {"type": "number", "description": "First number"},
-                "b": {"type": "number", "description": "Second number"}
-            },
-            "required": ["a", "b"]
-        }
-    }
-]
+calculator_tools = ToolRegistry()
 
+@calculator_tools.tool
 def add(a: float, b: float) -> float:
+    """
+    Add two numbers together
+
+    Args:
+        a: First number
+        b: Second number
+    """
     return a + b
 
+@calculator_tools.tool
 def multiply(a: float, b: float) -> float:
-    return a * b
+    """
+    Multiply two numbers
 
-# Function registry
-function_map = {
-    "add": add,
-    "multiply": multiply
-}
+    Args:
+        a: First number
+        b: Second number
+    """
+    return a * b
 
-def process_tool_call(user_query: str, tools: list, function_map: dict) -> str:
+def process_tool_call(user_query: str, tools: ToolRegistry) -> str:
     """
     Process a user query that may require tool calls.
     
     Args:
         user_query: The user's question
-        tools: List of available tools
-        function_map: Dict mapping tool names to functions
+        tools: Registry of available tools
         
     Returns:
         Claude's final response
     """
-    messages = [{"role": "user", "content": user_query}]
+    # Each turn is serialized once when added; later requests reuse it as-is
+    messages = History([{"role": "user", "content": user_query}])
     
     while True:
-        response = client.messages.create(
+        # The assistant's response is added to the history. tools.tools is
+        # the same cached list on every request, so it serializes identically.
+        response = messages.create(
+            client,
             model="claude-sonnet-4-20250514",
             max_tokens=1024,
-            tools=tools,
-            messages=messages
+            tools=tools.tools
         )
         
         if response.stop_reason == "tool_use":
-            # Add assistant's response to messages
-            messages.append({"role": "assistant", "content": response.content})
-            
-            # Process all tool calls
-            tool_results = []
             for block in response.content:
                 if block.type == "tool_use":
-                    tool_name = block.name
-                    tool_input = block.input
-                    
-                    print(f"🔧 Using tool: {tool_name}({tool_input})")
-                    
-                    # Execute the function
-                    func = function_map[tool_name]
-                    result = func(**tool_input)
-                    
-                    print(f"   Result: {result}\n")
-                    
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": block.id,
-                        "content": str(result)
-                    })
+                    print(f"🔧 Using tool: {block.name}({block.input})")
             
-            # Add tool results to messages
-            messages.append({"role": "user", "content": tool_results})
+            # Run every tool call. Invalid inputs and tool exceptions come
+            # back as error results that Claude can correct.
+            tool_results, errors = tools.execute(response)
+            for tool_use_id, result in tool_results.items():
+                print(f"   {'❌ Error' if tool_use_id in errors else 'Result'}: {result}\n")
+            
+            # Add tool results to messages (non-string results are sent as JSON)
+            messages.add_tool_results(tool_results, errors)
             
         else:
             # No more tool calls, return final response
@@ -236,8 +211,7 @@ def process_tool_call(user_query: str, tools: list, function_map: dict) -> str:
 # Test the calculator
 result = process_tool_call(
     "If I have 15 apples and I buy 7 more, then multiply that by 3, how many do I have?",
-    calculator_tools,
-    function_map
+    calculator_tools
 )
 
 print(f"Claude: {result}")
@@ -245,25 +219,23 @@ print(f"Claude: {result}")
 # Example 3: Database query tool
 print("\n\n=== Example 3: Database Query Tool ===\n")
 
-database_tools = [
-    {
-        "name": "query_customers",
-        "description": "Query customer database. Returns customer information.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "customer_id": {
-                    "type": "string",
-                    "description": "The customer ID to look up"
-                }
-            },
-            "required": ["customer_id"]
-        }
-    }
-]
+database_tools = ToolRegistry()
 
+# The query runs in a sandbox: one of two pre-warmed worker processes with a
+# CPU-time and memory limit, recycled after 100 calls or if it crashes. A
+# function defined in this script is sent to the workers as source code, so
+# it must be self-contained.
+sandbox = SandboxPool(size=2, max_calls=100, cpu_seconds=2, memory_mb=256, timeout=10)
+
+@database_tools.tool(blocking=True)
+@sandbox.isolate
 def query_customers(customer_id: str) -> dict:
-    """Simulated database query."""
+    """
+    Query customer database. Returns customer information.
+
+    Args:
+        customer_id: The customer ID to look up
+    """
     mock_db = {
         "C001": {"name": "John Smith", "email": "john@example.com", "plan": "Premium"},
         "C002": {"name": "Sarah Johnson", "email": "sarah@example.com", "plan": "Basic"},
@@ -273,18 +245,63 @@ def query_customers(customer_id: str) -> dict:
 
 result = process_tool_call(
     "What is the email address for customer C001?",
-    database_tools,
-    {"query_customers": query_customers}
+    database_tools
 )
 
+print(f"Claude: {result}")
+print(f"Sandbox: {sandbox.stats()}")
+sandbox.close()
+
+# Example 4: Async tools
+print("\n\n=== Example 4: Async Tools ===\n")
+
+# Coroutine tools are awaited on the event loop (no thread per call), and
+# aexecute runs all of a response's tool calls concurrently.
+async_tools = ToolRegistry(cache_control=True)  # the tool list becomes a prompt-cache breakpoint
+
+@async_tools.tool
+async def get_order_status(order_id: str) -> dict:
+    """
+    Look up the shipping status of an order.
+
+    Args:
+        order_id: The order number, e.g. A-1001
+    """
+    await asyncio.sleep(0.1)  # e.g. an HTTP call with an async client
+    return {"order_id": order_id, "status": "shipped", "eta_days": 2}
+
+async def process_tool_call_async(user_query: str, tools: ToolRegistry) -> str:
+    """Async version of process_tool_call."""
+    async_client = get_async_client(api_key)
+    messages = History([{"role": "user", "content": user_query}])
+    while True:
+        response = await messages.acreate(
+            async_client,
+            model="claude-sonnet-4-20250514",
+            max_tokens=1024,
+            tools=tools.tools
+        )
+        if response.stop_reason != "tool_use":
+            return response.content[0].text
+        tool_results, errors = await tools.aexecute(response)
+        print(f"🔧 Ran {len(tool_results)} tool call(s) concurrently")
+        messages.add_tool_results(tool_results, errors)
+
+result = asyncio.run(process_tool_call_async(
+    "Where are my orders A-1001 and A-1002?",
+    async_tools
+))
+
 print(f"Claude: {result}")
 
 # Pro tips for tool use:
 # - Define clear, specific tool descriptions
-# - Use JSON schema to validate inputs
+# - Generate schemas from type hints (ToolRegistry) so they never drift from the code
+# - Validate inputs before running a tool, and return errors to Claude as tool results
 # - Handle tool errors gracefully
 # - Claude can chain multiple tool calls
 # - Can mix tool use with regular conversation
 # - Use tools for: API calls, database queries, calculations, file operations
 # - Return structured data from tools (JSON preferred)
 # - Consider rate limits when tools call external APIs
+# - Run untrusted or heavy tools in a SandboxPool, not in the agent's process
@@ -0,0 +1,34 @@
+"""History trimming (no API calls)."""
+
+from utils.history import History
+
+
+def _tool_round(history: History, number: int) -> None:
+    tool_id = f"toolu_{number}"
+    history.add_assistant([{"type": "tool_use", "id": tool_id, "name": "lookup", "input": {"n": number}}])
+    history.add_tool_results({tool_id: f"result {number}"})
+
+
+def test_trim_drops_oldest_turns_from_a_user_turn():
+    history = History(max_turns=4)
+    for number in range(4):
+        history.add_user(f"question {number}")
+        history.add_assistant(f"answer {number}")
+    assert [turn.text for turn in history] == ["question 2", "answer 2", "question 3", "answer 3"]
+
+
+def test_trim_keeps_the_open_question_of_a_tool_loop():
+    history = History(max_turns=4)
+    history.add_user("What is in the warehouse?")
+    for number in range(3):
+        _tool_round(history, number)
+
+    assert len(history) == 7
+    assert history[0].role == "user" and history[0].text == "What is in the warehouse?"
+    assert history.messages()[0] == {"role": "user", "content": "What is in the warehouse?"}
+
+    # Once the loop ends and a new question comes in, the old loop can go
+    history.add_assistant("Three items.")
+    history.add_user("Which one is heaviest?")
+    history.add_assistant("The anvil.")
+    assert [turn.text for turn in history] == ["Which one is heaviest?", "The anvil."]
@@ -1,6 +1,69 @@
-"""Shared utilities for Claude API Starter Kit."""
+"""
+Shared utilities for Claude API Starter Kit.
 
-from .client import ClaudeClient
-from .error_handler import handle_api_errors, retry_with_backoff
+Exports are loaded lazily (PEP 562): ``from utils import RateLimiter`` only
+imports ``utils.rate_limiter``, and the Anthropic SDK is only imported by
+the modules that talk to the API. Clients create their HTTP connection on
+first use.
 
-__all__ = ['ClaudeClient', 'handle_api_errors', 'retry_with_backoff']
+    # Import cost per export, measured in fresh interpreters:
+    python benchmarks/import_time.py
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+# Public name -> submodule that defines it
+_EXPORTS = {
+    'AdaptiveLimiter': 'concurrency',
+    'AsyncClaudeClient': 'client',
+    'AsyncChatStream': 'streaming',
+    'BalancedClaudeClient': 'balancer',
+    'Budget': 'ledger',
+    'BudgetExceeded': 'ledger',
+    'ClaudeClient': 'client',
+    'ChatStream': 'streaming',
+    'configure_pool': 'registry',
+    'DeadlineExceeded': 'scheduler',
+    'get_async_client': 'registry',
+    'get_client': 'registry',
+    'handle_api_errors': 'error_handler',
+    'Ledger': 'ledger',
+    'ModelRouter': 'routing',
+    'Pipeline': 'pipeline',
+    'pool_stats': 'registry',
+    'RateLimiter': 'rate_limiter',
+    'RequestScheduler': 'scheduler',
+    'retry_with_backoff': 'error_handler',
+    'ToolRegistry': 'tools',
+    'warm_pool': 'registry',
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:  # static analysers and IDEs see the eager imports
+    from .balancer import BalancedClaudeClient
+    from .client import AsyncClaudeClient, ClaudeClient
+    from .concurrency import AdaptiveLimiter
+    from .error_handler import handle_api_errors, retry_with_backoff
+    from .ledger import Budget, BudgetExceeded, Ledger
+    from .pipeline import Pipeline
+    from .rate_limiter import RateLimiter
+    from .registry import configure_pool, get_async_client, get_client, pool_stats, warm_pool
+    from .routing import ModelRouter
+    from .scheduler import DeadlineExceeded, RequestScheduler
+    from .streaming import AsyncChatStream, ChatStream
+    from .tools import ToolRegistry
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(__all__)
@@ -0,0 +1,141 @@
+"""
+Minimal asyncio HTTP/1.1 helpers shared by the local servers in utils.
+Only what the SSE gateway and the mock API server need: request parsing
+with keep-alive, fixed-length responses and event-stream responses.
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+MAX_HEADER_BYTES = 64 * 1024
+LAST_CHUNK = b"0\r\n\r\n"
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    529: "Overloaded",
+}
+
+
+class Request:
+    """A parsed HTTP request."""
+
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body) if self.body else {}
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+async def read_request(reader: asyncio.StreamReader, max_body: int = 16 * 1024 * 1024) -> Optional[Request]:
+    """
+    Read one request from the connection.
+
+    Returns:
+        Request, or None if the peer closed the connection cleanly
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise ValueError("Request headers too large")
+
+    if len(head) > MAX_HEADER_BYTES:
+        raise ValueError("Request headers too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise ValueError(f"Malformed request line: {lines[0]!r}")
+
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", "0") or 0)
+    if length > max_body:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, headers, body)
+
+
+def response_bytes(
+    status: int,
+    body: bytes = b"",
+    content_type: str = "application/json",
+    headers: Optional[Dict[str, str]] = None,
+    keep_alive: bool = True,
+) -> bytes:
+    """Serialize a complete fixed-length response."""
+    lines = [
+        f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def json_response(status: int, payload: Any, headers: Optional[Dict[str, str]] = None, keep_alive: bool = True) -> bytes:
+    """Serialize a JSON response."""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    return response_bytes(status, body, headers=headers, keep_alive=keep_alive)
+
+
+def event_stream_head(headers: Optional[Dict[str, str]] = None, chunked: bool = False) -> bytes:
+    """
+    Response head for a server-sent-events stream.
+
+    Without ``chunked`` the stream is delimited by closing the connection;
+    with it, frames must be wrapped with ``chunk()`` and the connection can
+    be reused once ``LAST_CHUNK`` is written.
+    """
+    lines = [
+        "HTTP/1.1 200 OK",
+        "Content-Type: text/event-stream",
+        "Cache-Control: no-cache",
+        "Transfer-Encoding: chunked" if chunked else "Connection: close",
+        "X-Accel-Buffering: no",
+    ]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def sse_frame(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    """Encode one server-sent event with a JSON payload."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def chunk(data: bytes) -> bytes:
+    """Wrap data in HTTP/1.1 chunked transfer framing."""
+    return b"%x\r\n%s\r\n" % (len(data), data)
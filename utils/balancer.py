@@ -0,0 +1,401 @@
+"""
+Load balancing across several API keys or endpoints.
+
+A BalancedClaudeClient spreads requests over a set of members (API keys,
+gateways, regions). Each request goes to the member with the fewest
+outstanding requests relative to its weight, discounted by the rate-limit
+headroom reported in that member's latest ``anthropic-ratelimit-*`` headers.
+Members that return 429s, 5xx errors or connection failures are ejected for a
+while and retryable failures move on to the next member. Requests that share
+a session stick to one member, so its prompt cache keeps getting hits.
+
+Usage:
+    from utils.balancer import BalancedClaudeClient
+
+    client = BalancedClaudeClient(["sk-ant-key-1", "sk-ant-key-2"])
+    client.chat("Hello!")
+    client.multi_turn_chat(history, session="user-42")     # stays on one member
+    print(client.stats())
+
+    # Or from the environment (comma-separated):
+    # ANTHROPIC_API_KEYS=sk-ant-key-1,sk-ant-key-2
+    # ANTHROPIC_BASE_URLS=https://gateway-a.example.com,https://gateway-b.example.com
+    client = BalancedClaudeClient.from_env()
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from anthropic import APIConnectionError, APIStatusError
+
+from . import registry
+from .client import ClaudeClient
+from .error_handler import handle_api_errors, report_api_error
+from .history import History, create_message
+from .streaming import ChatStream
+
+
+MAX_EJECT_SECONDS = 300.0
+AUTH_EJECT_SECONDS = 3600.0
+
+
+class Member:
+    """One API key / endpoint in a balancer, with its load and health."""
+
+    __slots__ = (
+        "name", "client", "api", "weight", "outstanding", "requests", "errors",
+        "consecutive_failures", "ejected_until", "ejections",
+    )
+
+    def __init__(self, name: str, client: ClaudeClient, weight: float = 1.0, api: Any = None):
+        self.name = name
+        self.client = client
+        self.api = api if api is not None else client.client
+        self.weight = max(weight, 1e-6)
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def headroom(self) -> Optional[float]:
+        stats = registry.stats_for(self.client.api_key, self.client.base_url)
+        return stats.headroom() if stats is not None else None
+
+    def score(self) -> float:
+        """Lower is better: outstanding requests per unit of weight, scaled by headroom."""
+        load = (self.outstanding + 1) / self.weight
+        headroom = self.headroom()
+        return load / max(headroom, 0.01) if headroom is not None else load
+
+
+def _retry_after(error: APIStatusError) -> Optional[float]:
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def session_key(messages: Union[List[Dict[str, Any]], History], system: Optional[str] = None) -> str:
+    """Default session for a conversation: a hash of its system prompt and first message."""
+    first = messages[0] if len(messages) else {}
+    content = first.get("content") if isinstance(first, dict) else first.content
+    payload = json.dumps([system, content], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class BalancedClaudeClient:
+    """ClaudeClient-compatible client that balances requests over several members."""
+
+    def __init__(
+        self,
+        members: Sequence[Union[str, Dict[str, Any]]],
+        model: str = "claude-sonnet-4-20250514",
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+        sticky_ttl: float = 600.0,
+        max_sessions: int = 10000,
+        failover: int = 1,
+    ):
+        """
+        Args:
+            members: API keys, or dicts with ``api_key`` and optional ``base_url``,
+                ``weight`` (relative capacity) and ``name``
+            model: Claude model to use
+            eject_after: Consecutive 5xx/connection failures before a member is ejected
+            eject_seconds: Base ejection time; doubles with each repeated ejection
+                (up to 5 minutes). 429s eject for the server's retry-after instead.
+            sticky_ttl: Seconds a session stays pinned to its member after its last request
+            max_sessions: Sessions remembered (least recently used are dropped)
+            failover: Other members tried after a retryable failure. Attempts that
+                can still fail over skip the SDK's retries; the last one (and every
+                attempt with a single member) keeps them
+        """
+        if not members:
+            raise ValueError("At least one member is required")
+        self.model = model
+        self.eject_after = max(1, eject_after)
+        self.eject_seconds = eject_seconds
+        self.sticky_ttl = sticky_ttl
+        self.max_sessions = max_sessions
+        self.failover = max(0, failover)
+        self.members: List[Member] = []
+        for index, spec in enumerate(members):
+            if isinstance(spec, str):
+                spec = {"api_key": spec}
+            client = ClaudeClient(api_key=spec["api_key"], model=model, base_url=spec.get("base_url"))
+            name = spec.get("name") or f"member-{index}"
+            # With failover, move to the next member at once instead of letting the SDK retry here
+            # (_send still uses the retrying client for the last attempt)
+            api = client.client.with_options(max_retries=0) if self.failover else client.client
+            self.members.append(Member(name, client, float(spec.get("weight", 1.0)), api))
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._turn = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs: Any) -> "BalancedClaudeClient":
+        """
+        Build from ANTHROPIC_API_KEYS (comma-separated) and optional ANTHROPIC_BASE_URLS.
+        One key with several URLs, several keys with one URL, or one URL per key all work.
+        """
+        keys = [k.strip() for k in os.getenv("ANTHROPIC_API_KEYS", os.getenv("ANTHROPIC_API_KEY", "")).split(",")]
+        urls = [u.strip() for u in os.getenv("ANTHROPIC_BASE_URLS", "").split(",")]
+        keys, urls = [k for k in keys if k], [u for u in urls if u] or [None]
+        if not keys:
+            raise ValueError("Set ANTHROPIC_API_KEYS (or ANTHROPIC_API_KEY) to a comma-separated list of keys")
+        if len(keys) > 1 and len(urls) > 1 and len(keys) != len(urls):
+            raise ValueError("ANTHROPIC_BASE_URLS must have one URL, or one URL per key")
+        count = max(len(keys), len(urls))
+        members = [
+            {"api_key": keys[i % len(keys)], "base_url": urls[i % len(urls)]}
+            for i in range(count)
+        ]
+        return cls(members, **kwargs)
+
+    # -- selection -------------------------------------------------------
+
+    def _choose(self, exclude: Sequence[Member], session: Optional[str]) -> Member:
+        """Pick a member and count the request as outstanding on it."""
+        now = time.monotonic()
+        with self._lock:
+            member = None
+            if session is not None:
+                pinned = self._sessions.get(session)
+                if pinned is not None:
+                    candidate, last_used = pinned
+                    if now - last_used <= self.sticky_ttl and candidate.ejected_until <= now and candidate not in exclude:
+                        member = candidate
+            if member is None:
+                # Rotate the starting point so ties are shared round-robin
+                self._turn = (self._turn + 1) % len(self.members)
+                ordered = self.members[self._turn:] + self.members[:self._turn]
+                healthy = [m for m in ordered if m.ejected_until <= now and m not in exclude]
+                if healthy:
+                    member = min(healthy, key=Member.score)
+                else:
+                    # Everything is ejected: fail open to the member that recovers first
+                    others = [m for m in self.members if m not in exclude] or self.members
+                    member = min(others, key=lambda m: m.ejected_until)
+            if session is not None:
+                self._sessions[session] = (member, now)
+                self._sessions.move_to_end(session)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            member.outstanding += 1
+            member.requests += 1
+            return member
+
+    def _finish(self, member: Member, error: Optional[BaseException]) -> bool:
+        """Release a request and update the member's health. Returns True if another member may be tried."""
+        now = time.monotonic()
+        with self._lock:
+            member.outstanding -= 1
+            if error is None:
+                member.consecutive_failures = 0
+                return False
+            status = getattr(error, "status_code", None)
+            if isinstance(error, APIStatusError) and status == 429:
+                member.errors += 1
+                self._eject(member, now, _retry_after(error) or self.eject_seconds)
+                return True
+            if status in (401, 403):
+                member.errors += 1
+                self._eject(member, now, AUTH_EJECT_SECONDS)
+                return True
+            if isinstance(error, APIConnectionError) or (status is not None and status >= 500):
+                member.errors += 1
+                member.consecutive_failures += 1
+                if member.consecutive_failures >= self.eject_after:
+                    backoff = self.eject_seconds * 2 ** min(member.ejections, 10)
+                    self._eject(member, now, min(backoff, MAX_EJECT_SECONDS))
+                    member.consecutive_failures = 0
+                return True
+            # Client errors (bad request, cancellation, ...) say nothing about the member
+            return False
+
+    def _eject(self, member: Member, now: float, seconds: float) -> None:
+        member.ejected_until = max(member.ejected_until, now + seconds)
+        member.ejections += 1
+
+    def _send(self, params: Dict[str, Any], session: Optional[str]) -> Any:
+        tried: List[Member] = []
+        while True:
+            member = self._choose(tried, session)
+            tried.append(member)
+            last = len(tried) > self.failover or len(tried) >= len(self.members)
+            try:
+                # Nowhere left to fail over to: let the SDK back off and retry on this member
+                response = create_message(member.client.client if last else member.api, params)
+            except Exception as e:
+                retry = self._finish(member, e)
+                if not retry or len(tried) > self.failover or len(tried) >= len(self.members):
+                    raise
+                continue
+            self._finish(member, None)
+            return response
+
+    def _params(self, messages: List[Dict[str, Any]], system: Optional[str], max_tokens: int,
+                temperature: float, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        params = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": messages,
+        }
+        if system:
+            params["system"] = system
+        params.update(kwargs)
+        return params
+
+    # -- ClaudeClient interface -------------------------------------------
+
+    def create(self, session: Optional[str] = None, **params: Any) -> Any:
+        """
+        Send raw Messages API parameters to the best available member.
+
+        Args:
+            session: Optional key that pins related requests to one member
+            **params: Messages API parameters (model and max_tokens default
+                to the client's model and 4096)
+
+        Returns:
+            Message: The SDK response
+        """
+        params.setdefault("model", self.model)
+        params.setdefault("max_tokens", 4096)
+        return self._send(params, session)
+
+    @handle_api_errors
+    def chat(
+        self,
+        message: str,
+        system: Optional[str] = None,
+        max_tokens: int = 4096,
+        temperature: float = 1.0,
+        session: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """
+        Send a single chat message to the best available member.
+
+        Args:
+            message: User message to send
+            system: Optional system prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature (0-1)
+            session: Optional key that pins related requests to one member
+            **kwargs: Additional arguments to pass to the API
+
+        Returns:
+            str: Claude's response text
+        """
+        params = self._params([{"role": "user", "content": message}], system, max_tokens, temperature, kwargs)
+        return self._send(params, session).content[0].text
+
+    @handle_api_errors
+    def multi_turn_chat(
+        self,
+        messages: Union[List[Dict[str, str]], History],
+        system: Optional[str] = None,
+        max_tokens: int = 4096,
+        temperature: float = 1.0,
+        session: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """
+        Send a multi-turn conversation. The conversation stays on one member
+        (keyed by its first message unless ``session`` is given), so each turn
+        can reuse the prompt cache built by the previous ones.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys, or a History
+            system: Optional system prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature (0-1)
+            session: Optional key that pins related requests to one member
+            **kwargs: Additional arguments to pass to the API
+
+        Returns:
+            str: Claude's response text
+        """
+        params = self._params(messages, system, max_tokens, temperature, kwargs)
+        session = session or session_key(messages, system)
+        return self._send(params, session).content[0].text
+
+    @handle_api_errors
+    def chat_stream(
+        self,
+        message: str,
+        system: Optional[str] = None,
+        max_tokens: int = 4096,
+        temperature: float = 1.0,
+        buffer_size: int = 64,
+        session: Optional[str] = None,
+        **kwargs
+    ) -> ChatStream:
+        """
+        Stream a response from the best available member.
+
+        The request counts as outstanding until the stream ends. Streams are
+        not failed over (text may already have been shown), so they keep the
+        SDK's retries; their errors still count against the member's health.
+
+        Returns:
+            ChatStream: Iterable of response text chunks
+        """
+        params = self._params([{"role": "user", "content": message}], system, max_tokens, temperature, kwargs)
+        member = self._choose((), session)
+        try:
+            manager = member.client.client.messages.stream(**params)
+        except BaseException as e:
+            self._finish(member, e)
+            raise
+        return ChatStream(manager, buffer_size=buffer_size, on_finish=lambda error: self._finish(member, error),
+                          on_error=report_api_error)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        Per-member load and health.
+
+        Returns:
+            list: One dict per member with outstanding, requests, errors,
+            ejections, ejected (seconds left, 0 if healthy), ratelimit
+            headroom and the number of sessions pinned to it
+        """
+        now = time.monotonic()
+        with self._lock:
+            pinned: Dict[str, int] = {}
+            for member, last_used in self._sessions.values():
+                if now - last_used <= self.sticky_ttl:
+                    pinned[member.name] = pinned.get(member.name, 0) + 1
+            rows = [
+                (m, m.outstanding, m.requests, m.errors, m.ejections, max(0.0, m.ejected_until - now))
+                for m in self.members
+            ]
+        return [
+            {
+                "name": m.name,
+                "base_url": m.client.base_url,
+                "weight": m.weight,
+                "outstanding": outstanding,
+                "requests": requests,
+                "errors": errors,
+                "ejections": ejections,
+                "ejected": round(ejected, 1),
+                "ratelimit_headroom": m.headroom(),
+                "sessions": pinned.get(m.name, 0),
+            }
+            for m, outstanding, requests, errors, ejections, ejected in rows
+        ]
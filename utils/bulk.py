@@ -0,0 +1,399 @@
+"""
+Bulk templated generation: one prompt template, many rows.
+
+A PromptTemplate is compiled once. The system prompt and the template text
+before the first ``{slot}`` are sent as a cacheable static prefix, and only
+the per-row part changes between requests. Rows are streamed from CSV or
+JSONL, generated concurrently under an optional rate limit, and appended to
+a JSONL output file as they finish. Re-running the same command skips rows
+that are already in the output, so a crash never redoes finished work.
+
+Usage:
+    from utils.bulk import BulkGenerator, PromptTemplate
+
+    template = PromptTemplate(
+        system="You are a professional email writer...",
+        template="Write a cold outreach email.\\n\\nRecipient: {name} at {company}\\nPurpose: {purpose}",
+    )
+    generator = BulkGenerator(template, concurrency=16, requests_per_minute=1000)
+    print(generator.run("contacts.csv", "emails.jsonl", id_field="email"))
+
+    # Or from the command line:
+    python -m utils.bulk contacts.csv emails.jsonl --template prompt.txt --system system.txt --id-field email
+"""
+
+import argparse
+import csv
+import json
+import os
+import string
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .concurrency import AdaptiveLimiter
+from .rate_limiter import RateLimiter
+
+
+class PromptTemplate:
+    """
+    A prompt with ``{field}`` slots (``str.format`` syntax), parsed once.
+
+    The system prompt and the literal text before the first slot form the
+    static prefix. They are marked for prompt caching, so with a long enough
+    prefix (1024+ tokens) every row after the first reads it from the cache.
+    """
+
+    def __init__(self, template: str, system: Optional[str] = None, cache_prefix: bool = True):
+        """
+        Args:
+            template: User message template, e.g. "Write an email to {name} at {company}"
+            system: Optional system prompt (static for every row)
+            cache_prefix: Mark the static prefix with cache_control
+        """
+        self.template = template
+        self.system = system
+        self.cache_prefix = cache_prefix
+        formatter = string.Formatter()
+        self._parts: List[Tuple[str, Optional[str], Optional[str], str]] = list(formatter.parse(template))
+        self.fields = sorted({name for _, name, _, _ in self._parts if name is not None})
+        if any(name == "" or (name and name.isdigit()) for _, name, _, _ in self._parts):
+            raise ValueError("Template slots must be named, e.g. {name}")
+
+        # Literal text up to the first slot never changes between rows
+        prefix_parts = []
+        for literal, name, _, _ in self._parts:
+            prefix_parts.append(literal)
+            if name is not None:
+                break
+        self.static_prefix = "".join(prefix_parts)
+        self._dynamic = self._parts[len(prefix_parts) - 1:] if prefix_parts else []
+        if self._dynamic:
+            # The first dynamic part's literal is already in the prefix
+            first = self._dynamic[0]
+            self._dynamic[0] = ("", first[1], first[2], first[3])
+
+        self._system_blocks = None
+        if system:
+            block: Dict[str, Any] = {"type": "text", "text": system}
+            if cache_prefix:
+                block["cache_control"] = {"type": "ephemeral"}
+            self._system_blocks = [block]
+        self._prefix_block: Optional[Dict[str, Any]] = None
+        if self.static_prefix.strip():
+            self._prefix_block = {"type": "text", "text": self.static_prefix}
+            if cache_prefix:
+                self._prefix_block["cache_control"] = {"type": "ephemeral"}
+
+    def render_dynamic(self, row: Dict[str, Any]) -> str:
+        """Fill the per-row part of the template (everything after the static prefix)."""
+        formatter = string.Formatter()
+        out = []
+        for literal, name, spec, conversion in self._dynamic:
+            out.append(literal)
+            if name is None:
+                continue
+            value = formatter.get_field(name, (), row)[0]
+            if conversion:
+                value = formatter.convert_field(value, conversion)
+            out.append(format(value, spec or ""))
+        return "".join(out)
+
+    def render(self, row: Dict[str, Any]) -> str:
+        """The full user message for a row."""
+        return self.static_prefix + self.render_dynamic(row)
+
+    def request_params(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """``system`` and ``messages`` for messages.create, sharing the static prefix blocks."""
+        missing = [name for name in self.fields if name.split(".")[0].split("[")[0] not in row]
+        if missing:
+            raise KeyError(f"Row is missing template fields: {', '.join(missing)}")
+        if self._prefix_block is not None:
+            content: Any = [self._prefix_block]
+            dynamic = self.render_dynamic(row)
+            if dynamic:
+                # A template without slots (or ending in an empty one) has no per-row block;
+                # the API rejects empty text blocks
+                content.append({"type": "text", "text": dynamic})
+        else:
+            content = self.render(row)
+        params: Dict[str, Any] = {"messages": [{"role": "user", "content": content}]}
+        if self._system_blocks:
+            params["system"] = self._system_blocks
+        return params
+
+
+def iter_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows from a CSV (with header) or JSONL file without loading it whole.
+    Blank JSONL lines are skipped.
+    """
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """
+    IDs of rows already written successfully to a JSONL output file.
+    A truncated last line (from a crash mid-write) is ignored and its row is redone.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "output" in record:
+                done.add(str(record["id"]))
+    return done
+
+
+def _drop_failed(output_path: str) -> None:
+    """
+    Remove error lines (and a truncated last line) from an output file before
+    their rows are retried, so each row ends up with one line: its final attempt.
+    """
+    if not os.path.exists(output_path):
+        return
+    kept: List[str] = []
+    stale = 0
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if isinstance(record, dict) and "output" in record:
+                kept.append(line if line.endswith("\n") else line + "\n")
+            elif line.strip():
+                stale += 1
+    if not stale:
+        return
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(kept)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_path)
+
+
+class BulkGenerator:
+    """Generate one response per row with a compiled PromptTemplate."""
+
+    def __init__(
+        self,
+        template: PromptTemplate,
+        client: Optional[Any] = None,
+        model: str = "claude-sonnet-4-20250514",
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        concurrency: int = 8,
+        requests_per_minute: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        """
+        Args:
+            template: Compiled prompt template
+            client: ClaudeClient (its scheduler, limiter and ledger apply) or
+                Anthropic client (default: the shared registry client)
+            model: Model used unless ``client`` is a ClaudeClient
+            max_tokens: Maximum tokens per response
+            temperature: Sampling temperature
+            concurrency: Requests in flight at once
+            requests_per_minute: Rate limit (ignored if ``rate_limiter`` is given)
+            rate_limiter: Shared RateLimiter, e.g. one per API key across jobs
+            limiter: AdaptiveLimiter that tunes the requests in flight (up to its
+                ``max_limit``) instead of a fixed ``concurrency``. A ClaudeClient's
+                own limiter is used automatically.
+        """
+        if client is None:
+            from .registry import get_client
+            client = get_client()
+        wrapped = hasattr(client, "chat")
+        if wrapped:
+            own = getattr(client, "limiter", None)
+            if limiter is not None and limiter is not own:
+                raise ValueError("Give the AdaptiveLimiter to the ClaudeClient (limiter=...) instead")
+            limiter = own
+        self.template = template
+        self.client = client
+        self.model = getattr(client, "model", model)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.concurrency = limiter.max_limit if limiter is not None else max(1, concurrency)
+        self.limiter = limiter
+        # A ClaudeClient's create() applies its limiter itself
+        self._send = client.create if wrapped else client.messages.create
+        self._unretried = client.with_options(max_retries=0) if limiter is not None and not wrapped else None
+        if rate_limiter is None and requests_per_minute:
+            rate_limiter = RateLimiter(requests_per_minute)
+        self.rate_limiter = rate_limiter
+
+    def generate(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate the response for one row (no checkpointing)."""
+        params = self.template.request_params(row)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        params.update(model=self.model, max_tokens=self.max_tokens, temperature=self.temperature)
+        if self._unretried is None:
+            response = self._send(**params)
+        else:
+            response = self.limiter.call(lambda: self._unretried.messages.create(**params), self.client.max_retries)
+        usage = response.usage
+        return {
+            "output": "".join(block.text for block in response.content if getattr(block, "type", "") == "text"),
+            "stop_reason": response.stop_reason,
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+        }
+
+    def run(
+        self,
+        rows_path: str,
+        output_path: str,
+        id_field: Optional[str] = None,
+        limit: Optional[int] = None,
+        progress_every: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        Generate every row of ``rows_path`` that is not yet in ``output_path``.
+
+        Each result is appended to the output as one JSON line
+        (``{"id", "output", ...}`` or ``{"id", "error"}``) and flushed, so the
+        output file doubles as the checkpoint. Failed rows are retried on the
+        next run, which first drops their error lines, so the output holds one
+        line per row.
+
+        Args:
+            rows_path: CSV or JSONL input
+            output_path: JSONL output / checkpoint file
+            id_field: Column holding a unique row ID (default: the row number); rows
+                without one are written as failed
+            limit: Stop after this many input rows
+            progress_every: Print a progress line every N finished rows (0 = quiet)
+
+        Returns:
+            dict: rows, skipped, generated, failed, tokens and elapsed seconds
+        """
+        _drop_failed(output_path)
+        done = completed_ids(output_path)
+        stats = {"rows": 0, "skipped": 0, "generated": 0, "failed": 0,
+                 "input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 0}
+        started = time.perf_counter()
+
+        _ensure_trailing_newline(output_path)
+        with open(output_path, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending: Dict[Future, str] = {}
+
+            def drain(block: bool) -> None:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED) if block else (
+                    [f for f in pending if f.done()], None)
+                for future in finished:
+                    row_id = pending.pop(future)
+                    try:
+                        record = {"id": row_id, **future.result()}
+                        stats["generated"] += 1
+                        for field in ("input_tokens", "output_tokens", "cache_read_input_tokens"):
+                            stats[field] += record[field]
+                    except Exception as e:
+                        record = {"id": row_id, "error": f"{type(e).__name__}: {e}"}
+                        stats["failed"] += 1
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    finished_count = stats["generated"] + stats["failed"]
+                    if progress_every and finished_count % progress_every == 0:
+                        rate = finished_count / max(1e-9, time.perf_counter() - started)
+                        print(f"  {finished_count} done ({stats['failed']} failed, {rate:.1f} rows/s)", file=sys.stderr)
+
+            for index, row in enumerate(iter_rows(rows_path), 1):
+                if limit is not None and index > limit:
+                    break
+                stats["rows"] += 1
+                if id_field and row.get(id_field) in (None, ""):
+                    # Without an ID the row cannot be resumed: fail it alone, not the whole run
+                    error = f"Row {index} has no value in id field {id_field!r}"
+                    out.write(json.dumps({"id": None, "row": index, "error": error}, ensure_ascii=False) + "\n")
+                    out.flush()
+                    stats["failed"] += 1
+                    continue
+                row_id = str(row[id_field]) if id_field else str(index)
+                if row_id in done:
+                    stats["skipped"] += 1
+                    continue
+                # Keep only a small window of rows in memory
+                while len(pending) >= self.concurrency * 2:
+                    drain(block=True)
+                pending[pool.submit(self.generate, row)] = row_id
+            while pending:
+                drain(block=True)
+            os.fsync(out.fileno())
+
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        return stats
+
+
+def _ensure_trailing_newline(path: str) -> None:
+    """Terminate a line cut short by a crash so appended records start on their own line."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate one Claude response per CSV/JSONL row from a prompt template")
+    parser.add_argument("rows", help="CSV (with header) or JSONL input")
+    parser.add_argument("output", help="JSONL output; re-running resumes where it stopped")
+    parser.add_argument("--template", required=True, help="File with the user prompt template ({column} slots)")
+    parser.add_argument("--system", help="File with the system prompt")
+    parser.add_argument("--id-field", help="Column with a unique row ID (default: row number)")
+    parser.add_argument("--model", default="claude-sonnet-4-20250514")
+    parser.add_argument("--max-tokens", type=int, default=1024)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, help="Requests per minute limit")
+    parser.add_argument("--limit", type=int, help="Only process the first N rows")
+    args = parser.parse_args()
+
+    with open(args.template, encoding="utf-8") as f:
+        template_text = f.read()
+    system = None
+    if args.system:
+        with open(args.system, encoding="utf-8") as f:
+            system = f.read()
+
+    generator = BulkGenerator(
+        PromptTemplate(template_text, system=system),
+        model=args.model,
+        max_tokens=args.max_tokens,
+        temperature=args.temperature,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+    )
+    stats = generator.run(args.rows, args.output, id_field=args.id_field, limit=args.limit, progress_every=100)
+    print(
+        f"✅ {stats['generated']} generated, {stats['skipped']} already done, {stats['failed']} failed "
+        f"in {stats['seconds']}s ({stats['input_tokens']} in / {stats['output_tokens']} out tokens, "
+        f"{stats['cache_read_input_tokens']} from cache)"
+    )
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
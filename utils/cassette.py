@@ -0,0 +1,464 @@
+"""
+Record/replay cassettes for deterministic, offline Claude API runs.
+
+A cassette is a single SQLite file of request/response pairs, indexed by a
+hash of the request. Streaming (SSE) bodies are stored chunk by chunk with
+their arrival times, so replays can run at full speed or with the recorded
+pacing. API keys and other request headers are never written.
+
+Usage:
+    cassette = Cassette("cassettes/summaries.db", mode="record")
+    client = ClaudeClient(http_client=cassette.http_client())
+    raw = Anthropic(http_client=cassette.http_client())
+
+    # Run any example offline (no edits to the script needed):
+    python -m utils.cassette record cassettes/05.db examples/05_code_review.py
+    python -m utils.cassette replay --timing 1.0 cassettes/05.db examples/05_code_review.py
+    python -m utils.cassette replay cassettes/my.db my_script.py -- --verbose
+
+Options go before the cassette path; everything after the script (or after
+``--``) is passed to the script untouched.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import runpy
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+
+MODES = ("record", "replay", "auto")
+
+# Response headers that describe the original connection rather than the content
+SKIPPED_HEADERS = {"content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie", "date"}
+
+_CHUNK_HEADER = struct.Struct("<dI")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    request_body BLOB,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    ttfb REAL NOT NULL,
+    chunks BLOB NOT NULL,
+    PRIMARY KEY (key, seq)
+) WITHOUT ROWID
+"""
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request has no recording."""
+
+
+class Interaction:
+    """One recorded exchange: status, headers and timed body chunks."""
+
+    __slots__ = ("status", "headers", "ttfb", "chunks")
+
+    def __init__(self, status: int, headers: List[Tuple[str, str]], ttfb: float, chunks: List[Tuple[float, bytes]]):
+        self.status = status
+        self.headers = headers
+        self.ttfb = ttfb
+        self.chunks = chunks
+
+
+def _pack_chunks(chunks: List[Tuple[float, bytes]]) -> bytes:
+    parts = []
+    for delay, data in chunks:
+        parts.append(_CHUNK_HEADER.pack(delay, len(data)))
+        parts.append(data)
+    return zlib.compress(b"".join(parts), 6)
+
+
+def _unpack_chunks(blob: bytes) -> List[Tuple[float, bytes]]:
+    raw = zlib.decompress(blob)
+    chunks = []
+    offset = 0
+    while offset < len(raw):
+        delay, length = _CHUNK_HEADER.unpack_from(raw, offset)
+        offset += _CHUNK_HEADER.size
+        chunks.append((delay, raw[offset:offset + length]))
+        offset += length
+    return chunks
+
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    """
+    Stable key for a request: method, path (with query) and canonicalized JSON body.
+    The host is left out so a cassette recorded against one base URL replays against any other.
+    """
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode() if body else b""
+    except ValueError:
+        canonical = body
+    digest = hashlib.sha256()
+    digest.update(f"{method.upper()} {path}\n".encode())
+    digest.update(canonical)
+    return digest.hexdigest()
+
+
+class Cassette:
+    """
+    Store of recorded API interactions.
+
+    Modes:
+        record: always call the API and store the response
+        replay: never touch the network; raise CassetteMissError for unknown requests
+        auto:   replay when a recording exists, otherwise record
+
+    Identical requests are matched in order: the n-th identical request
+    replays the n-th recording (repeating the last one once they run out).
+    """
+
+    def __init__(self, path: str, mode: str = "replay", timing: float = 0.0):
+        """
+        Args:
+            path: Cassette file (created when recording)
+            mode: "record", "replay" or "auto"
+            timing: Multiplier for recorded delays on replay (0 = full speed, 1 = as recorded)
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if mode == "replay" and not os.path.exists(path):
+            raise FileNotFoundError(f"Cassette not found: {path}")
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.stats = {"recorded": 0, "replayed": 0}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self._seen: Dict[str, int] = defaultdict(int)
+
+    # ----- storage -----
+
+    def _next_seq(self, key: str) -> int:
+        with self._lock:
+            seq = self._seen[key]
+            self._seen[key] += 1
+            return seq
+
+    def lookup(self, key: str, seq: int) -> Optional[Interaction]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, ttfb, chunks FROM interactions WHERE key = ? AND seq <= ? ORDER BY seq DESC LIMIT 1",
+                (key, seq),
+            ).fetchone()
+        if row is None:
+            return None
+        status, headers, ttfb, chunks = row
+        return Interaction(status, [tuple(h) for h in json.loads(headers)], ttfb, _unpack_chunks(chunks))
+
+    def save(self, key: str, seq: int, request: httpx.Request, body: bytes, interaction: Interaction) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO interactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, seq, request.method, str(request.url), zlib.compress(body, 6),
+                    interaction.status, json.dumps(interaction.headers), interaction.ttfb,
+                    _pack_chunks(interaction.chunks),
+                ),
+            )
+            self._db.commit()
+            self.stats["recorded"] += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # ----- request handling shared by the sync and async transports -----
+
+    def _prepare(self, request: httpx.Request, body: bytes) -> Tuple[str, int, Optional[Interaction]]:
+        key = request_key(request.method, request.url.raw_path.decode("ascii"), body)
+        seq = self._next_seq(key)
+        recorded = None if self.mode == "record" else self.lookup(key, seq)
+        if recorded is None and self.mode == "replay":
+            raise CassetteMissError(f"No recording for {request.method} {request.url} in {self.path}")
+        if recorded is not None:
+            with self._lock:
+                self.stats["replayed"] += 1
+        return key, seq, recorded
+
+    def _headers(self, recorded: Interaction) -> List[Tuple[str, str]]:
+        return [(k, v) for k, v in recorded.headers if k.lower() not in SKIPPED_HEADERS]
+
+    # ----- clients -----
+
+    def transport(self, inner: Optional[httpx.BaseTransport] = None) -> "CassetteTransport":
+        return CassetteTransport(self, inner)
+
+    def async_transport(self, inner: Optional[httpx.AsyncBaseTransport] = None) -> "AsyncCassetteTransport":
+        return AsyncCassetteTransport(self, inner)
+
+    def http_client(self, **kwargs: Any) -> httpx.Client:
+        """An httpx client with SDK defaults, for ``Anthropic(http_client=...)``."""
+        from anthropic import DefaultHttpxClient
+        return DefaultHttpxClient(transport=self.transport(), **kwargs)
+
+    def async_http_client(self, **kwargs: Any) -> httpx.AsyncClient:
+        """An async httpx client with SDK defaults, for ``AsyncAnthropic(http_client=...)``."""
+        from anthropic import DefaultAsyncHttpxClient
+        return DefaultAsyncHttpxClient(transport=self.async_transport(), **kwargs)
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks: List[Tuple[float, bytes]], timing: float):
+        self._chunks = chunks
+        self._timing = timing
+
+    def __iter__(self) -> Iterator[bytes]:
+        previous = 0.0
+        for at, data in self._chunks:
+            if self._timing and at > previous:
+                time.sleep((at - previous) * self._timing)
+            previous = at
+            yield data
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, started: float, on_close: Any):
+        self._inner = inner
+        self._started = started
+        self._on_close = on_close
+        self._chunks: List[Tuple[float, bytes]] = []
+        self._closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for data in self._inner:
+            self._chunks.append((time.perf_counter() - self._started, data))
+            yield data
+
+    def close(self) -> None:
+        self._inner.close()
+        if not self._closed:
+            self._closed = True
+            self._on_close(self._chunks)
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that records to, or replays from, a Cassette."""
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.BaseTransport] = None):
+        self.cassette = cassette
+        self._inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        key, seq, recorded = self.cassette._prepare(request, body)
+
+        if recorded is not None:
+            if self.cassette.timing and recorded.ttfb:
+                time.sleep(recorded.ttfb * self.cassette.timing)
+            return httpx.Response(
+                recorded.status,
+                headers=self.cassette._headers(recorded),
+                stream=_ReplayStream(recorded.chunks, self.cassette.timing),
+            )
+
+        if self._inner is None:
+            self._inner = httpx.HTTPTransport()
+        started = time.perf_counter()
+        response = self._inner.handle_request(request)
+        ttfb = time.perf_counter() - started
+        headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in response.headers.raw]
+
+        def save(chunks: List[Tuple[float, bytes]]) -> None:
+            self.cassette.save(key, seq, request, body, Interaction(response.status_code, headers, ttfb, chunks))
+
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, started, save),
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        if self._inner is not None:
+            self._inner.close()
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[Tuple[float, bytes]], timing: float):
+        self._chunks = chunks
+        self._timing = timing
+
+    async def __aiter__(self) -> Any:
+        previous = 0.0
+        for at, data in self._chunks:
+            if self._timing and at > previous:
+                await asyncio.sleep((at - previous) * self._timing)
+            previous = at
+            yield data
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, started: float, on_close: Any):
+        self._inner = inner
+        self._started = started
+        self._on_close = on_close
+        self._chunks: List[Tuple[float, bytes]] = []
+        self._closed = False
+
+    async def __aiter__(self) -> Any:
+        async for data in self._inner:
+            self._chunks.append((time.perf_counter() - self._started, data))
+            yield data
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+        if not self._closed:
+            self._closed = True
+            self._on_close(self._chunks)
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """Async httpx transport that records to, or replays from, a Cassette."""
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        key, seq, recorded = self.cassette._prepare(request, body)
+
+        if recorded is not None:
+            if self.cassette.timing and recorded.ttfb:
+                await asyncio.sleep(recorded.ttfb * self.cassette.timing)
+            return httpx.Response(
+                recorded.status,
+                headers=self.cassette._headers(recorded),
+                stream=_AsyncReplayStream(recorded.chunks, self.cassette.timing),
+            )
+
+        if self._inner is None:
+            self._inner = httpx.AsyncHTTPTransport()
+        started = time.perf_counter()
+        response = await self._inner.handle_async_request(request)
+        ttfb = time.perf_counter() - started
+        headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in response.headers.raw]
+
+        def save(chunks: List[Tuple[float, bytes]]) -> None:
+            self.cassette.save(key, seq, request, body, Interaction(response.status_code, headers, ttfb, chunks))
+
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncRecordingStream(response.stream, started, save),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        if self._inner is not None:
+            await self._inner.aclose()
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = "replay", timing: float = 0.0) -> Iterator[Cassette]:
+    """
+    Route every Anthropic / AsyncAnthropic client created inside the block
+    through a cassette (unless it was given its own ``http_client``),
+    including the shared clients handed out by ``utils.registry``.
+
+    Usage:
+        with use_cassette("cassettes/demo.db", mode="auto"):
+            runpy.run_path("examples/01_basic_chat.py")
+    """
+    import anthropic
+
+    from . import registry
+
+    cassette = Cassette(path, mode=mode, timing=timing)
+    originals = {cls: cls.__init__ for cls in (anthropic.Anthropic, anthropic.AsyncAnthropic)}
+
+    def patch(cls: Any, factory: Any) -> None:
+        original = originals[cls]
+
+        def __init__(self: Any, *args: Any, **kwargs: Any) -> None:
+            if kwargs.get("http_client") is None:
+                kwargs["http_client"] = factory()
+            if cassette.mode == "replay":
+                # A miss will not go away on retry; fail at once with the CassetteMissError
+                kwargs.setdefault("max_retries", 0)
+            original(self, *args, **kwargs)
+
+        cls.__init__ = __init__
+
+    patch(anthropic.Anthropic, cassette.http_client)
+    patch(anthropic.AsyncAnthropic, cassette.async_http_client)
+    registry.reset()
+    registry.set_transport_wrappers(cassette.transport, cassette.async_transport)
+    try:
+        yield cassette
+    finally:
+        for cls, original in originals.items():
+            cls.__init__ = original
+        registry.set_transport_wrappers()
+        registry.reset()
+        cassette.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a script with Claude API calls recorded to / replayed from a cassette")
+    # Options first: everything after the script is handed to it verbatim
+    parser.add_argument("--timing", type=float, default=0.0, help="Replay delay multiplier (0 = full speed, 1 = as recorded)")
+    parser.add_argument("mode", choices=MODES)
+    parser.add_argument("cassette", help="Cassette file")
+    parser.add_argument("script", help="Python script to run")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the script (after the script or --)")
+    args = parser.parse_args()
+    script_args = args.args[1:] if args.args[:1] == ["--"] else args.args
+
+    if args.mode == "replay":
+        # Replays never reach the API, but the examples insist on a key being set
+        os.environ.setdefault("ANTHROPIC_API_KEY", "cassette-replay")
+
+    sys.argv = [args.script] + script_args
+    with use_cassette(args.cassette, mode=args.mode, timing=args.timing) as cassette:
+        try:
+            runpy.run_path(args.script, run_name="__main__")
+        except Exception as e:
+            # The SDK wraps transport errors in APIConnectionError; report a miss as what it is
+            miss = e if isinstance(e, CassetteMissError) else e.__cause__
+            if not isinstance(miss, CassetteMissError):
+                raise
+            print(f"\n📼 {miss}", file=sys.stderr)
+            print("Re-record the cassette (mode 'record' or 'auto') after changing the script.", file=sys.stderr)
+            exit_code = 1
+        else:
+            exit_code = 0
+        finally:
+            print(
+                f"\n📼 {cassette.path}: {cassette.stats['replayed']} replayed, {cassette.stats['recorded']} recorded",
+                file=sys.stderr,
+            )
+    if exit_code:
+        sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,28 +4,156 @@ Provides a simple interface to the Anthropic API with built-in error handling.
 """
 
 import os
-from typing import Optional, List, Dict, Any
-from anthropic import Anthropic
-from .error_handler import handle_api_errors
+import time
+from typing import Optional, List, Dict, Any, Union
+from .concurrency import AdaptiveLimiter
+from .error_handler import handle_api_errors, report_api_error
+from .history import History, acreate_message, create_message
+from .ledger import Ledger
+from .scheduler import RequestScheduler
+from .streaming import AsyncChatStream, ChatStream
 
 
 class ClaudeClient:
     """Wrapper around the Anthropic API client with convenience methods."""
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "claude-sonnet-4-20250514"):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "claude-sonnet-4-20250514",
+        base_url: Optional[str] = None,
+        http_client: Optional[Any] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        traffic_class: str = "interactive",
+        limiter: Optional[AdaptiveLimiter] = None,
+        ledger: Optional[Ledger] = None,
+        tags: Optional[Dict[str, str]] = None
+    ):
         """
         Initialize the Claude client.
         
         Args:
             api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
             model: Claude model to use (default: claude-sonnet-4-20250514)
+            base_url: Optional API base URL (e.g. a gateway or local mock server)
+            http_client: Optional httpx.Client (e.g. ``Cassette.http_client()``).
+                When omitted, the shared pooled client from ``utils.registry`` is used.
+            scheduler: Optional RequestScheduler shared with other clients on the same quota
+            traffic_class: Default scheduler class for this client's requests
+            limiter: Optional AdaptiveLimiter that tunes how many requests run at once.
+                Retries then go through the limiter instead of the SDK.
+            ledger: Optional Ledger that records token usage and cost and enforces budgets
+            tags: Ledger tags for every request of this client (e.g. {"job": "digest"})
         """
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("API key must be provided or set in ANTHROPIC_API_KEY environment variable")
         
-        self.client = Anthropic(api_key=self.api_key)
+        self.base_url = base_url
         self.model = model
+        self.scheduler = scheduler
+        self.traffic_class = traffic_class
+        self.limiter = limiter
+        self.ledger = ledger
+        self.tags = dict(tags or {})
+        # The SDK is imported and the HTTP client built on first use (see ``client``)
+        self._http_client = http_client
+        self._client: Optional[Any] = None
+        self._unretried: Optional[Any] = None
+    
+    @property
+    def client(self) -> Any:
+        """The Anthropic client, created on first use."""
+        if self._client is None:
+            if self._http_client is None:
+                from .registry import get_client
+                
+                self.client = get_client(self.api_key, self.base_url)
+            else:
+                from anthropic import Anthropic
+                
+                self.client = Anthropic(api_key=self.api_key, base_url=self.base_url, http_client=self._http_client)
+        return self._client
+    
+    @client.setter
+    def client(self, client: Any) -> None:
+        self._client = client
+        self._unretried = client.with_options(max_retries=0) if self.limiter is not None else None
+    
+    def _budget(self, params: Dict[str, Any], tags: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+        """Apply ledger budgets to the request's model; returns the request's tags (None without a ledger)."""
+        if self.ledger is None:
+            return None
+        tags = dict(self.tags, **(tags or {}))
+        params["model"] = self.ledger.check(params["model"], tags)
+        return tags
+    
+    def _create(self, params: Dict[str, Any], tags: Optional[Dict[str, str]] = None) -> Any:
+        """messages.create, through the adaptive limiter and ledger when there are any."""
+        tags = self._budget(params, tags)
+        if self.limiter is None:
+            response = create_message(self.client, params)
+        else:
+            response = self.limiter.call(lambda: create_message(self._unretried, params), retries=self.client.max_retries)
+        if tags is not None:
+            self.ledger.record(params["model"], response.usage, tags)
+        return response
+    
+    def _admit(
+        self,
+        params: Dict[str, Any],
+        traffic_class: Optional[str],
+        deadline: Optional[float],
+        queue_timeout: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Wait for a scheduler slot and spend what is left of the deadline on the API timeout.
+        Returns the class to release afterwards (None when there is no scheduler).
+        """
+        started = time.monotonic()
+        admitted = None
+        if self.scheduler is not None:
+            admitted = traffic_class or self.traffic_class
+            self.scheduler.acquire(admitted, timeout=deadline if queue_timeout is None else queue_timeout)
+        if deadline is not None and "timeout" not in params:
+            params["timeout"] = max(0.001, deadline - (time.monotonic() - started))
+        return admitted
+    
+    def create(
+        self,
+        traffic_class: Optional[str] = None,
+        deadline: Optional[float] = None,
+        tags: Optional[Dict[str, str]] = None,
+        queue_timeout: Optional[float] = None,
+        **params
+    ) -> Any:
+        """
+        Send a request with raw Messages API parameters and return the SDK response.
+        
+        Like ``client.messages.create``, but through this client's scheduler,
+        limiter and ledger. Helpers that build their own requests (routing,
+        caches, speculation...) call this instead of the underlying client.
+        
+        Args:
+            traffic_class: Scheduler class for this request (default: the client's)
+            deadline: Seconds allowed for queueing plus the API call
+            tags: Ledger tags for this request, added to the client's
+            queue_timeout: Longest wait for a scheduler slot (default: ``deadline``;
+                0 raises DeadlineExceeded at once when no slot is free)
+            **params: Messages API parameters; ``model`` and ``max_tokens`` default
+                to the client's model and 4096, and ``messages`` may be a History
+            
+        Returns:
+            Message: The SDK response
+        """
+        params.setdefault("model", self.model)
+        params.setdefault("max_tokens", 4096)
+        admitted = self._admit(params, traffic_class, deadline, queue_timeout)
+        try:
+            return self._create(params, tags)
+        finally:
+            if admitted is not None:
+                self.scheduler.release(admitted)
     
     @handle_api_errors
     def chat(
@@ -34,6 +162,9 @@ class ClaudeClient:
         system: Optional[str] = None,
         max_tokens: int = 4096,
         temperature: float = 1.0,
+        traffic_class: Optional[str] = None,
+        deadline: Optional[float] = None,
+        tags: Optional[Dict[str, str]] = None,
         **kwargs
     ) -> str:
         """
@@ -44,6 +175,9 @@ class ClaudeClient:
             system: Optional system prompt
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature (0-1)
+            traffic_class: Scheduler class for this request (default: the client's)
+            deadline: Seconds allowed for queueing plus the API call
+            tags: Ledger tags for this request, added to the client's
             **kwargs: Additional arguments to pass to the API
             
         Returns:
@@ -61,7 +195,7 @@ class ClaudeClient:
             
         params.update(kwargs)
         
-        response = self.client.messages.create(**params)
+        response = self.create(traffic_class=traffic_class, deadline=deadline, tags=tags, **params)
         return response.content[0].text
     
     @handle_api_errors
@@ -71,8 +205,12 @@ class ClaudeClient:
         system: Optional[str] = None,
         max_tokens: int = 4096,
         temperature: float = 1.0,
+        buffer_size: int = 64,
+        traffic_class: Optional[str] = None,
+        deadline: Optional[float] = None,
+        tags: Optional[Dict[str, str]] = None,
         **kwargs
-    ):
+    ) -> ChatStream:
         """
         Send a chat message and stream the response.
         
@@ -81,10 +219,16 @@ class ClaudeClient:
             system: Optional system prompt
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature (0-1)
+            buffer_size: Maximum text chunks buffered ahead of a slow consumer
+            traffic_class: Scheduler class for this request (default: the client's)
+            deadline: Seconds allowed for queueing plus the API call
+            tags: Ledger tags for this request, added to the client's
             **kwargs: Additional arguments to pass to the API
             
-        Yields:
-            str: Chunks of Claude's response
+        Returns:
+            ChatStream: Iterable of response text chunks. Call ``close()`` (or
+            use it as a context manager) to cancel early, and
+            ``get_final_message()`` for usage and stop reason.
         """
         params = {
             "model": self.model,
@@ -98,27 +242,53 @@ class ClaudeClient:
             
         params.update(kwargs)
         
-        with self.client.messages.stream(**params) as stream:
-            for text in stream.text_stream:
-                yield text
+        # Scheduler and limiter slots are held until the stream ends, not just until it starts
+        tags = self._budget(params, tags)
+        on_message = None if tags is None else (lambda message: self.ledger.record(params["model"], message.usage, tags))
+        admitted = self._admit(params, traffic_class, deadline)
+        started = None
+
+        def on_finish(error: Optional[BaseException]) -> None:
+            if started is not None:
+                self.limiter.release(started, error, sample=False)
+            if admitted is not None:
+                self.scheduler.release(admitted)
+
+        try:
+            if self.limiter is not None:
+                started = self.limiter.acquire()
+            manager = self.client.messages.stream(**params)
+        except BaseException:
+            on_finish(None)
+            raise
+        # @handle_api_errors only sees errors up to here; the stream reports the rest while it is read
+        return ChatStream(manager, buffer_size=buffer_size, on_finish=on_finish, on_message=on_message,
+                          on_error=report_api_error)
     
     @handle_api_errors
     def multi_turn_chat(
         self,
-        messages: List[Dict[str, str]],
+        messages: Union[List[Dict[str, str]], History],
         system: Optional[str] = None,
         max_tokens: int = 4096,
         temperature: float = 1.0,
+        traffic_class: Optional[str] = None,
+        deadline: Optional[float] = None,
+        tags: Optional[Dict[str, str]] = None,
         **kwargs
     ) -> str:
         """
         Send a multi-turn conversation and get a response.
         
         Args:
-            messages: List of message dicts with 'role' and 'content' keys
+            messages: List of message dicts with 'role' and 'content' keys, or a History
+                (sent as its pre-serialized body; the reply is not appended)
             system: Optional system prompt
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature (0-1)
+            traffic_class: Scheduler class for this request (default: the client's)
+            deadline: Seconds allowed for queueing plus the API call
+            tags: Ledger tags for this request, added to the client's
             **kwargs: Additional arguments to pass to the API
             
         Returns:
@@ -136,5 +306,213 @@ class ClaudeClient:
             
         params.update(kwargs)
         
-        response = self.client.messages.create(**params)
+        response = self.create(traffic_class=traffic_class, deadline=deadline, tags=tags, **params)
         return response.content[0].text
+
+
+class AsyncClaudeClient:
+    """Asyncio counterpart of ClaudeClient, built on AsyncAnthropic."""
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "claude-sonnet-4-20250514",
+        base_url: Optional[str] = None,
+        http_client: Optional[Any] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+        ledger: Optional[Ledger] = None,
+        tags: Optional[Dict[str, str]] = None
+    ):
+        """
+        Initialize the async Claude client.
+        
+        Args:
+            api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
+            model: Claude model to use (default: claude-sonnet-4-20250514)
+            base_url: Optional API base URL (e.g. a gateway or local mock server)
+            http_client: Optional httpx.AsyncClient (e.g. ``Cassette.async_http_client()``)
+            limiter: Optional AdaptiveLimiter for ``chat`` and ``multi_turn_chat``
+                (shareable with threaded clients)
+            ledger: Optional Ledger for ``chat`` and ``multi_turn_chat`` usage and budgets
+            tags: Ledger tags for every request of this client
+        """
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+        if not self.api_key:
+            raise ValueError("API key must be provided or set in ANTHROPIC_API_KEY environment variable")
+        
+        self.base_url = base_url
+        self.model = model
+        self.limiter = limiter
+        self.ledger = ledger
+        self.tags = dict(tags or {})
+        self._http_client = http_client
+        self._client: Optional[Any] = None
+        self._unretried: Optional[Any] = None
+    
+    @property
+    def client(self) -> Any:
+        """The AsyncAnthropic client, created on first use."""
+        if self._client is None:
+            from anthropic import AsyncAnthropic
+            
+            self.client = AsyncAnthropic(api_key=self.api_key, base_url=self.base_url, http_client=self._http_client)
+        return self._client
+    
+    @client.setter
+    def client(self, client: Any) -> None:
+        self._client = client
+        self._unretried = client.with_options(max_retries=0) if self.limiter is not None else None
+    
+    async def _create(self, params: Dict[str, Any], tags: Optional[Dict[str, str]] = None) -> Any:
+        """messages.create, through the adaptive limiter and ledger when there are any."""
+        if self.ledger is not None:
+            tags = dict(self.tags, **(tags or {}))
+            params["model"] = self.ledger.check(params["model"], tags)
+        if self.limiter is None:
+            response = await acreate_message(self.client, params)
+        else:
+            response = await self.limiter.call_async(
+                lambda: acreate_message(self._unretried, params), retries=self.client.max_retries
+            )
+        if self.ledger is not None:
+            self.ledger.record(params["model"], response.usage, tags)
+        return response
+    
+    async def create(self, tags: Optional[Dict[str, str]] = None, **params) -> Any:
+        """
+        Send a request with raw Messages API parameters and return the SDK response.
+        
+        Like ``client.messages.create``, but through this client's limiter and ledger.
+        
+        Args:
+            tags: Ledger tags for this request, added to the client's
+            **params: Messages API parameters; ``model`` and ``max_tokens`` default
+                to the client's model and 4096, and ``messages`` may be a History
+            
+        Returns:
+            Message: The SDK response
+        """
+        params.setdefault("model", self.model)
+        params.setdefault("max_tokens", 4096)
+        return await self._create(params, tags)
+    
+    @handle_api_errors
+    async def chat(
+        self,
+        message: str,
+        system: Optional[str] = None,
+        max_tokens: int = 4096,
+        temperature: float = 1.0,
+        tags: Optional[Dict[str, str]] = None,
+        **kwargs
+    ) -> str:
+        """
+        Send a single chat message and get a response.
+        
+        Args:
+            message: User message to send
+            system: Optional system prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature (0-1)
+            tags: Ledger tags for this request, added to the client's
+            **kwargs: Additional arguments to pass to the API
+            
+        Returns:
+            str: Claude's response text
+        """
+        params = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": message}]
+        }
+        
+        if system:
+            params["system"] = system
+            
+        params.update(kwargs)
+        
+        response = await self._create(params, tags)
+        return response.content[0].text
+    
+    def chat_stream(
+        self,
+        message: str,
+        system: Optional[str] = None,
+        max_tokens: int = 4096,
+        temperature: float = 1.0,
+        **kwargs
+    ) -> AsyncChatStream:
+        """
+        Send a chat message and stream the response.
+        
+        The request is sent when the stream is entered or first iterated.
+        
+        Args:
+            message: User message to send
+            system: Optional system prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature (0-1)
+            **kwargs: Additional arguments to pass to the API
+            
+        Returns:
+            AsyncChatStream: Async iterable of response text chunks
+        """
+        params = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": message}]
+        }
+        
+        if system:
+            params["system"] = system
+            
+        params.update(kwargs)
+        
+        return AsyncChatStream(self.client.messages.stream(**params))
+    
+    @handle_api_errors
+    async def multi_turn_chat(
+        self,
+        messages: Union[List[Dict[str, str]], History],
+        system: Optional[str] = None,
+        max_tokens: int = 4096,
+        temperature: float = 1.0,
+        tags: Optional[Dict[str, str]] = None,
+        **kwargs
+    ) -> str:
+        """
+        Send a multi-turn conversation and get a response.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys, or a History
+                (sent as its pre-serialized body; the reply is not appended)
+            system: Optional system prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature (0-1)
+            tags: Ledger tags for this request, added to the client's
+            **kwargs: Additional arguments to pass to the API
+            
+        Returns:
+            str: Claude's response text
+        """
+        params = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": messages
+        }
+        
+        if system:
+            params["system"] = system
+            
+        params.update(kwargs)
+        
+        response = await self._create(params, tags)
+        return response.content[0].text
+    
+    async def close(self) -> None:
+        """Close the underlying HTTP connection pool (if it was ever opened)."""
+        if self._client is not None:
+            await self._client.close()
@@ -0,0 +1,896 @@
+"""
+Repository-scale code review with content-hash caching.
+
+Files are split into review units at function/class boundaries (via ``ast``
+for Python), units are reviewed concurrently, and findings are cached by a
+hash of each unit's source. On the next run, unchanged units are answered
+from the cache, so review time and cost scale with what changed.
+
+Usage:
+    from utils.code_review import review_repository
+
+    review = review_repository(["src/"], cache_path=".review_cache.db")
+    for finding in review.findings:
+        print(finding)           # src/db.py:12 [SECURITY] SQL injection ...
+    print(review.stats)          # {'units': 40, 'cached': 38, 'reviewed': 2, ...}
+
+    # Pull requests: send only the changed hunks plus their enclosing function
+    review = review_diff(subprocess.check_output(["git", "diff", "main"], text=True), repo_root=".")
+
+    # One piece of code, several lenses, sent once
+    review = review_code(source, lenses=["security", "performance"])
+    print(review.lenses["security"])
+
+    # Or from the command line:
+    python -m utils.code_review src/ --concurrency 8
+    git diff main | python -m utils.code_review --diff -
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+CATEGORIES = ("SECURITY", "PERFORMANCE", "STYLE")
+
+# Bump when the prompt or finding format changes so old cache entries are ignored
+PROMPT_VERSION = "1"
+
+DEFAULT_EXTENSIONS = (".py",)
+SKIPPED_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", "venv", ".venv", "env", "build", "dist"}
+
+LANGUAGES = {".py": "python", ".js": "javascript", ".ts": "typescript", ".go": "go", ".java": "java", ".rb": "ruby"}
+
+REVIEW_SYSTEM = """You are an expert code reviewer with deep knowledge of security, performance, and best practices.
+
+Review the numbered code excerpt. Report each real, actionable issue on its own line as:
+[SECURITY] L<line>: <issue and how to fix it>
+[PERFORMANCE] L<line>: <issue and how to fix it>
+[STYLE] L<line>: <issue and how to fix it>
+
+Use the line numbers shown. If there are no issues, reply with NO ISSUES."""
+
+_FINDING = re.compile(
+    r"^(?:\d+[.)])?\W*\[(?P<category>SECURITY|PERFORMANCE|STYLE)\]\W*(?:L(?:INE)?\s*(?P<line>\d+)\b)?[\s:.-]*(?P<message>.*)$",
+    re.IGNORECASE,
+)
+_LINE_IN_TEXT = re.compile(r"\blines?\s+(\d+)", re.IGNORECASE)
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS findings (
+    hash TEXT PRIMARY KEY,
+    findings TEXT NOT NULL,
+    created REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+class ReviewUnit:
+    """A contiguous slice of a file (1-based, inclusive line range) reviewed in one call."""
+
+    __slots__ = ("path", "name", "start_line", "end_line", "source")
+
+    def __init__(self, path: str, name: str, start_line: int, end_line: int, source: str):
+        self.path = path
+        self.name = name
+        self.start_line = start_line
+        self.end_line = end_line
+        self.source = source
+
+    def __repr__(self) -> str:
+        return f"ReviewUnit({self.path}:{self.start_line}-{self.end_line} {self.name})"
+
+
+class Finding:
+    """One issue reported by the reviewer, mapped back to file:line."""
+
+    __slots__ = ("path", "line", "category", "message", "unit", "severity")
+
+    def __init__(self, path: str, line: int, category: str, message: str, unit: str = "", severity: str = ""):
+        self.path = path
+        self.line = line
+        self.category = category
+        self.message = message
+        self.unit = unit
+        self.severity = severity
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "path": self.path, "line": self.line, "category": self.category,
+            "message": self.message, "unit": self.unit, "severity": self.severity,
+        }
+
+    def __str__(self) -> str:
+        return f"{self.path}:{self.line} [{self.category}] {self.message}"
+
+    def __repr__(self) -> str:
+        return f"Finding({self})"
+
+
+class RepositoryReview:
+    """Findings for a whole review run plus call/cache statistics."""
+
+    def __init__(self, findings: List[Finding], stats: Dict[str, Any]):
+        self.findings = findings
+        self.stats = stats
+
+    def by_file(self) -> Dict[str, List[Finding]]:
+        grouped: Dict[str, List[Finding]] = {}
+        for finding in self.findings:
+            grouped.setdefault(finding.path, []).append(finding)
+        return grouped
+
+    def by_category(self) -> Dict[str, List[Finding]]:
+        grouped: Dict[str, List[Finding]] = {category: [] for category in CATEGORIES}
+        for finding in self.findings:
+            grouped.setdefault(finding.category, []).append(finding)
+        return grouped
+
+
+class ReviewCache:
+    """
+    SQLite store of findings keyed by unit content hash.
+
+    Line numbers are stored relative to the unit, so a function that only
+    moved within its file (or to another file) is still a cache hit.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(CACHE_SCHEMA)
+
+    def get(self, key: str) -> Optional[List[Tuple[int, str, str]]]:
+        row = self._db.execute("SELECT findings FROM findings WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return [tuple(item) for item in json.loads(row[0])]
+
+    def put(self, key: str, findings: List[Tuple[int, str, str]]) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO findings (hash, findings, created) VALUES (?, ?, ?)",
+            (key, json.dumps(findings), time.time()),
+        )
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+
+def iter_source_files(paths: Iterable[str], extensions: Sequence[str] = DEFAULT_EXTENSIONS) -> Iterator[str]:
+    """Yield source files under ``paths`` (files or directories), skipping VCS/build/venv directories."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS and not d.startswith("."))
+            for name in sorted(files):
+                if name.endswith(tuple(extensions)):
+                    yield os.path.join(root, name)
+
+
+def _split_body(
+    path: str, lines: List[str], body: List[ast.stmt], first: int, last: int, max_lines: int, prefix: str, fallback: str
+) -> List[ReviewUnit]:
+    """
+    Cover lines ``first..last`` with units: one per function/class, and one per
+    run of other statements. Comments and blank lines before a statement go
+    with it. Boundaries only depend on the code itself, so editing one
+    function leaves every other unit (and its cache entry) untouched.
+    """
+    definitions = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+    spans: List[Tuple[int, int, Optional[ast.stmt]]] = []
+    cursor = first
+    for index, node in enumerate(body):
+        end = last if index == len(body) - 1 else node.end_lineno
+        if isinstance(node, definitions):
+            spans.append((cursor, end, node))
+        elif spans and spans[-1][2] is None:
+            spans[-1] = (spans[-1][0], end, None)
+        else:
+            spans.append((cursor, end, None))
+        cursor = end + 1
+
+    units = []
+    for start, end, node in spans:
+        if node is None:
+            name = prefix.rstrip(".") or fallback
+        else:
+            name = prefix + node.name
+        if isinstance(node, ast.ClassDef) and end - start + 1 > max_lines and node.body:
+            # Large class: header lines travel with the first member
+            units.extend(_split_body(path, lines, node.body, start, end, max_lines, name + ".", name))
+            continue
+        units.append(ReviewUnit(path, name, start, end, "".join(lines[start - 1:end])))
+    return units
+
+
+def split_units(path: str, source: str, max_lines: int = 200) -> List[ReviewUnit]:
+    """
+    Split a file into review units.
+
+    Small files are reviewed whole. Larger Python files are split at
+    top-level function/class boundaries (and large classes at method
+    boundaries); other files, or Python that does not parse, fall back to
+    fixed windows of ``max_lines``.
+
+    Returns:
+        list: ReviewUnits covering every line of the file
+    """
+    lines = source.splitlines(keepends=True)
+    if not lines or not source.strip():
+        return []
+    if len(lines) <= max_lines:
+        return [ReviewUnit(path, "<module>", 1, len(lines), source)]
+
+    if path.endswith(".py"):
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            tree = None
+        if tree is not None and tree.body:
+            return [u for u in _split_body(path, lines, tree.body, 1, len(lines), max_lines, "", "<module>") if u.source.strip()]
+
+    return [
+        ReviewUnit(path, f"lines {start}-{min(start + max_lines - 1, len(lines))}", start,
+                   min(start + max_lines - 1, len(lines)), "".join(lines[start - 1:start - 1 + max_lines]))
+        for start in range(1, len(lines) + 1, max_lines)
+    ]
+
+
+def number_lines(source: str, first: int = 1) -> str:
+    """Prefix each line with its number so findings can cite lines."""
+    return "".join(f"{number:>5} | {line}" for number, line in enumerate(source.splitlines(keepends=True), first))
+
+
+def parse_findings(text: str, default_line: int = 1) -> List[Tuple[int, str, str]]:
+    """
+    Parse ``[CATEGORY] L<line>: message`` lines from a review.
+
+    Lines written as "... on line 12" are understood too; findings with no
+    line number at all are attributed to ``default_line``.
+
+    Returns:
+        list: (line, category, message) tuples
+    """
+    findings = []
+    for raw in text.splitlines():
+        match = _FINDING.match(raw.strip())
+        if not match:
+            continue
+        message = match.group("message").strip()
+        line = match.group("line")
+        if line is None:
+            mentioned = _LINE_IN_TEXT.search(message)
+            line = mentioned.group(1) if mentioned else None
+        findings.append((int(line) if line else default_line, match.group("category").upper(), message))
+    return findings
+
+
+def unit_hash(unit: ReviewUnit, model: str, system: str) -> str:
+    """Cache key: prompt version, model, system prompt and the unit's source (not its path or position)."""
+    digest = hashlib.sha256()
+    for part in (PROMPT_VERSION, model, system, os.path.splitext(unit.path)[1], unit.source):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _unit_prompt(unit: ReviewUnit) -> str:
+    language = LANGUAGES.get(os.path.splitext(unit.path)[1], "")
+    return f"Please review this code:\n\n```{language}\n{number_lines(unit.source)}```"
+
+
+def review_repository(
+    paths: Sequence[str],
+    client: Optional[Any] = None,
+    model: str = "claude-sonnet-4-20250514",
+    cache_path: Optional[str] = ".review_cache.db",
+    concurrency: int = 8,
+    max_unit_lines: int = 200,
+    extensions: Sequence[str] = DEFAULT_EXTENSIONS,
+    system: str = REVIEW_SYSTEM,
+    max_tokens: int = 2048,
+) -> RepositoryReview:
+    """
+    Review every source file under ``paths``.
+
+    Units whose content hash is already cached cost no API call; identical
+    units within a run are reviewed once. Failed units are reported in
+    ``stats["errors"]`` and are not cached, so the next run retries them.
+
+    Args:
+        paths: Files and/or directories to review
+        client: ClaudeClient to use (default: a new one for ``model``)
+        model: Model used when ``client`` is not given (part of the cache key)
+        cache_path: SQLite cache file (None disables caching)
+        concurrency: Units reviewed in parallel
+        max_unit_lines: Files longer than this are split into units
+        extensions: File extensions to include when walking directories
+        system: Review system prompt (part of the cache key)
+        max_tokens: Maximum tokens per review response
+
+    Returns:
+        RepositoryReview: Findings sorted by file and line, plus stats
+    """
+    if client is None:
+        from .client import ClaudeClient
+        client = ClaudeClient(model=model)
+    model = getattr(client, "model", model)
+
+    started = time.perf_counter()
+    units: List[ReviewUnit] = []
+    files = 0
+    for path in iter_source_files(paths, extensions):
+        try:
+            with open(path, encoding="utf-8") as f:
+                source = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠️  Skipping {path}: {e}", file=sys.stderr)
+            continue
+        files += 1
+        units.extend(split_units(path, source, max_unit_lines))
+
+    cache = ReviewCache(cache_path) if cache_path else None
+    results: Dict[str, List[Tuple[int, str, str]]] = {}
+    pending: Dict[str, ReviewUnit] = {}
+    for unit in units:
+        key = unit_hash(unit, model, system)
+        if key in results or key in pending:
+            continue
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            results[key] = cached
+        else:
+            pending[key] = unit
+    cached_count = len(results)
+
+    def review(unit: ReviewUnit) -> List[Tuple[int, str, str]]:
+        text = client.chat(_unit_prompt(unit), system=system, max_tokens=max_tokens, temperature=0.2)
+        return parse_findings(text)
+
+    errors = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {pool.submit(review, unit): key for key, unit in pending.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except Exception:
+                    errors += 1
+                    continue
+                if cache:
+                    cache.put(key, results[key])
+    finally:
+        if cache:
+            cache.close()
+
+    findings = []
+    for unit in units:
+        unit_findings = results.get(unit_hash(unit, model, system))
+        for line, category, message in unit_findings or ():
+            line = min(max(line, 1), unit.end_line - unit.start_line + 1)
+            findings.append(Finding(unit.path, unit.start_line + line - 1, category, message, unit.name))
+    findings.sort(key=lambda f: (f.path, f.line))
+
+    stats = {
+        "files": files,
+        "units": len(units),
+        "unique_units": cached_count + len(pending),
+        "cached": cached_count,
+        "reviewed": len(pending) - errors,
+        "errors": errors,
+        "findings": len(findings),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    return RepositoryReview(findings, stats)
+
+
+DIFF_SYSTEM = """You are an expert code reviewer with deep knowledge of security, performance, and best practices.
+
+You are reviewing a change. Excerpts show the changed lines (marked with >) and just enough surrounding code
+for context. Report only issues in, or caused by, the changed lines, each on its own line as:
+[SECURITY] <path>:L<line>: <issue and how to fix it>
+[PERFORMANCE] <path>:L<line>: <issue and how to fix it>
+[STYLE] <path>:L<line>: <issue and how to fix it>
+
+Use the file paths and line numbers shown. If there are no issues, reply with NO ISSUES."""
+
+# Rough characters-per-token ratio used to size requests
+CHARS_PER_TOKEN = 4
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+_DIFF_FINDING = re.compile(
+    r"^(?:\d+[.)])?\W*\[(?P<category>SECURITY|PERFORMANCE|STYLE)\]\W*"
+    r"(?:`?(?!L(?:INE)?\s*\d)(?P<path>[^\s:`]+?)`?:)?\s*(?:L(?:INE)?\s*(?P<line>\d+)\b)?[\s:.-]*(?P<message>.*)$",
+    re.IGNORECASE,
+)
+
+
+class Hunk:
+    """New-side view of one diff hunk: where it starts and which lines were added."""
+
+    __slots__ = ("path", "start", "length", "added")
+
+    def __init__(self, path: str, start: int, length: int, added: List[int]):
+        self.path = path
+        self.start = start
+        self.length = length
+        self.added = added
+
+    def changed_lines(self) -> List[int]:
+        # Pure deletions have no added lines; anchor them where the lines used to be
+        return self.added or [max(self.start, 1)]
+
+
+def parse_unified_diff(diff: str) -> List[Hunk]:
+    """
+    Parse a unified diff (``git diff`` / ``diff -u``) into hunks on the new side.
+    Deleted files are skipped.
+    """
+    hunks: List[Hunk] = []
+    path: Optional[str] = None
+    hunk: Optional[Hunk] = None
+    line = 0
+    for raw in diff.splitlines():
+        if raw.startswith("+++ "):
+            target = raw[4:].split("\t")[0].strip()
+            path = None if target == "/dev/null" else (target[2:] if target.startswith("b/") else target)
+            hunk = None
+        elif raw.startswith("--- ") or raw.startswith("diff "):
+            hunk = None
+        elif raw.startswith("@@"):
+            match = _HUNK_HEADER.match(raw)
+            if match and path is not None:
+                line = int(match.group(1))
+                length = int(match.group(2)) if match.group(2) is not None else 1
+                hunk = Hunk(path, line, length, [])
+                hunks.append(hunk)
+            else:
+                hunk = None
+        elif hunk is not None:
+            if raw.startswith("+"):
+                hunk.added.append(line)
+                line += 1
+            elif raw.startswith(" ") or raw == "":
+                line += 1
+            # "-" lines and "\ No newline at end of file" do not exist on the new side
+    return hunks
+
+
+def _scopes(source: str) -> List[Tuple[int, int, int, str]]:
+    """(start, header_end, end, qualified name) for every function/class, outermost first."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    scopes = []
+
+    def visit(body: List[ast.stmt], prefix: str) -> None:
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                header_end = max(node.lineno, node.body[0].lineno - 1) if node.body else node.lineno
+                scopes.append((start, header_end, node.end_lineno, prefix + node.name))
+                visit(node.body, prefix + node.name + ".")
+            else:
+                # Functions nested in if/try/with blocks still count as scopes
+                for field in ("body", "orelse", "finalbody", "handlers"):
+                    visit(getattr(node, field, None) or [], prefix)
+
+    visit(tree.body, "")
+    return scopes
+
+
+def _context_lines(
+    path: str, source: str, hunks: List[Hunk], context_lines: int, max_context_lines: int
+) -> Tuple[List[int], Dict[int, str]]:
+    """
+    Choose which lines of a file to show for its hunks: the whole enclosing
+    function/class when it is small, otherwise its signature plus a window
+    around the change.
+
+    Returns:
+        tuple: (sorted line numbers to show, {first line of a block: scope name})
+    """
+    total = source.count("\n") + (0 if source.endswith("\n") else 1)
+    scopes = _scopes(source) if path.endswith(".py") else []
+    shown = set()
+    labels: Dict[int, str] = {}
+    for hunk in hunks:
+        for line in hunk.changed_lines():
+            enclosing = [s for s in scopes if s[0] <= line <= s[2]]
+            # Innermost scope that is small enough to show whole
+            fitting = [s for s in enclosing if s[2] - s[0] + 1 <= max_context_lines]
+            if fitting:
+                start, _, end, name = fitting[-1]
+                shown.update(range(start, end + 1))
+                labels[start] = name
+                continue
+            low, high = max(1, line - context_lines), min(total, line + context_lines)
+            shown.update(range(low, high + 1))
+            if enclosing:
+                start, header_end, _, name = enclosing[-1]
+                shown.update(range(start, header_end + 1))
+                labels[start] = name
+    return sorted(n for n in shown if 1 <= n <= total), labels
+
+
+def _blocks(lines: List[int]) -> List[List[int]]:
+    blocks: List[List[int]] = []
+    for number in lines:
+        if blocks and number == blocks[-1][-1] + 1:
+            blocks[-1].append(number)
+        else:
+            blocks.append([number])
+    return blocks
+
+
+def _render_block(file_lines: List[str], block: List[int], changed: set, labels: Dict[int, str]) -> str:
+    label = next((labels[n] for n in block if n in labels), None)
+    heading = f"lines {block[0]}-{block[-1]}" + (f", in {label}" if label else "")
+    body = "".join(
+        f"{n:>5} {'>' if n in changed else ' '}| {file_lines[n - 1].rstrip()}\n" for n in block
+    )
+    return f"({heading})\n{body}"
+
+
+def review_diff(
+    unified_diff: str,
+    repo_root: str = ".",
+    client: Optional[Any] = None,
+    model: str = "claude-sonnet-4-20250514",
+    max_request_tokens: int = 6000,
+    context_lines: int = 3,
+    max_context_lines: int = 80,
+    concurrency: int = 4,
+    system: str = DIFF_SYSTEM,
+    max_tokens: int = 2048,
+) -> RepositoryReview:
+    """
+    Review only what a diff changed.
+
+    Each hunk is sent with its enclosing function/class (or, for large ones,
+    the signature plus a few lines around the change) instead of the whole
+    file. Excerpts from many hunks and files are packed into requests of at
+    most ``max_request_tokens``, and findings are mapped back to file:line.
+
+    Args:
+        unified_diff: Output of ``git diff`` / ``diff -u``
+        repo_root: Checkout the diff applies to (the new versions are read from here)
+        client: ClaudeClient to use (default: a new one for ``model``)
+        model: Model used when ``client`` is not given
+        max_request_tokens: Approximate input budget per request
+        context_lines: Lines around a change when the enclosing scope is too large
+        max_context_lines: Largest function/class sent whole as context
+        concurrency: Requests sent in parallel
+        system: Review system prompt
+        max_tokens: Maximum tokens per review response
+
+    Returns:
+        RepositoryReview: Findings sorted by file and line; stats include
+        the input token estimate against sending the changed files whole
+    """
+    if client is None:
+        from .client import ClaudeClient
+        client = ClaudeClient(model=model)
+
+    started = time.perf_counter()
+    hunks_by_file: Dict[str, List[Hunk]] = {}
+    for hunk in parse_unified_diff(unified_diff):
+        hunks_by_file.setdefault(hunk.path, []).append(hunk)
+
+    # (path, rendered block, token estimate) in file order
+    sections: List[Tuple[str, str, int]] = []
+    shown_lines: Dict[str, List[int]] = {}
+    full_chars = 0
+    for path, hunks in hunks_by_file.items():
+        try:
+            with open(os.path.join(repo_root, path), encoding="utf-8") as f:
+                source = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠️  Skipping {path}: {e}", file=sys.stderr)
+            continue
+        full_chars += len(source)
+        file_lines = source.splitlines()
+        changed = {n for hunk in hunks for n in hunk.added}
+        lines, labels = _context_lines(path, source, hunks, context_lines, max_context_lines)
+        shown_lines[path] = lines
+        for block in _blocks(lines):
+            text = _render_block(file_lines, block, changed, labels)
+            sections.append((path, text, len(text) // CHARS_PER_TOKEN + 1))
+
+    # Greedily pack blocks into token-budgeted requests
+    batches: List[List[Tuple[str, str, int]]] = []
+    budget = 0
+    for section in sections:
+        if not batches or budget + section[2] > max_request_tokens:
+            batches.append([])
+            budget = 0
+        batches[-1].append(section)
+        budget += section[2]
+
+    def prompt(batch: List[Tuple[str, str, int]]) -> str:
+        parts = ["Please review this change:\n"]
+        current = None
+        for path, text, _ in batch:
+            if path != current:
+                if current is not None:
+                    parts.append("```\n")
+                language = LANGUAGES.get(os.path.splitext(path)[1], "")
+                parts.append(f"\n### {path}\n```{language}\n")
+                current = path
+            else:
+                parts.append("...\n")
+            parts.append(text)
+        parts.append("```\n")
+        return "".join(parts)
+
+    def review(batch: List[Tuple[str, str, int]]) -> List[Finding]:
+        text = client.chat(prompt(batch), system=system, max_tokens=max_tokens, temperature=0.2)
+        return _map_diff_findings(text, [path for path, _, _ in batch], shown_lines)
+
+    findings: List[Finding] = []
+    errors = 0
+    input_tokens = sum(len(prompt(batch)) for batch in batches) // CHARS_PER_TOKEN
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for future in as_completed([pool.submit(review, batch) for batch in batches]):
+            try:
+                findings.extend(future.result())
+            except Exception:
+                errors += 1
+    findings.sort(key=lambda f: (f.path, f.line))
+
+    stats = {
+        "files": len(shown_lines),
+        "hunks": sum(len(h) for p, h in hunks_by_file.items() if p in shown_lines),
+        "requests": len(batches),
+        "errors": errors,
+        "findings": len(findings),
+        "input_tokens": input_tokens,
+        "full_file_tokens": full_chars // CHARS_PER_TOKEN,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    return RepositoryReview(findings, stats)
+
+
+def _map_diff_findings(text: str, paths: List[str], shown_lines: Dict[str, List[int]]) -> List[Finding]:
+    """Attach each finding to a file in the request (by path, or by which file shows that line)."""
+    paths = list(dict.fromkeys(paths))
+    findings = []
+    for raw in text.splitlines():
+        match = _DIFF_FINDING.match(raw.strip())
+        if not match:
+            continue
+        message = match.group("message").strip()
+        line = match.group("line")
+        if line is None:
+            mentioned = _LINE_IN_TEXT.search(message)
+            line = mentioned.group(1) if mentioned else None
+        path = match.group("path")
+        if path not in paths:
+            # Unknown or missing path: take the (first) file whose excerpt contains the line
+            path = next((p for p in paths if line and int(line) in shown_lines.get(p, ())), paths[0])
+        number = int(line) if line else shown_lines[path][0]
+        findings.append(Finding(path, number, match.group("category").upper(), message, "diff"))
+    return findings
+
+
+LENSES = {
+    "general": "Correctness bugs, error handling and maintainability problems.",
+    "security": "Security vulnerabilities: injection, unsafe deserialization, secrets, authn/authz, input validation.",
+    "performance": "Performance issues: needless work in loops, N+1 queries, blocking I/O, poor data structures.",
+    "style": "Code quality: naming, missing docstrings or type hints, dead code, unidiomatic constructs.",
+}
+
+LENS_SYSTEM = """You are an expert code reviewer with deep knowledge of security, performance, and best practices.
+
+Review the code through each requested lens. Reply with ONLY valid JSON in this exact format:
+{
+  "summary": "one or two sentences on what the code does",
+  "findings": {
+    "<lens>": [{"line": <line number or null>, "severity": "critical|high|medium|low", "issue": "...", "fix": "concrete fix"}]
+  }
+}
+
+Include every requested lens as a key, with an empty list when it has no findings."""
+
+
+class LensReview:
+    """Findings of a multi-lens review grouped by lens, plus call/token statistics."""
+
+    def __init__(self, summary: str, lenses: Dict[str, List[Finding]], stats: Dict[str, Any]):
+        self.summary = summary
+        self.lenses = lenses
+        self.stats = stats
+
+    @property
+    def findings(self) -> List[Finding]:
+        return sorted((f for findings in self.lenses.values() for f in findings), key=lambda f: f.line)
+
+
+def _lens_request(lenses: Dict[str, str]) -> str:
+    listed = "\n".join(f"- {name}: {focus}" for name, focus in lenses.items())
+    return f"Lenses to apply:\n{listed}"
+
+
+def _parse_lens_json(text: str, lenses: Dict[str, str], path: str) -> Tuple[str, Dict[str, List[Finding]]]:
+    """Read the JSON reply; fall back to ``[CATEGORY]`` lines if the model did not return JSON."""
+    grouped: Dict[str, List[Finding]] = {name: [] for name in lenses}
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        data = json.loads(text[start:end + 1]) if start != -1 else None
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        for line, category, message in parse_findings(text):
+            if category.lower() in grouped:
+                grouped[category.lower()].append(Finding(path, line, category, message, category.lower()))
+        return "", grouped
+
+    for name, items in (data.get("findings") or {}).items():
+        if name not in grouped or not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            message = str(item.get("issue", "")).strip()
+            if item.get("fix"):
+                message += f" Fix: {item['fix']}"
+            line = item.get("line")
+            grouped[name].append(Finding(
+                path, line if isinstance(line, int) else 1, name.upper(), message, name, str(item.get("severity", "")),
+            ))
+    return str(data.get("summary", "")), grouped
+
+
+def review_code(
+    code: str,
+    lenses: Sequence[str] = ("general", "security", "performance", "style"),
+    client: Optional[Any] = None,
+    model: str = "claude-sonnet-4-20250514",
+    mode: str = "combined",
+    language: str = "python",
+    path: str = "<code>",
+    max_tokens: int = 4096,
+) -> LensReview:
+    """
+    Review one piece of code through several lenses while sending it once.
+
+    Modes:
+        combined: one call whose structured reply has a section per lens
+        cached:   one call per lens; the code is a cached prompt prefix, so
+                  calls after the first read it from the prompt cache
+                  (the API only caches prefixes of 1024+ tokens)
+
+    Args:
+        code: Source code to review
+        lenses: Names from LENSES (custom lenses can be added to that dict)
+        client: ClaudeClient or Anthropic client (default: a new ClaudeClient)
+        model: Model used unless ``client`` is a ClaudeClient
+        mode: "combined" or "cached"
+        language: Code fence language
+        path: Path reported on findings
+        max_tokens: Maximum tokens per response
+
+    Returns:
+        LensReview: Findings grouped by lens, with call and token counts
+    """
+    if mode not in ("combined", "cached"):
+        raise ValueError(f"mode must be 'combined' or 'cached', got {mode!r}")
+    unknown = [name for name in lenses if name not in LENSES]
+    if unknown:
+        raise ValueError(f"Unknown lenses: {', '.join(unknown)} (available: {', '.join(LENSES)})")
+    if client is None:
+        from .client import ClaudeClient
+        client = ClaudeClient(model=model)
+    # Accept a ClaudeClient (its create() keeps the scheduler, limiter and ledger in the loop)
+    # or a plain Anthropic client
+    send = client.create if hasattr(client, "chat") else client.messages.create
+    model = getattr(client, "model", model)
+
+    code_block = {
+        "type": "text",
+        "text": f"Please review this code:\n\n```{language}\n{number_lines(code)}```",
+        "cache_control": {"type": "ephemeral"},
+    }
+    stats = {"calls": 0, "input_tokens": 0, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0, "output_tokens": 0}
+    lock = threading.Lock()
+
+    def call(selected: Dict[str, str]) -> Tuple[str, Dict[str, List[Finding]]]:
+        response = send(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0.2,
+            system=LENS_SYSTEM,
+            messages=[{"role": "user", "content": [code_block, {"type": "text", "text": _lens_request(selected)}]}],
+        )
+        with lock:
+            stats["calls"] += 1
+            for field in ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens"):
+                stats[field] += getattr(response.usage, field, None) or 0
+        return _parse_lens_json(response.content[0].text, selected, path)
+
+    selected = {name: LENSES[name] for name in lenses}
+    if mode == "combined":
+        summary, grouped = call(selected)
+        return LensReview(summary, grouped, stats)
+
+    # The first call writes the cache entry; the rest read it concurrently
+    names = list(selected)
+    summary, grouped = call({names[0]: selected[names[0]]})
+    with ThreadPoolExecutor(max_workers=max(1, len(names) - 1)) as pool:
+        for _, lens_grouped in pool.map(lambda name: call({name: selected[name]}), names[1:]):
+            grouped.update(lens_grouped)
+    return LensReview(summary, grouped, stats)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Review a repository with Claude, reusing cached findings for unchanged code")
+    parser.add_argument("paths", nargs="*", help="Files or directories to review")
+    parser.add_argument("--diff", help="Review only the changes in this unified diff file ('-' for stdin)")
+    parser.add_argument("--root", default=".", help="Repository root the diff applies to")
+    parser.add_argument("--cache", default=".review_cache.db", help="Findings cache file ('' to disable)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-unit-lines", type=int, default=200)
+    parser.add_argument("--model", default="claude-sonnet-4-20250514")
+    parser.add_argument("--json", action="store_true", help="Print findings as JSON lines")
+    args = parser.parse_args()
+    if not args.paths and not args.diff:
+        parser.error("give paths to review or --diff")
+
+    if args.diff:
+        if args.diff == "-":
+            diff = sys.stdin.read()
+        else:
+            with open(args.diff, encoding="utf-8") as f:
+                diff = f.read()
+        from .client import ClaudeClient
+        review = review_diff(diff, args.root, client=ClaudeClient(model=args.model), concurrency=args.concurrency)
+    else:
+        review = review_repository(
+            args.paths,
+            model=args.model,
+            cache_path=args.cache or None,
+            concurrency=args.concurrency,
+            max_unit_lines=args.max_unit_lines,
+        )
+    for path, findings in review.by_file().items():
+        if args.json:
+            for finding in findings:
+                print(json.dumps(finding.to_dict()))
+            continue
+        print(f"\n🔍 {path}")
+        for finding in findings:
+            print(f"  L{finding.line:<5} [{finding.category}] {finding.message}")
+    stats = review.stats
+    if args.diff:
+        summary = (
+            f"{stats['files']} files, {stats['hunks']} hunks in {stats['requests']} requests "
+            f"(~{stats['input_tokens']} input tokens vs ~{stats['full_file_tokens']} for whole files)"
+        )
+    else:
+        summary = f"{stats['files']} files, {stats['units']} units: {stats['reviewed']} reviewed, {stats['cached']} cached"
+    print(f"\n{summary}, {stats['errors']} errors, {stats['findings']} findings in {stats['seconds']}s", file=sys.stderr)
+    if stats["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
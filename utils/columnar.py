@@ -0,0 +1,497 @@
+"""
+Columnar, array-backed storage for extraction results.
+
+Extraction produces records (dicts) at high volume. Summing amounts with a
+generator or sorting by date strings does per-record Python work on every
+query. An ExtractionTable converts records into typed NumPy columns once,
+one batch at a time:
+
+    str        object array
+    category   dictionary-encoded (int32 codes + category list), like Arrow dictionaries
+    currency   a category column of ISO codes; "$", "€", "£"... are mapped to codes
+    amount     float64; "$2.5M", "150K", "1,200.50" and {"value", "currency"} are parsed
+    date       datetime64[D]; ISO dates take a vectorized fast path
+    int/float/bool
+
+Every column also has a validity mask, so missing values stay missing.
+Values that do not convert (an int column given "3 years", an unparseable
+date) are stored as missing too, and listed in ``errors``.
+Filtering, sorting and aggregation then run on the arrays. Export goes to
+CSV, or to Arrow/Parquet when ``pyarrow`` is installed.
+
+Requires NumPy (``pip install numpy``).
+
+Usage:
+    from utils.columnar import ExtractionTable
+
+    deals = ExtractionTable({"company": "category", "amount": "amount", "currency": "currency", "date": "date"})
+    deals.extend(extracted["deals"])                    # any number of batches
+
+    usd = deals.filter(deals.eq("currency", "USD") & (deals["amount"] > 100_000))
+    print(usd.sum("amount"), deals.aggregate("amount", by="company", how="sum"))
+    deals.sort("date").to_parquet("deals.parquet")      # or .to_csv("deals.csv")
+"""
+
+import csv
+import datetime
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError as e:  # pragma: no cover - depends on the environment
+    raise ImportError("utils.columnar needs NumPy: pip install numpy") from e
+
+
+TYPES = ("str", "category", "currency", "amount", "date", "int", "float", "bool")
+
+CURRENCY_SYMBOLS = {"$": "USD", "US$": "USD", "C$": "CAD", "A$": "AUD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
+MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mm": 1e6, "million": 1e6, "b": 1e9, "bn": 1e9, "billion": 1e9}
+_AMOUNT = re.compile(
+    r"^\s*(?P<prefix>[A-Z]{3}|US\$|[CA]\$|[$€£¥₹])?\s*(?P<number>[-+]?(?:\d[\d,]*)?\.?\d+)\s*"
+    r"(?P<multiplier>(?i:thousand|million|billion|mm|bn|k|m|b))?\s*(?P<suffix>[A-Z]{3})?\s*$"
+)
+DATE_FORMATS = ("%Y-%m-%d", "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%m/%d/%Y", "%Y/%m/%d")
+
+
+def parse_amount(value: Any) -> Tuple[float, Optional[str]]:
+    """(amount, ISO currency or None) from a number, "$2.5M"-style string or {"value", "currency"} dict."""
+    if value is None or isinstance(value, bool):
+        return math.nan, None
+    if isinstance(value, (int, float)):
+        return float(value), None
+    if isinstance(value, dict):
+        amount, currency = parse_amount(value.get("value", value.get("amount")))
+        return amount, value.get("currency") or currency
+    match = _AMOUNT.match(str(value))
+    if match is None:
+        return math.nan, None
+    amount = float(match.group("number").replace(",", ""))
+    multiplier = match.group("multiplier")
+    if multiplier:
+        amount *= MULTIPLIERS[multiplier.lower()]
+    code = match.group("prefix") or match.group("suffix")
+    return amount, CURRENCY_SYMBOLS.get(code, code)
+
+
+def _number(kind: str, value: Any) -> Any:
+    """``value`` as an int / float / bool for a ``kind`` column, or None if it does not convert."""
+    try:
+        return {"int": int, "float": float, "bool": bool}[kind](value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _parse_date(value: Any) -> Any:
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return np.datetime64(value, "D")
+    text = str(value).strip()
+    try:
+        return np.datetime64(datetime.date.fromisoformat(text[:10]), "D")
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return np.datetime64(datetime.datetime.strptime(text, fmt).date(), "D")
+        except ValueError:
+            continue
+    return np.datetime64("NaT", "D")
+
+
+def parse_dates(values: Sequence[Any]) -> "np.ndarray":
+    """datetime64[D] array; ISO dates are parsed in one vectorized call, others one by one."""
+    cleaned = ["NaT" if v is None or v == "" else v for v in values]
+    try:
+        return np.array(cleaned, dtype="datetime64[D]")
+    except (ValueError, TypeError):
+        return np.array([_parse_date(v) if v != "NaT" else np.datetime64("NaT", "D") for v in cleaned],
+                        dtype="datetime64[D]")
+
+
+class Column:
+    """One typed column: data array, validity mask and (for dictionary types) categories."""
+
+    __slots__ = ("name", "type", "data", "valid", "categories", "_index")
+
+    def __init__(self, name: str, type: str, data: "np.ndarray", valid: "np.ndarray",
+                 categories: Optional[List[str]] = None):
+        self.name = name
+        self.type = type
+        self.data = data
+        self.valid = valid
+        self.categories = categories if categories is not None else []
+        self._index = {value: code for code, value in enumerate(self.categories)}
+
+    @property
+    def dictionary(self) -> bool:
+        return self.type in ("category", "currency")
+
+    def code(self, value: Any) -> int:
+        """Code of a category value (-1 if never seen)."""
+        return self._index.get(value, -1)
+
+    def encode(self, values: Sequence[Any]) -> "np.ndarray":
+        """Codes for a batch of values, adding new categories (-1 for missing)."""
+        codes = np.empty(len(values), dtype=np.int32)
+        index, categories = self._index, self.categories
+        for i, value in enumerate(values):
+            if value is None or value == "":
+                codes[i] = -1
+                continue
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(categories)
+                categories.append(value)
+            codes[i] = code
+        return codes
+
+    def decoded(self) -> "np.ndarray":
+        """Values as an array (category codes turned back into values, None where missing)."""
+        if not self.dictionary:
+            return self.data
+        lookup = np.array(self.categories + [None], dtype=object)
+        return lookup[self.data]  # code -1 picks the trailing None
+
+    def take(self, indices: "np.ndarray") -> "Column":
+        return Column(self.name, self.type, self.data[indices], self.valid[indices], self.categories)
+
+    def sort_key(self) -> "np.ndarray":
+        """Array whose order matches the column's natural order."""
+        if self.dictionary:
+            ranks = np.empty(len(self.categories) + 1, dtype=np.int64)
+            ranks[np.argsort(np.array(self.categories, dtype=object), kind="stable")] = np.arange(len(self.categories))
+            ranks[-1] = len(self.categories)  # missing last
+            return ranks[self.data]
+        if self.type == "str":
+            return np.array(["" if v is None else v for v in self.data], dtype=str)
+        return self.data
+
+
+_EMPTY = {
+    "str": np.dtype(object), "category": np.dtype(np.int32), "currency": np.dtype(np.int32),
+    "amount": np.dtype(np.float64), "float": np.dtype(np.float64), "int": np.dtype(np.int64),
+    "bool": np.dtype(bool), "date": np.dtype("datetime64[D]"),
+}
+
+
+class ExtractionTable:
+    """Append-only columnar table of extraction records."""
+
+    def __init__(
+        self,
+        schema: Dict[str, str],
+        records: Optional[Iterable[Dict[str, Any]]] = None,
+        batch_size: int = 65536,
+        currency_column: str = "currency",
+    ):
+        """
+        Args:
+            schema: Column name -> type (one of ``TYPES``)
+            records: Optional initial records
+            batch_size: Records buffered before they are converted into arrays
+            currency_column: Currency column filled from amount symbols ("$150K" -> "USD")
+                when a record has no currency of its own
+        """
+        unknown = {t for t in schema.values() if t not in TYPES}
+        if unknown:
+            raise ValueError(f"Unknown column types {sorted(unknown)} (expected one of {', '.join(TYPES)})")
+        self.schema = dict(schema)
+        self.batch_size = batch_size
+        self.currency_column = currency_column if schema.get(currency_column) == "currency" else None
+        self._columns = {name: Column(name, kind, np.empty(0, _EMPTY[kind]), np.empty(0, bool))
+                         for name, kind in schema.items()}
+        self._chunks: Dict[str, List[Tuple["np.ndarray", "np.ndarray"]]] = {name: [] for name in schema}
+        self._pending: List[Dict[str, Any]] = []
+        self._converted = 0
+        # {"row", "column", "value"} for values that could not be converted (stored as missing)
+        self.errors: List[Dict[str, Any]] = []
+        if records is not None:
+            self.extend(records)
+
+    @classmethod
+    def _from_columns(cls, schema: Dict[str, str], columns: Dict[str, Column], currency_column: Optional[str]) -> "ExtractionTable":
+        table = cls.__new__(cls)
+        table.schema = dict(schema)
+        table.batch_size = 65536
+        table.currency_column = currency_column
+        table._columns = columns
+        table._chunks = {name: [] for name in schema}
+        table._pending = []
+        table._converted = len(next(iter(columns.values())).data) if columns else 0
+        table.errors = []
+        return table
+
+    # -- ingestion ---------------------------------------------------------
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Add one record (converted with the next batch)."""
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self._convert()
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Add many records."""
+        self._pending.extend(records)
+        if len(self._pending) >= self.batch_size:
+            self._convert()
+
+    def _convert(self) -> None:
+        """Turn pending records into one array chunk per column."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        symbols: Optional[List[Optional[str]]] = None
+        converted: Dict[str, Tuple["np.ndarray", "np.ndarray"]] = {}
+        for name, kind in self.schema.items():
+            values = [record.get(name) for record in batch]
+            column = self._columns[name]
+            if kind in ("category", "currency"):
+                if kind == "currency":
+                    values = [CURRENCY_SYMBOLS.get(v, v) for v in values]
+                data = column.encode(values)
+                valid = data >= 0
+            elif kind == "amount":
+                parsed = [parse_amount(v) for v in values]
+                data = np.fromiter((amount for amount, _ in parsed), dtype=np.float64, count=len(parsed))
+                valid = ~np.isnan(data)
+                if symbols is None:
+                    symbols = [currency for _, currency in parsed]
+            elif kind == "date":
+                data = parse_dates(values)
+                valid = ~np.isnat(data)
+            elif kind == "str":
+                data = np.array(values + [None], dtype=object)[:-1]  # keep nested values as objects
+                valid = np.array([v is not None for v in values], dtype=bool)
+            else:
+                valid = np.array([v is not None for v in values], dtype=bool)
+                fill = {"int": 0, "float": math.nan, "bool": False}[kind]
+                try:
+                    data = np.array([fill if v is None else v for v in values], dtype=_EMPTY[kind])
+                except (TypeError, ValueError, OverflowError):
+                    # Some value does not convert ("3 years"): convert one by one, keeping it missing
+                    numbers = [None if v is None else _number(kind, v) for v in values]
+                    valid = np.array([n is not None for n in numbers], dtype=bool)
+                    data = np.array([fill if n is None else n for n in numbers], dtype=_EMPTY[kind])
+            if kind != "str":
+                given = np.array([v is not None and v != "" for v in values], dtype=bool)
+                for i in np.flatnonzero(given & ~valid):
+                    self.errors.append({"row": self._converted + int(i), "column": name, "value": values[i]})
+            converted[name] = (data, valid)
+
+        # Currency symbols found in amounts fill records without an explicit currency
+        if self.currency_column and symbols is not None:
+            column = self._columns[self.currency_column]
+            data, valid = converted[self.currency_column]
+            missing = np.flatnonzero(~valid)
+            if len(missing):
+                filled = column.encode([symbols[i] for i in missing])
+                data[missing] = filled
+                valid[missing] = filled >= 0
+
+        for name, chunk in converted.items():
+            self._chunks[name].append(chunk)
+        self._converted += len(batch)
+
+    def _column(self, name: str) -> Column:
+        if name not in self._columns:
+            raise KeyError(f"No column {name!r} (columns: {', '.join(self.schema)})")
+        if self._pending:
+            self._convert()
+        chunks = self._chunks[name]
+        if chunks:
+            column = self._columns[name]
+            column.data = np.concatenate([column.data] + [data for data, _ in chunks])
+            column.valid = np.concatenate([column.valid] + [valid for _, valid in chunks])
+            chunks.clear()
+        return self._columns[name]
+
+    # -- access ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        if not self.schema:
+            return 0
+        return len(self._column(next(iter(self.schema))).data)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.schema)
+
+    def __getitem__(self, name: str) -> "np.ndarray":
+        """Column values (category columns decoded; use ``codes`` for the raw codes)."""
+        return self._column(name).decoded()
+
+    def codes(self, name: str) -> Tuple["np.ndarray", List[str]]:
+        """(codes, categories) of a category/currency column (-1 = missing)."""
+        column = self._column(name)
+        return column.data, column.categories
+
+    def valid(self, name: str) -> "np.ndarray":
+        """Boolean mask of rows where the column has a value."""
+        return self._column(name).valid
+
+    def eq(self, name: str, value: Any) -> "np.ndarray":
+        """Boolean mask of rows equal to ``value`` (compares codes for category columns)."""
+        column = self._column(name)
+        if column.dictionary:
+            if column.type == "currency":
+                value = CURRENCY_SYMBOLS.get(value, value)
+            code = column.code(value)
+            if code < 0:  # never seen; -1 is also the missing-value code
+                return np.zeros(len(column.data), dtype=bool)
+            return column.data == code
+        if column.type == "date":
+            return column.data == np.datetime64(value, "D")
+        return (column.data == value) & column.valid
+
+    def between(self, name: str, low: Any, high: Any) -> "np.ndarray":
+        """Boolean mask of rows with low <= value <= high (dates as ISO strings or dates)."""
+        column = self._column(name)
+        if column.type == "date":
+            low, high = np.datetime64(low, "D"), np.datetime64(high, "D")
+        return (column.data >= low) & (column.data <= high) & column.valid
+
+    # -- transformation ------------------------------------------------------
+
+    def take(self, indices: "np.ndarray") -> "ExtractionTable":
+        """New table with the rows at ``indices``, in that order."""
+        columns = {name: self._column(name).take(indices) for name in self.schema}
+        return self._from_columns(self.schema, columns, self.currency_column)
+
+    def filter(self, mask: "np.ndarray") -> "ExtractionTable":
+        """New table with the rows where ``mask`` is True."""
+        return self.take(np.flatnonzero(mask))
+
+    def sort(self, by: Union[str, Sequence[str]], descending: bool = False) -> "ExtractionTable":
+        """New table sorted by one or more columns (stable; missing values last)."""
+        names = [by] if isinstance(by, str) else list(by)
+        keys = []
+        for name in reversed(names):  # lexsort: last key is the primary one
+            column = self._column(name)
+            key = column.sort_key()
+            if descending:
+                key = -np.unique(key, return_inverse=True)[1].reshape(-1)  # dense ranks, reversed
+            keys.append(key)
+            keys.append(~column.valid)  # after the value key, so missing rows sort last
+        return self.take(np.lexsort(keys))
+
+    # -- aggregation ---------------------------------------------------------
+
+    def sum(self, name: str, where: Optional["np.ndarray"] = None) -> float:
+        column = self._column(name)
+        mask = column.valid if where is None else column.valid & where
+        return float(column.data[mask].sum())
+
+    def mean(self, name: str, where: Optional["np.ndarray"] = None) -> float:
+        column = self._column(name)
+        mask = column.valid if where is None else column.valid & where
+        return float(column.data[mask].mean()) if mask.any() else math.nan
+
+    def aggregate(self, value: str, by: str, how: str = "sum") -> Dict[Any, float]:
+        """
+        Group ``value`` by the ``by`` column.
+
+        Args:
+            value: Numeric column to aggregate
+            by: Grouping column (category/currency columns group on their codes)
+            how: "sum", "mean", "count", "min" or "max"
+
+        Returns:
+            dict: group value -> aggregate (rows missing either column are skipped)
+        """
+        if how not in ("sum", "mean", "count", "min", "max"):
+            raise ValueError(f"Unknown aggregation {how!r}")
+        values, keys = self._column(value), self._column(by)
+        mask = values.valid & keys.valid
+        data = values.data[mask]
+        if keys.dictionary:
+            groups, labels = keys.data[mask], keys.categories
+            present = np.unique(groups)
+        else:
+            uniques, groups = np.unique(keys.data[mask], return_inverse=True)
+            labels, present = list(uniques.tolist()), np.arange(len(uniques))
+        size = len(labels)
+        counts = np.bincount(groups, minlength=size)
+        if how in ("sum", "mean"):
+            result = np.bincount(groups, weights=data, minlength=size)
+            if how == "mean":
+                result = result / np.maximum(counts, 1)
+        elif how == "count":
+            result = counts.astype(np.float64)
+        else:
+            fill = np.inf if how == "min" else -np.inf
+            result = np.full(size, fill)
+            (np.minimum if how == "min" else np.maximum).at(result, groups, data)
+        return {labels[g]: float(result[g]) for g in present}
+
+    # -- export ----------------------------------------------------------------
+
+    def _formatted(self, name: str) -> List[Any]:
+        """Column as a list of CSV cells, formatted column-at-a-time."""
+        column = self._column(name)
+        if column.type == "date":
+            cells = np.datetime_as_string(column.data, unit="D").astype(object)
+        elif column.type in ("amount", "float"):
+            cells = np.char.mod("%.15g", column.data).astype(object)
+        elif column.dictionary:
+            cells = column.decoded()
+        else:
+            cells = column.data.astype(object)
+        cells[~column.valid] = ""
+        return cells.tolist()
+
+    def to_csv(self, path: str) -> int:
+        """Write the table as CSV with a header; returns the number of rows."""
+        cells = [self._formatted(name) for name in self.schema]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.schema)
+            writer.writerows(zip(*cells))
+        return len(cells[0]) if cells else 0
+
+    def to_arrow(self) -> Any:
+        """pyarrow.Table with dictionary-encoded categories and date32 dates (needs pyarrow)."""
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Arrow/Parquet export needs pyarrow: pip install pyarrow") from e
+        arrays, names = [], []
+        for name in self.schema:
+            column = self._column(name)
+            missing = ~column.valid
+            if column.dictionary:
+                indices = pa.array(column.data, type=pa.int32(), mask=missing)
+                array = pa.DictionaryArray.from_arrays(indices, pa.array(column.categories, type=pa.string()))
+            elif column.type == "date":
+                array = pa.array(column.data, type=pa.date32(), mask=missing)
+            elif column.type == "str":
+                array = pa.array(column.data.tolist(), mask=missing)
+            else:
+                array = pa.array(column.data, mask=missing)
+            arrays.append(array)
+            names.append(name)
+        return pa.Table.from_arrays(arrays, names=names)
+
+    def to_parquet(self, path: str, **kwargs: Any) -> None:
+        """Write the table as Parquet (needs pyarrow); kwargs go to ``pyarrow.parquet.write_table``."""
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path, **kwargs)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Rows as dicts (dates as ISO strings, missing values as None), e.g. for display."""
+        columns = []
+        for name in self.schema:
+            column = self._column(name)
+            if column.type == "date":
+                values = np.datetime_as_string(column.data, unit="D").astype(object)
+            else:
+                values = column.decoded().astype(object)
+            values[~column.valid] = None
+            columns.append(values.tolist())
+        return [dict(zip(self.schema, row)) for row in zip(*columns)]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the column arrays (object columns count their pointers only)."""
+        return sum(self._column(name).data.nbytes + self._column(name).valid.nbytes for name in self.schema)
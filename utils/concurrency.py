@@ -0,0 +1,361 @@
+"""
+Adaptive concurrency limiting for concurrent and async API calls.
+
+A fixed ``max_workers`` is either too low (quota left unused) or too high
+(429/529 storms). An AdaptiveLimiter finds the right number of requests in
+flight by itself, AIMD style:
+
+    - while latency stays near its baseline (the 90th percentile of recent
+      requests) and no overload errors come back, the limit grows by about
+      one request per round trip
+    - a rate-limit (429) or overload (529) error halves it
+    - latency inflating past ``tolerance`` x the baseline trims it by 10%, but
+      only while 429/529s or timeouts are also coming back. Reply length moves
+      latency as much as queueing does, so latency alone is not a signal
+
+At most one cut is made per round trip, so a burst of errors from requests
+that were already in flight only counts once.
+
+Usage:
+    from utils import AdaptiveLimiter, ClaudeClient
+
+    limiter = AdaptiveLimiter(initial=4, max_limit=64)
+    client = ClaudeClient(limiter=limiter)      # every call waits for a slot
+    ...                                         # call it from as many threads as you like
+    print(limiter.limit, limiter.stats())
+
+    with limiter.slot():                        # or around any call
+        response = api.messages.create(...)
+
+    async with limiter.async_slot():            # asyncio
+        response = await async_api.messages.create(...)
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+
+# asyncio (and the SDK) are imported where they are used, to keep ``import utils`` cheap
+if TYPE_CHECKING:
+    import asyncio
+
+
+# Outcomes of a request, as seen by the limiter
+SUCCESS = "success"
+OVERLOAD = "overload"
+TIMEOUT = "timeout"
+IGNORED = "ignored"
+
+
+def classify(error: Optional[BaseException]) -> str:
+    """Map a request's exception (None for success) to a limiter outcome."""
+    if error is None:
+        return SUCCESS
+    from anthropic import APIStatusError, APITimeoutError
+
+    if isinstance(error, APIStatusError) and error.status_code in (429, 529):
+        return OVERLOAD
+    if isinstance(error, APITimeoutError):
+        return TIMEOUT
+    # Bad requests, auth errors, cancellation...: not a signal about capacity
+    return IGNORED
+
+
+def _retry_delay(error: BaseException, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying (the server's retry-after if given), or None if not retryable."""
+    from anthropic import APIConnectionError, APIStatusError
+
+    if isinstance(error, APIStatusError):
+        if error.status_code not in (408, 409, 429) and error.status_code < 500:
+            return None
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            if retry_after is not None and 0 < float(retry_after) <= 60:
+                return float(retry_after)
+        except ValueError:
+            pass
+    elif not isinstance(error, APIConnectionError):
+        return None
+    return min(0.5 * 2 ** attempt, 8.0)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, loop: Optional["asyncio.AbstractEventLoop"] = None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+
+    def wake(self) -> None:
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """Thread- and asyncio-safe concurrency limit that tunes itself (AIMD + latency gradient)."""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.5,
+        tolerance: float = 2.0,
+        smoothing: float = 0.2,
+        baseline_window: int = 200,
+    ):
+        """
+        Args:
+            initial: Starting limit
+            min_limit: The limit never drops below this
+            max_limit: The limit never grows past this
+            backoff: Factor applied to the limit on a 429/529 or timeout
+            tolerance: Smoothed latency above ``tolerance`` x baseline counts as queueing
+                when overload errors were seen in the current or previous epoch
+            smoothing: Weight of each new latency sample in the moving average
+            baseline_window: Successful requests per baseline epoch; the baseline is
+                the 90th-percentile latency of the previous epoch (of the current
+                one until the first is complete), so it follows lasting changes
+                (another model, longer prompts)
+        """
+        if not 1 <= min_limit <= initial <= max_limit:
+            raise ValueError("Need 1 <= min_limit <= initial <= max_limit")
+        if not 0 < backoff < 1:
+            raise ValueError("backoff must be between 0 and 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.baseline_window = baseline_window
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._peak = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._latency: Optional[float] = None
+        self._epoch: List[float] = []
+        self._previous_baseline: Optional[float] = None
+        self._epoch_overloads = 0
+        self._previous_overloads = 0
+        self._last_cut = 0.0
+        self._counts = {SUCCESS: 0, OVERLOAD: 0, TIMEOUT: 0, IGNORED: 0, "increases": 0, "decreases": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    # -- admission ---------------------------------------------------------
+
+    def _take(self) -> None:
+        self._in_flight += 1
+        self._peak = max(self._peak, self._in_flight)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters (lock held)."""
+        while self._waiters and self._in_flight < int(self._limit):
+            self._take()
+            self._waiters.popleft().wake()
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Block until a request may start.
+
+        Returns:
+            float: Start time to pass to ``release``
+
+        Raises:
+            TimeoutError: No slot became free within ``timeout`` seconds
+        """
+        with self._lock:
+            if self._in_flight < int(self._limit) and not self._waiters:
+                self._take()
+                return time.monotonic()
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+        if not waiter.event.wait(timeout):
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    raise TimeoutError(f"No concurrency slot within {timeout}s (limit {self.limit})")
+        return time.monotonic()
+
+    async def acquire_async(self) -> float:
+        """Asyncio version of ``acquire``."""
+        import asyncio
+
+        with self._lock:
+            if self._in_flight < int(self._limit) and not self._waiters:
+                self._take()
+                return time.monotonic()
+            waiter = _Waiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._in_flight -= 1
+                    self._dispatch()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+        return time.monotonic()
+
+    def release(self, started: float, error: Optional[BaseException] = None, sample: bool = True) -> None:
+        """
+        Free a slot and feed the request's outcome into the limit.
+
+        Args:
+            started: Value returned by ``acquire``
+            error: The request's exception, if it failed
+            sample: Whether the elapsed time is a meaningful latency sample
+                (False for streams, whose duration depends on the output length)
+        """
+        now = time.monotonic()
+        outcome = classify(error)
+        with self._lock:
+            self._in_flight -= 1
+            self._counts[outcome] += 1
+            if outcome == SUCCESS and sample:
+                self._observe(now - started, now)
+            elif outcome in (OVERLOAD, TIMEOUT):
+                self._epoch_overloads += 1
+                self._decrease(self.backoff, now)
+            self._dispatch()
+
+    # -- control loop --------------------------------------------------------
+
+    def _baseline(self) -> Optional[float]:
+        if self._previous_baseline is not None:
+            return self._previous_baseline
+        return _percentile(self._epoch, 0.9) if self._epoch else None
+
+    def _observe(self, latency: float, now: float) -> None:
+        """Record a successful request's latency and adjust the limit (lock held)."""
+        self._latency = latency if self._latency is None else (
+            (1 - self.smoothing) * self._latency + self.smoothing * latency)
+        self._epoch.append(latency)
+        if len(self._epoch) >= self.baseline_window:
+            self._previous_baseline = _percentile(self._epoch, 0.9)
+            self._previous_overloads, self._epoch_overloads = self._epoch_overloads, 0
+            self._epoch = []
+
+        baseline = self._baseline()
+        inflated = baseline is not None and self._latency > self.tolerance * baseline
+        if inflated:
+            # Slow replies alone may just be long ones; cut only when the API is also pushing back
+            if self._epoch_overloads or self._previous_overloads:
+                self._decrease(0.9, now)
+        elif self._in_flight + 1 >= int(self._limit) and self._limit < self.max_limit:
+            # Only grow when the limit is actually the bottleneck: +1 per `limit` completions
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            self._counts["increases"] += 1
+
+    def _decrease(self, factor: float, now: float) -> None:
+        """Multiplicative decrease, at most once per round trip (lock held)."""
+        if now - self._last_cut < (self._latency or 0.0):
+            return
+        self._last_cut = now
+        self._limit = max(float(self.min_limit), self._limit * factor)
+        self._counts["decreases"] += 1
+
+    # -- helpers -------------------------------------------------------------
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[None]:
+        """Context manager around ``acquire``/``release``; errors raised inside are recorded."""
+        started = self.acquire(timeout)
+        try:
+            yield
+        except BaseException as e:
+            self.release(started, e)
+            raise
+        self.release(started)
+
+    @asynccontextmanager
+    async def async_slot(self) -> AsyncIterator[None]:
+        """Async context manager around ``acquire_async``/``release``."""
+        started = await self.acquire_async()
+        try:
+            yield
+        except BaseException as e:
+            self.release(started, e)
+            raise
+        self.release(started)
+
+    def call(self, fn: Callable[[], Any], retries: int = 2) -> Any:
+        """
+        Run ``fn`` in a slot, retrying retryable API errors in a fresh slot.
+
+        Use this instead of the SDK's built-in retries (``max_retries=0`` on the
+        client), so that every 429/529 reaches the limiter rather than only the last.
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.slot():
+                    return fn()
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == retries:
+                    raise
+            time.sleep(delay)
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]], retries: int = 2) -> Any:
+        """Asyncio version of ``call``; ``fn`` returns an awaitable."""
+        import asyncio
+
+        for attempt in range(retries + 1):
+            try:
+                async with self.async_slot():
+                    return await fn()
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == retries:
+                    raise
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Limiter metrics.
+
+        Returns:
+            dict: limit, in_flight, peak_in_flight, queued, smoothed and baseline
+            latency in ms, and counts of successes, overloads, timeouts,
+            ignored errors, increases and decreases
+        """
+        with self._lock:
+            baseline = self._baseline()
+            return dict(
+                {
+                    "limit": round(self._limit, 2),
+                    "in_flight": self._in_flight,
+                    "peak_in_flight": self._peak,
+                    "queued": len(self._waiters),
+                    "latency_ms": round(self._latency * 1000, 1) if self._latency is not None else None,
+                    "baseline_ms": round(baseline * 1000, 1) if baseline is not None else None,
+                },
+                **self._counts,
+            )
@@ -3,37 +3,72 @@ Error handling and retry logic for Claude API calls.
 """
 
 import time
+import inspect
 import functools
 from typing import Callable, Any
-from anthropic import APIError, RateLimitError, APIConnectionError
+
+
+def _transient_errors() -> tuple:
+    """Errors worth retrying. Only evaluated once something fails, so the SDK is imported lazily."""
+    from anthropic import APIConnectionError, RateLimitError
+
+    return (RateLimitError, APIConnectionError)
+
+
+def report_api_error(e: Exception) -> None:
+    """Print a friendly message for an API error (what ``handle_api_errors`` shows)."""
+    from anthropic import APIError, APIConnectionError, RateLimitError
+
+    from .ledger import BudgetExceeded
+
+    if isinstance(e, RateLimitError):
+        print(f"⚠️  Rate limit exceeded: {e}")
+        print("Try again in a few moments.")
+    elif isinstance(e, APIConnectionError) and isinstance(e.__cause__, LookupError):
+        # A cassette replay without a matching recording (utils.cassette.CassetteMissError)
+        print(f"📼 {e.__cause__}")
+    elif isinstance(e, APIConnectionError):
+        print(f"⚠️  Connection error: {e}")
+        print("Check your internet connection and try again.")
+    elif isinstance(e, APIError):
+        print(f"⚠️  API error: {e}")
+    elif isinstance(e, BudgetExceeded):
+        print(f"💸 Budget exceeded: {e}")
+    else:
+        print(f"❌ Unexpected error: {e}")
 
 
 def handle_api_errors(func: Callable) -> Callable:
     """
     Decorator to handle common API errors gracefully.
+    Works on both regular functions and coroutine functions.
+    
+    Only errors raised by the call itself are seen: a stream fails later,
+    while it is iterated. ``ChatStream`` reports those through its
+    ``on_error`` callback (``report_api_error`` for ClaudeClient streams).
     
     Usage:
         @handle_api_errors
         def my_api_call():
             ...
     """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                report_api_error(e)
+                raise
+
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except RateLimitError as e:
-            print(f"⚠️  Rate limit exceeded: {e}")
-            print("Try again in a few moments.")
-            raise
-        except APIConnectionError as e:
-            print(f"⚠️  Connection error: {e}")
-            print("Check your internet connection and try again.")
-            raise
-        except APIError as e:
-            print(f"⚠️  API error: {e}")
-            raise
         except Exception as e:
-            print(f"❌ Unexpected error: {e}")
+            report_api_error(e)
             raise
     
     return wrapper
@@ -46,6 +81,7 @@ def retry_with_backoff(
 ) -> Callable:
     """
     Decorator to retry a function with exponential backoff.
+    Coroutine functions are retried with ``asyncio.sleep`` between attempts.
     
     Args:
         max_retries: Maximum number of retry attempts
@@ -58,6 +94,28 @@ def retry_with_backoff(
             ...
     """
     def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            import asyncio
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                delay = initial_delay
+
+                for attempt in range(max_retries + 1):
+                    try:
+                        return await func(*args, **kwargs)
+                    except _transient_errors() as e:
+                        if attempt == max_retries:
+                            print(f"❌ Failed after {max_retries} retries")
+                            raise
+
+                        print(f"⚠️  Attempt {attempt + 1} failed: {e}")
+                        print(f"Retrying in {delay:.1f}s...")
+                        await asyncio.sleep(delay)
+                        delay *= backoff_factor
+
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> Any:
             delay = initial_delay
@@ -66,7 +124,7 @@ def retry_with_backoff(
             for attempt in range(max_retries + 1):
                 try:
                     return func(*args, **kwargs)
-                except (RateLimitError, APIConnectionError) as e:
+                except _transient_errors() as e:
                     last_exception = e
                     
                     if attempt == max_retries:
@@ -0,0 +1,307 @@
+"""
+Compact conversation history with pre-serialized turns.
+
+A history kept as a list of dicts holds every string plus the SDK content
+objects, and the whole list is JSON-encoded again on every turn. A History
+stores each turn once, as the compact JSON fragment that goes on the wire.
+Roles and block types are interned strings, and the content is only decoded
+again if you read it. Building a request body is then a byte concatenation
+of the cached fragments plus the (small) request parameters. Only the newest
+turn is encoded when it is added.
+
+Usage:
+    from utils import ClaudeClient
+    from utils.history import History
+
+    client = ClaudeClient()
+    history = History(max_turns=20)            # keeps the newest 20 turns, starting at a user turn
+
+    history.add_user("What's the capital of France?")
+    response = history.create(client, max_tokens=1024)   # appends the assistant turn
+    print(response.content[0].text)
+
+    # Tool loops: add the assistant's tool_use turn, then the results by tool_use id
+    history.add_tool_results({block.id: run(block) for block in response.content if block.type == "tool_use"})
+
+    # ClaudeClient.multi_turn_chat also accepts a History in place of the messages list
+    reply = client.multi_turn_chat(history)
+"""
+
+import functools
+import inspect
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+ROLES = {role: sys.intern(role) for role in ("user", "assistant")}
+
+# Request parameters that are HTTP options, not body fields
+REQUEST_OPTIONS = ("timeout", "extra_headers", "extra_query")
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+@functools.lru_cache(maxsize=None)
+def _sdk() -> tuple:
+    """(Message type, whether the SDK can post a pre-encoded body), imported on first request."""
+    from anthropic import Anthropic
+    from anthropic.types import Message
+
+    # Older SDKs cannot post a pre-encoded body; they get the decoded messages instead
+    return Message, "content" in inspect.signature(Anthropic.post).parameters
+
+
+def to_block(block: Any) -> Dict[str, Any]:
+    """Plain dict for an SDK content block (or a dict already), without unset fields."""
+    if isinstance(block, dict):
+        return block
+    kind = block.type
+    if kind == "text":
+        return {"type": "text", "text": block.text}
+    if kind == "tool_use":
+        return {"type": "tool_use", "id": block.id, "name": block.name, "input": block.input}
+    return block.model_dump(mode="json", exclude_none=True)
+
+
+class Turn:
+    """One immutable message, stored as its JSON fragment."""
+
+    __slots__ = ("role", "kind", "json")
+
+    def __init__(self, role: str, content: Union[str, Iterable[Any]]):
+        """
+        Args:
+            role: "user" or "assistant"
+            content: Text, or content blocks (dicts or SDK objects)
+        """
+        self.role = ROLES.get(role) or sys.intern(role)
+        if isinstance(content, str):
+            self.kind = "text"
+        else:
+            content = [to_block(block) for block in content]
+            self.kind = sys.intern(content[0]["type"]) if content else "text"
+        self.json = _dumps({"role": self.role, "content": content}).encode("utf-8")
+
+    @property
+    def content(self) -> Union[str, List[Dict[str, Any]]]:
+        """Content, decoded from the stored JSON."""
+        return json.loads(self.json)["content"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return json.loads(self.json)
+
+    @property
+    def text(self) -> str:
+        """The turn's text (text blocks joined)."""
+        content = self.content
+        if isinstance(content, str):
+            return content
+        return "".join(block.get("text", "") for block in content if block.get("type") == "text")
+
+    def __repr__(self) -> str:
+        return f"Turn({self.role!r}, {len(self.json)} bytes)"
+
+
+class History:
+    """Ordered list of Turns with an incrementally built ``messages`` array."""
+
+    __slots__ = ("turns", "max_turns", "_joined")
+
+    def __init__(self, messages: Optional[Iterable[Dict[str, Any]]] = None, max_turns: Optional[int] = None):
+        """
+        Args:
+            messages: Optional initial messages (dicts with "role" and "content")
+            max_turns: Keep at most this many turns (oldest dropped, so the
+                history still starts with a user turn that is not a tool result;
+                a tool loop longer than this keeps its question, see ``trim``)
+        """
+        self.turns: List[Turn] = []
+        self.max_turns = max_turns
+        self._joined = bytearray()
+        for message in messages or ():
+            self.append(message["role"], message["content"])
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def __iter__(self) -> Iterator[Turn]:
+        return iter(self.turns)
+
+    def __getitem__(self, index: int) -> Turn:
+        return self.turns[index]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the serialized messages array."""
+        return len(self._joined) + 2
+
+    def append(self, role: str, content: Union[str, Iterable[Any]]) -> Turn:
+        """Add a turn (serialized once, here)."""
+        turn = Turn(role, content)
+        self.turns.append(turn)
+        if self._joined:
+            self._joined += b","
+        self._joined += turn.json
+        if self.max_turns is not None and len(self.turns) > self.max_turns:
+            self.trim(self.max_turns)
+        return turn
+
+    def add_user(self, content: Union[str, Iterable[Any]]) -> Turn:
+        return self.append("user", content)
+
+    def add_assistant(self, content: Any) -> Turn:
+        """Add an assistant turn from text, content blocks or a whole response (Message)."""
+        if getattr(content, "type", None) == "message":
+            content = content.content
+        return self.append("assistant", content)
+
+    def add_tool_results(self, results: Dict[str, Any], errors: Iterable[str] = ()) -> Turn:
+        """
+        Add a user turn of tool results.
+
+        Args:
+            results: tool_use id -> result (strings as-is, anything else as JSON)
+            errors: tool_use ids whose result is an error message
+        """
+        errors = set(errors)
+        blocks = []
+        for tool_use_id, result in results.items():
+            block = {
+                "type": "tool_result",
+                "tool_use_id": tool_use_id,
+                "content": result if isinstance(result, str) else _dumps(result),
+            }
+            if tool_use_id in errors:
+                block["is_error"] = True
+            blocks.append(block)
+        return self.append("user", blocks)
+
+    def trim(self, max_turns: int) -> None:
+        """
+        Keep the newest ``max_turns`` turns, starting at a user turn that is not a tool result.
+
+        If the newest ``max_turns`` hold no such turn (a long tool loop), everything
+        from the latest one is kept, past ``max_turns``: the open question is never dropped.
+        """
+        first = len(self.turns) - max_turns if max_turns > 0 else len(self.turns)
+        start = None
+        for index in range(len(self.turns) - 1, -1, -1):
+            if index < first and start is not None:
+                break
+            turn = self.turns[index]
+            if turn.role == "user" and turn.kind != "tool_result":
+                start = index
+        if not start:
+            return
+        self.turns = self.turns[start:]
+        self._joined = bytearray(b",".join(turn.json for turn in self.turns))
+
+    def clear(self) -> None:
+        self.turns.clear()
+        self._joined = bytearray()
+
+    def copy(self) -> "History":
+        """Independent History sharing the (immutable) turns; nothing is re-encoded."""
+        fork = History(max_turns=self.max_turns)
+        fork.turns = list(self.turns)
+        fork._joined = bytearray(self._joined)
+        return fork
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """Messages as dicts, e.g. for APIs that need them decoded."""
+        return json.loads(self.messages_json())
+
+    def messages_json(self) -> bytes:
+        """The serialized ``messages`` array."""
+        return b"[" + self._joined + b"]"
+
+    def body(self, **params: Any) -> bytes:
+        """
+        Request body for the Messages API: ``params`` encoded, plus the cached messages.
+
+        Args:
+            **params: Body fields other than messages (model, max_tokens, system, tools...)
+        """
+        head = _dumps(params).encode("utf-8")
+        separator = b"," if len(head) > 2 else b""
+        return head[:-1] + separator + b'"messages":' + self.messages_json() + b"}"
+
+    def _request(self, client: Any, params: Dict[str, Any]) -> tuple:
+        """(api client, body, request options) for ``params``."""
+        options = {key: params.pop(key) for key in REQUEST_OPTIONS if key in params}
+        headers = options.pop("extra_headers", None)
+        if headers:
+            options["headers"] = headers
+        query = options.pop("extra_query", None)
+        if query:
+            options["params"] = query
+        params.update(params.pop("extra_body", None) or {})
+        return client, self.body(**params), options
+
+    def create(self, client: Any, record: bool = True, **params: Any) -> Any:
+        """
+        Send the history as a Messages API request with a pre-built body.
+
+        Args:
+            client: ClaudeClient (sent through its ``create``, so its scheduler,
+                limiter and ledger apply) or Anthropic client
+            record: Append the assistant's reply to the history
+            **params: Request parameters (model defaults to the client's; with a
+                ClaudeClient also traffic_class, deadline and tags)
+
+        Returns:
+            Message: The response
+        """
+        _defaults(client, params)
+        message_type, raw_body = _sdk()
+        if hasattr(client, "chat"):
+            # The wrapper comes back here with its raw client (see create_message)
+            response = client.create(messages=self, **params)
+        elif not raw_body:
+            response = client.messages.create(messages=self.messages(), **params)
+        else:
+            api, body, options = self._request(client, params)
+            response = api.post("/v1/messages", cast_to=message_type, content=body, options=options)
+        if record:
+            self.add_assistant(response)
+        return response
+
+    async def acreate(self, client: Any, record: bool = True, **params: Any) -> Any:
+        """``create`` for AsyncClaudeClient / AsyncAnthropic."""
+        _defaults(client, params)
+        message_type, raw_body = _sdk()
+        if hasattr(client, "chat"):
+            response = await client.create(messages=self, **params)
+        elif not raw_body:
+            response = await client.messages.create(messages=self.messages(), **params)
+        else:
+            api, body, options = self._request(client, params)
+            response = await api.post("/v1/messages", cast_to=message_type, content=body, options=options)
+        if record:
+            self.add_assistant(response)
+        return response
+
+
+def _defaults(client: Any, params: Dict[str, Any]) -> None:
+    if params.get("stream"):
+        raise ValueError("History.create does not stream")
+    params.setdefault("model", getattr(client, "model", None))
+    params.setdefault("max_tokens", 4096)
+
+
+def create_message(api: Any, params: Dict[str, Any]) -> Any:
+    """messages.create, posting a pre-built body when ``params["messages"]`` is a History."""
+    messages = params.get("messages")
+    if isinstance(messages, History):
+        rest = {key: value for key, value in params.items() if key != "messages"}
+        return messages.create(api, record=False, **rest)
+    return api.messages.create(**params)
+
+
+async def acreate_message(api: Any, params: Dict[str, Any]) -> Any:
+    """Async ``create_message``."""
+    messages = params.get("messages")
+    if isinstance(messages, History):
+        rest = {key: value for key, value in params.items() if key != "messages"}
+        return await messages.acreate(api, record=False, **rest)
+    return await api.messages.create(**params)
@@ -0,0 +1,336 @@
+"""
+Resumable job runner for long bulk workloads.
+
+Every item's outcome is appended to a SQLite journal. When a job is run
+again (after a crash, Ctrl-C or a deploy), items already done are skipped
+and failed items are retried, so work done before the interruption is never
+paid for twice. Journal writes are batched into one transaction per
+``batch_size`` items, so checkpointing costs microseconds per item.
+
+Usage:
+    from utils import ClaudeClient
+    from utils.jobs import JobRunner
+
+    client = ClaudeClient()
+    runner = JobRunner("summaries", "jobs.db", concurrency=8)
+
+    def summarize(article):
+        return client.chat(f"Summarize:\\n\\n{article['text']}", max_tokens=300)
+
+    stats = runner.run(articles, summarize, id_fn=lambda a: a["url"])
+    for item_id, summary in runner.results():
+        ...
+
+    # Progress of every job in a journal:
+    python -m utils.jobs jobs.db
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .concurrency import AdaptiveLimiter
+from .error_handler import retry_with_backoff
+from .rate_limiter import RateLimiter
+
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    seconds REAL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_item ON journal (job, item_id, status);
+"""
+
+DONE = "done"
+FAILED = "failed"
+
+
+class Journal:
+    """
+    Append-only SQLite log of item outcomes, written in batches.
+
+    Records are buffered and committed together once ``batch_size`` records
+    are pending or ``flush_interval`` seconds have passed. After a hard crash,
+    at most one unflushed batch is lost and those items run again, so
+    processing is at-least-once.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 1.0):
+        """
+        Args:
+            path: SQLite journal file (created if missing)
+            batch_size: Records per write transaction
+            flush_interval: Maximum seconds a record waits in the buffer
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(JOURNAL_SCHEMA)
+        self._buffer: List[Tuple[Any, ...]] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.flushes = 0
+
+    def append(
+        self,
+        job: str,
+        item_id: str,
+        status: str,
+        result: Any = None,
+        error: Optional[str] = None,
+        seconds: Optional[float] = None,
+        encoded: Optional[str] = None,
+    ) -> None:
+        """
+        Buffer one outcome; flushes when the batch is full or old enough.
+        ``encoded`` is the result already JSON-encoded (used instead of ``result``).
+        """
+        if encoded is None and result is not None:
+            encoded = json.dumps(result, ensure_ascii=False)
+        record = (job, item_id, status, encoded, error, seconds, time.time())
+        with self._lock:
+            self._buffer.append(record)
+            due = len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered records in one transaction."""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not records:
+                return
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO journal (job, item_id, status, result, error, seconds, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    records,
+                )
+            self.flushes += 1
+
+    def done_ids(self, job: str) -> Set[str]:
+        """IDs of items that have completed successfully at least once."""
+        self.flush()
+        rows = self._db.execute("SELECT DISTINCT item_id FROM journal WHERE job = ? AND status = ?", (job, DONE))
+        return {row[0] for row in rows}
+
+    def failure_counts(self, job: str) -> Dict[str, int]:
+        """Failed attempts recorded per item (across all runs)."""
+        self.flush()
+        rows = self._db.execute(
+            "SELECT item_id, COUNT(*) FROM journal WHERE job = ? AND status = ? GROUP BY item_id", (job, FAILED)
+        )
+        return dict(rows.fetchall())
+
+    def results(self, job: str) -> Iterator[Tuple[str, Any]]:
+        """(item_id, result) for every done item, in completion order (first success wins)."""
+        self.flush()
+        rows = self._db.execute(
+            "SELECT item_id, result FROM journal WHERE seq IN "
+            "(SELECT MIN(seq) FROM journal WHERE job = ? AND status = ? GROUP BY item_id) ORDER BY seq",
+            (job, DONE),
+        )
+        for item_id, result in rows:
+            yield item_id, None if result is None else json.loads(result)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per job: items done, items that failed and never succeeded, and total failed attempts."""
+        self.flush()
+        rows = self._db.execute(
+            """
+            SELECT job,
+                   COUNT(DISTINCT CASE WHEN status = 'done' THEN item_id END),
+                   COUNT(DISTINCT item_id),
+                   SUM(status = 'failed')
+            FROM journal GROUP BY job ORDER BY job
+            """
+        )
+        return [
+            {"job": job, "done": done, "failed": total - done, "failed_attempts": attempts}
+            for job, done, total, attempts in rows
+        ]
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
+
+
+def _in_slot(fn: Callable[[Any], Any], limiter: AdaptiveLimiter) -> Callable[[Any], Any]:
+    def limited(item: Any) -> Any:
+        with limiter.slot():
+            return fn(item)
+
+    return limited
+
+
+class JobRunner:
+    """Run a function over many items with concurrency, retries and a journal."""
+
+    def __init__(
+        self,
+        job: str,
+        journal: Any,
+        concurrency: int = 8,
+        max_retries: int = 3,
+        initial_delay: float = 1.0,
+        max_failures: Optional[int] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        """
+        Args:
+            job: Job name; one journal can hold many jobs
+            journal: Journal instance or path to the journal file
+            concurrency: Items processed at once
+            max_retries: In-run retries of rate-limit/connection errors (retry_with_backoff)
+            initial_delay: First retry delay in seconds
+            max_failures: Stop retrying an item on restart after this many failed runs (None = always retry)
+            rate_limiter: Optional RateLimiter applied before each item
+            limiter: AdaptiveLimiter that tunes the items in flight (up to its
+                ``max_limit``) instead of a fixed ``concurrency``. Each attempt
+                runs in a limiter slot, so ``fn`` should let rate-limit errors
+                reach it (e.g. ``max_retries=0`` on the SDK client).
+        """
+        self.job = job
+        self.journal = journal if isinstance(journal, Journal) else Journal(journal)
+        self.concurrency = limiter.max_limit if limiter is not None else max(1, concurrency)
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.initial_delay = initial_delay
+        self.max_failures = max_failures
+        self.rate_limiter = rate_limiter
+
+    def run(
+        self,
+        items: Iterable[Any],
+        fn: Callable[[Any], Any],
+        id_fn: Optional[Callable[[Any], Any]] = None,
+        progress_every: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        Process every item that is not yet done.
+
+        ``fn(item)`` should return a JSON-serializable result (e.g. the response
+        text); an item whose result is not is journaled as failed. Rate-limit
+        and connection errors are retried with exponential backoff; any other
+        exception marks the item failed for this run.
+
+        Args:
+            items: Any iterable, consumed lazily
+            fn: Work for one item
+            id_fn: Stable, unique ID for an item (default: its position)
+            progress_every: Print a progress line every N finished items (0 = quiet)
+
+        Returns:
+            dict: items, skipped, done, failed, given_up and elapsed seconds
+        """
+        done = self.journal.done_ids(self.job)
+        failures = self.journal.failure_counts(self.job) if self.max_failures is not None else {}
+        if self.limiter is not None:
+            fn = _in_slot(fn, self.limiter)
+        work = retry_with_backoff(max_retries=self.max_retries, initial_delay=self.initial_delay)(fn)
+        stats = {"items": 0, "skipped": 0, "done": 0, "failed": 0, "given_up": 0}
+        started = time.perf_counter()
+
+        def attempt(item: Any) -> Tuple[Optional[str], float]:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            began = time.perf_counter()
+            result = work(item)
+            seconds = time.perf_counter() - began
+            # Encoded here, so a result that is not JSON fails this item only
+            return None if result is None else json.dumps(result, ensure_ascii=False), seconds
+
+        def record(future: Future, item_id: str) -> None:
+            try:
+                encoded, seconds = future.result()
+            except Exception as e:
+                self.journal.append(self.job, item_id, FAILED, error=f"{type(e).__name__}: {e}")
+                stats["failed"] += 1
+            else:
+                self.journal.append(self.job, item_id, DONE, encoded=encoded, seconds=round(seconds, 3))
+                stats["done"] += 1
+            finished_count = stats["done"] + stats["failed"]
+            if progress_every and finished_count % progress_every == 0:
+                rate = finished_count / max(1e-9, time.perf_counter() - started)
+                print(f"  {self.job}: {finished_count} processed ({stats['failed']} failed, {rate:.1f}/s)")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending: Dict[Future, str] = {}
+            try:
+                for index, item in enumerate(items):
+                    stats["items"] += 1
+                    item_id = str(id_fn(item) if id_fn else index)
+                    if item_id in done:
+                        stats["skipped"] += 1
+                        continue
+                    if self.max_failures is not None and failures.get(item_id, 0) >= self.max_failures:
+                        stats["given_up"] += 1
+                        continue
+                    # Keep only a small window of items in memory
+                    while len(pending) >= self.concurrency * 2:
+                        finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            record(future, pending.pop(future))
+                    pending[pool.submit(attempt, item)] = item_id
+                for future in list(pending):
+                    record(future, pending.pop(future))
+            finally:
+                # Interrupted (Ctrl-C, or an error in the item source): drop queued
+                # items, but journal the ones already running once they finish
+                for future in pending:
+                    future.cancel()
+                wait(list(pending))
+                for future, item_id in pending.items():
+                    if not future.cancelled():
+                        record(future, item_id)
+                self.journal.flush()
+
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        return stats
+
+    def results(self) -> Iterator[Tuple[str, Any]]:
+        """(item_id, result) pairs for every completed item of this job."""
+        return self.journal.results(self.job)
+
+    def close(self) -> None:
+        self.journal.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show the progress of jobs recorded in a journal")
+    parser.add_argument("journal", help="Journal file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.journal):
+        parser.error(f"{args.journal} does not exist")
+    journal = Journal(args.journal)
+    rows = journal.summary()
+    journal.close()
+    if not rows:
+        print("No jobs recorded yet")
+        return
+    print(f"{'job':<30} {'done':>10} {'failed':>10} {'attempts':>10}")
+    for row in rows:
+        print(f"{row['job']:<30} {row['done']:>10} {row['failed']:>10} {row['failed_attempts']:>10}")
+
+
+if __name__ == "__main__":
+    main()
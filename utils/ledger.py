@@ -0,0 +1,322 @@
+"""
+Token and cost accounting per workload, with budgets.
+
+A Ledger adds up the input, output and prompt-cache tokens and the estimated
+cost of every call, under tags such as ``job``, ``tenant`` or ``example``.
+Each tag is counted separately (a call tagged ``{"job": "emails", "tenant":
+"acme"}`` adds to ``job=emails``, ``tenant=acme`` and the ``*`` total), so
+one call can answer both "which job" and "which customer". Counters live in
+memory, in one shard per thread so callers never contend with each other,
+and are flushed to a SQLite file every few seconds.
+
+Budgets cap a tag's spend: once it is over budget, further calls are either
+rejected with BudgetExceeded or downgraded to a cheaper model.
+
+Usage:
+    from utils import ClaudeClient
+    from utils.ledger import Budget, Ledger
+
+    ledger = Ledger("ledger.db", budgets={
+        "tenant=acme": Budget(25.00),                                   # reject when spent
+        "job=nightly": Budget(5.00, fallback_model="claude-haiku-4-5-20251001"),  # downgrade
+    })
+    client = ClaudeClient(ledger=ledger, tags={"job": "nightly"})
+    client.chat("Summarize...", tags={"tenant": "acme"})   # per-call tags add to the client's
+    print(ledger.totals()["job=nightly"])
+
+    # Spend per tag from the command line:
+    python -m utils.ledger ledger.db
+"""
+
+import argparse
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+TOTAL = "*"
+
+# USD per million tokens (input, output), matched by model-name prefix
+PRICES = {
+    "claude-opus-4": (15.00, 75.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-haiku-4": (1.00, 5.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-opus": (15.00, 75.00),
+    "claude-3-haiku": (0.25, 1.25),
+}
+DEFAULT_PRICE = PRICES["claude-sonnet-4"]
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+FIELDS = ("calls", "input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "cost")
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    tag TEXT PRIMARY KEY,
+    calls INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cache_creation_input_tokens INTEGER NOT NULL,
+    cache_read_input_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class BudgetExceeded(Exception):
+    """Raised when a call is rejected because one of its tags is over budget."""
+
+
+def price_for(model: str) -> tuple:
+    """(input, output) USD per million tokens for a model (Sonnet pricing if unknown)."""
+    for prefix, price in PRICES.items():
+        if model.startswith(prefix):
+            return price
+    return DEFAULT_PRICE
+
+
+def estimate_cost(model: str, usage: Any) -> float:
+    """Estimated USD cost of one response's ``usage``."""
+    input_price, output_price = price_for(model)
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    return (
+        usage.input_tokens * input_price
+        + cache_write * input_price * CACHE_WRITE_MULTIPLIER
+        + cache_read * input_price * CACHE_READ_MULTIPLIER
+        + usage.output_tokens * output_price
+    ) / 1_000_000
+
+
+def tag_keys(tags: Optional[Dict[str, Any]]) -> List[str]:
+    """Ledger keys a call with ``tags`` is counted under ("name=value" per tag, plus the total)."""
+    return [TOTAL] + [f"{name}={value}" for name, value in sorted((tags or {}).items())]
+
+
+class Budget:
+    """Spending cap for one tag."""
+
+    __slots__ = ("limit", "fallback_model")
+
+    def __init__(self, limit: float, fallback_model: Optional[str] = None):
+        """
+        Args:
+            limit: USD the tag may spend
+            fallback_model: Model to use once over budget (None = reject the call)
+        """
+        self.limit = limit
+        self.fallback_model = fallback_model
+
+
+class _Shard:
+    """One thread's counters; its lock is only contended while a flush reads it."""
+
+    __slots__ = ("rows", "lock", "owner")
+
+    def __init__(self) -> None:
+        self.rows: Dict[str, List[float]] = {}
+        self.lock = threading.Lock()
+        self.owner = threading.current_thread()
+
+
+class Ledger:
+    """Thread-safe token and cost totals per tag, periodically flushed to SQLite."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        budgets: Optional[Dict[str, Budget]] = None,
+        flush_interval: float = 5.0,
+    ):
+        """
+        Args:
+            path: SQLite file to accumulate into (None = in memory only). Totals
+                already in the file count towards budgets.
+            budgets: Budget per tag key, e.g. ``{"tenant=acme": Budget(25.0)}``
+            flush_interval: Seconds between background flushes
+        """
+        self.path = path
+        self.budgets: Dict[str, Budget] = dict(budgets or {})
+        self._flushed: Dict[str, List[float]] = {}
+        self._shards: List[_Shard] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if path is not None:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(LEDGER_SCHEMA)
+            for row in self._db.execute(f"SELECT tag, {', '.join(FIELDS)} FROM ledger"):
+                self._flushed[row[0]] = list(row[1:])
+            self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,), name="ledger-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, model: str, usage: Any, tags: Optional[Dict[str, Any]] = None) -> float:
+        """
+        Add one response's usage under each of its tags.
+
+        Returns:
+            float: Estimated cost of the call in USD
+        """
+        cost = estimate_cost(model, usage)
+        delta = (
+            1, usage.input_tokens, usage.output_tokens,
+            getattr(usage, "cache_creation_input_tokens", None) or 0,
+            getattr(usage, "cache_read_input_tokens", None) or 0,
+            cost,
+        )
+        shard = self._shard()
+        with shard.lock:
+            for key in tag_keys(tags):
+                row = shard.rows.get(key)
+                if row is None:
+                    row = shard.rows[key] = [0] * len(FIELDS)
+                for i, value in enumerate(delta):
+                    row[i] += value
+        return cost
+
+    def spent(self, key: str) -> float:
+        """USD spent so far under a tag key (flushed and unflushed)."""
+        with self._lock:
+            total = self._flushed[key][-1] if key in self._flushed else 0.0
+            for shard in self._shards:
+                with shard.lock:
+                    row = shard.rows.get(key)
+                    if row is not None:
+                        total += row[-1]
+        return total
+
+    def check(self, model: str, tags: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Apply budgets before a call.
+
+        Returns:
+            str: The model to call (``model``, or a budget's fallback model)
+
+        Raises:
+            BudgetExceeded: A tag without a fallback model is over budget
+        """
+        for key in tag_keys(tags):
+            budget = self.budgets.get(key)
+            if budget is None:
+                continue
+            spent = self.spent(key)
+            if spent < budget.limit:
+                continue
+            if budget.fallback_model is None:
+                raise BudgetExceeded(f"{key} has spent ${spent:.4f} of its ${budget.limit:.4f} budget")
+            model = budget.fallback_model
+        return model
+
+    def flush(self) -> None:
+        """Fold in-memory counters into the persisted totals (and the SQLite file)."""
+        delta: Dict[str, List[float]] = {}
+        with self._lock:
+            for shard in self._shards:
+                with shard.lock:
+                    rows, shard.rows = shard.rows, {}
+                for key, row in rows.items():
+                    target = delta.setdefault(key, [0] * len(FIELDS))
+                    for i, value in enumerate(row):
+                        target[i] += value
+            # Shards of finished threads are empty now and can go
+            self._shards = [shard for shard in self._shards if shard.owner.is_alive()]
+            for key, row in delta.items():
+                target = self._flushed.setdefault(key, [0] * len(FIELDS))
+                for i, value in enumerate(row):
+                    target[i] += value
+            if not delta or self._db is None:
+                return
+            now = time.time()
+            with self._db:
+                self._db.executemany(
+                    f"""
+                    INSERT INTO ledger (tag, {', '.join(FIELDS)}, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (tag) DO UPDATE SET
+                        {', '.join(f"{field} = {field} + excluded.{field}" for field in FIELDS)},
+                        updated = excluded.updated
+                    """,
+                    [(key, *row, now) for key, row in delta.items()],
+                )
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def totals(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Totals per tag key (flushed and unflushed).
+
+        Args:
+            keys: Tag keys to report (default: all)
+
+        Returns:
+            dict: tag key -> calls, token counts and cost (USD), plus budget if one is set
+        """
+        self.flush()
+        with self._lock:
+            rows = {key: list(row) for key, row in self._flushed.items()}
+        wanted = set(keys) if keys is not None else set(rows)
+        report = {}
+        for key in sorted(wanted):
+            row = rows.get(key, [0] * len(FIELDS))
+            entry: Dict[str, Any] = dict(zip(FIELDS, row))
+            entry["cost"] = round(entry["cost"], 6)
+            if key in self.budgets:
+                entry["budget"] = self.budgets[key].limit
+            report[key] = entry
+        return report
+
+    def close(self) -> None:
+        """Stop the background flusher and write everything out."""
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self.flush()
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+        atexit.unregister(self.close)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show token usage and estimated cost per tag from a ledger file")
+    parser.add_argument("ledger", help="Ledger file")
+    parser.add_argument("--tag", help="Only show tags starting with this (e.g. tenant=)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.ledger):
+        parser.error(f"{args.ledger} does not exist")
+    db = sqlite3.connect(args.ledger)
+    rows = db.execute(f"SELECT tag, {', '.join(FIELDS)} FROM ledger ORDER BY cost DESC").fetchall()
+    db.close()
+    rows = [row for row in rows if not args.tag or row[0].startswith(args.tag)]
+    if not rows:
+        print("Nothing recorded yet")
+        return
+    print(f"{'tag':<32} {'calls':>8} {'input':>12} {'output':>12} {'cache read':>12} {'cost ($)':>10}")
+    for tag, calls, input_tokens, output_tokens, _, cache_read, cost in rows:
+        print(f"{tag:<32} {calls:>8} {input_tokens:>12} {output_tokens:>12} {cache_read:>12} {cost:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+"""
+Local mock of the Anthropic Messages API.
+Serves plausible non-streaming and SSE streaming responses (including
+tool_use turns) with configurable latency and injected 429/529 errors, so
+clients, gateways and benchmarks can run without an API key or spending
+tokens.
+
+Usage:
+    with MockAnthropicServer(output_tokens=100, token_delay=0.001) as server:
+        client = ClaudeClient(api_key="test", base_url=server.base_url)
+        print(client.chat("Hello"))
+
+    # Or from the command line:
+    python -m utils.mock_server --port 8765 --latency lognormal:0.3,0.4 --rate-limit-rate 0.05
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from ._http import (
+    LAST_CHUNK,
+    chunk,
+    event_stream_head,
+    json_response,
+    read_request,
+    sse_frame,
+)
+
+
+WORDS = (
+    "the quick brown fox jumps over the lazy dog while claude writes "
+    "a thoughtful and detailed answer about the topic at hand"
+).split()
+
+# Placeholder values for generated tool inputs, by JSON schema type
+SCHEMA_DEFAULTS = {
+    "string": "example",
+    "number": 1,
+    "integer": 1,
+    "boolean": True,
+    "array": [],
+    "object": {},
+}
+
+
+def parse_latency(spec: Union[str, float, None], rng: random.Random) -> Callable[[], float]:
+    """
+    Build a latency sampler from a spec string.
+
+    Supported specs (seconds):
+        "0.2" or "fixed:0.2"
+        "uniform:LOW,HIGH"
+        "exp:MEAN"
+        "normal:MEAN,STDDEV"          (clamped at 0)
+        "lognormal:MEDIAN,SIGMA"      (long-tailed, like real API latency)
+    """
+    if not spec:
+        return lambda: 0.0
+    if isinstance(spec, (int, float)):
+        value = float(spec)
+        return lambda: value
+
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    try:
+        params = [float(x) for x in args.split(",")]
+        if kind == "fixed":
+            return lambda: params[0]
+        if kind == "uniform":
+            return lambda: rng.uniform(params[0], params[1])
+        if kind == "exp":
+            return lambda: rng.expovariate(1.0 / params[0])
+        if kind == "normal":
+            return lambda: max(0.0, rng.gauss(params[0], params[1]))
+        if kind == "lognormal":
+            mu = math.log(params[0])
+            return lambda: rng.lognormvariate(mu, params[1])
+    except (ValueError, IndexError):
+        pass
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+class MockAnthropicServer:
+    """
+    Asyncio server speaking the subset of the Messages API used in this kit.
+
+    Responses are chosen in this order:
+        1. The first fixture whose ``match`` substring appears in the system
+           prompt or last user message returns its ``text``
+        2. If tools are offered and the last turn is not a tool result, a
+           tool_use block for the first tool with inputs generated from its schema
+        3. Otherwise ``output_tokens`` filler words
+
+    Can run inside an existing event loop (``await start()``) or on its own
+    background thread (``start_in_thread()`` / context manager).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        output_tokens: int = 50,
+        token_delay: float = 0.0,
+        latency: Union[str, float, None] = 0.0,
+        rate_limit_rate: float = 0.0,
+        overload_rate: float = 0.0,
+        retry_after: float = 0.05,
+        fixtures: Optional[List[Dict[str, str]]] = None,
+        seed: Optional[int] = None,
+        requests_per_minute: int = 0,
+        max_concurrent: int = 0,
+    ):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            output_tokens: Number of text deltas/words in filler responses
+            token_delay: Seconds between streamed deltas
+            latency: Time to first byte, as seconds or a spec for ``parse_latency``
+            rate_limit_rate: Fraction of requests answered with 429 rate_limit_error
+            overload_rate: Fraction of requests answered with 529 overloaded_error
+            retry_after: Seconds advertised in retry-after headers on injected errors
+            fixtures: List of {"match": substring, "text": response} canned replies
+            seed: Random seed for reproducible latency and error injection
+            requests_per_minute: Enforce a sliding-window request limit with 429s and
+                ``anthropic-ratelimit-requests-*`` headers (0 = unlimited, no headers)
+            max_concurrent: Answer 529 overloaded_error to requests beyond this many
+                in flight, like an upstream at capacity (0 = unlimited)
+        """
+        self.host = host
+        self.port = port
+        self.output_tokens = output_tokens
+        self.token_delay = token_delay
+        self.rate_limit_rate = rate_limit_rate
+        self.overload_rate = overload_rate
+        self.retry_after = retry_after
+        self.fixtures = fixtures or []
+        self.requests_per_minute = requests_per_minute
+        self._window: Deque[float] = deque()
+        self.max_concurrent = max_concurrent
+        self._active = 0
+        self.stats = {"requests": 0, "streamed": 0, "tool_use": 0, "rate_limited": 0, "overloaded": 0}
+        self._rng = random.Random(seed)
+        self._latency = parse_latency(latency, self._rng)
+        self._ids = itertools.count(1)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set["asyncio.Task[None]"] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def requests_served(self) -> int:
+        return self.stats["requests"]
+
+    # ----- response construction -----
+
+    def _message(self, body: Dict[str, Any], content: List[Dict[str, Any]], stop_reason: Optional[str], output_tokens: int) -> Dict[str, Any]:
+        return {
+            "id": f"msg_mock_{next(self._ids)}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "mock"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {"input_tokens": _estimate_input_tokens(body), "output_tokens": output_tokens},
+        }
+
+    def _plan(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Decide what to answer: content blocks, per-block stream deltas, stop reason and token count."""
+        messages = body.get("messages") or [{}]
+        last = messages[-1]
+        prompt = f"{_text_of(body.get('system'))}\n{_text_of(last.get('content'))}"
+
+        for fixture in self.fixtures:
+            if fixture["match"] in prompt:
+                deltas = re.findall(r"\S+\s*|\s+", fixture["text"])
+                return {
+                    "content": [{"type": "text", "text": fixture["text"]}],
+                    "deltas": [deltas],
+                    "stop_reason": "end_turn",
+                    "output_tokens": len(deltas),
+                }
+
+        tools = body.get("tools")
+        if tools and not _is_tool_result(last):
+            tool = tools[0]
+            block = {
+                "type": "tool_use",
+                "id": f"toolu_mock_{next(self._ids)}",
+                "name": tool["name"],
+                "input": _sample_input(tool.get("input_schema", {})),
+            }
+            self.stats["tool_use"] += 1
+            return {"content": [block], "deltas": [[json.dumps(block["input"])]], "stop_reason": "tool_use", "output_tokens": 10}
+
+        n = min(self.output_tokens, int(body.get("max_tokens", self.output_tokens)))
+        words = [WORDS[i % len(WORDS)] + " " for i in range(n)]
+        return {
+            "content": [{"type": "text", "text": "".join(words)}],
+            "deltas": [words],
+            "stop_reason": "end_turn" if n == self.output_tokens else "max_tokens",
+            "output_tokens": n,
+        }
+
+    def _injected_error(self) -> Optional[bytes]:
+        roll = self._rng.random()
+        headers = {"retry-after": f"{self.retry_after:g}", "retry-after-ms": str(int(self.retry_after * 1000))}
+        if roll < self.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return json_response(429, _error("rate_limit_error", "Mock rate limit exceeded"), headers)
+        if roll < self.rate_limit_rate + self.overload_rate:
+            self.stats["overloaded"] += 1
+            return json_response(529, _error("overloaded_error", "Mock API overloaded"), headers)
+        return None
+
+    def _ratelimit(self) -> Tuple[Dict[str, str], Optional[bytes]]:
+        """Rate-limit headers for this request, plus a 429 response if the window is full."""
+        if not self.requests_per_minute:
+            return {}, None
+        now = time.monotonic()
+        while self._window and now - self._window[0] >= 60.0:
+            self._window.popleft()
+        reset = 60.0 - (now - self._window[0]) if self._window else 60.0
+        headers = {
+            "anthropic-ratelimit-requests-limit": str(self.requests_per_minute),
+            "anthropic-ratelimit-requests-reset": f"{reset:.3f}",
+        }
+        if len(self._window) >= self.requests_per_minute:
+            self.stats["rate_limited"] += 1
+            headers.update({
+                "anthropic-ratelimit-requests-remaining": "0",
+                "retry-after": f"{reset:.3f}",
+                "retry-after-ms": str(int(reset * 1000)),
+            })
+            return headers, json_response(429, _error("rate_limit_error", "Mock requests per minute exceeded"), headers)
+        self._window.append(now)
+        headers["anthropic-ratelimit-requests-remaining"] = str(self.requests_per_minute - len(self._window))
+        return headers, None
+
+    # ----- request handling -----
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ValueError as e:
+                    writer.write(json_response(400, _error("invalid_request_error", str(e)), keep_alive=False))
+                    break
+                if request is None:
+                    break
+
+                if request.method != "POST" or request.path.rstrip("/") != "/v1/messages":
+                    response = json_response(404, _error("not_found_error", f"No route for {request.path}"))
+                    if request.method == "HEAD":
+                        # Headers only, or the body would corrupt the keep-alive connection
+                        response = response[:response.index(b"\r\n\r\n") + 4]
+                    writer.write(response)
+                else:
+                    body, problem = None, "Body must be a JSON object"
+                    try:
+                        body = request.json()
+                    except json.JSONDecodeError as e:
+                        problem = f"Invalid JSON body: {e}"
+                    if isinstance(body, dict):
+                        await self._messages(body, writer)
+                    else:
+                        writer.write(json_response(400, _error("invalid_request_error", problem)))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _messages(self, body: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        self.stats["requests"] += 1
+        if self.max_concurrent and self._active >= self.max_concurrent:
+            self.stats["overloaded"] += 1
+            headers = {"retry-after": str(self.retry_after)}
+            writer.write(json_response(529, _error("overloaded_error", "Mock API at capacity"), headers))
+            return
+        self._active += 1
+        try:
+            await self._respond(body, writer)
+        finally:
+            self._active -= 1
+
+    async def _respond(self, body: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        delay = self._latency()
+        if delay:
+            await asyncio.sleep(delay)
+
+        limit_headers, error = self._ratelimit()
+        if error is None:
+            error = self._injected_error()
+        if error is not None:
+            writer.write(error)
+            return
+
+        plan = self._plan(body)
+        if not body.get("stream"):
+            message = self._message(body, plan["content"], plan["stop_reason"], plan["output_tokens"])
+            writer.write(json_response(200, message, headers={"request-id": message["id"], **limit_headers}))
+            return
+
+        self.stats["streamed"] += 1
+        message = self._message(body, [], None, 1)
+        writer.write(event_stream_head({"request-id": message["id"], **limit_headers}, chunked=True))
+        writer.write(chunk(sse_frame("message_start", {"type": "message_start", "message": message})))
+        for index, (block, deltas) in enumerate(zip(plan["content"], plan["deltas"])):
+            await self._stream_block(writer, index, block, deltas)
+        writer.write(chunk(sse_frame("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": plan["stop_reason"], "stop_sequence": None},
+            "usage": {"output_tokens": plan["output_tokens"]},
+        })))
+        writer.write(chunk(sse_frame("message_stop", {"type": "message_stop"})))
+        writer.write(LAST_CHUNK)
+
+    async def _stream_block(self, writer: asyncio.StreamWriter, index: int, block: Dict[str, Any], deltas: List[str]) -> None:
+        if block["type"] == "text":
+            start = dict(block, text="")
+            delta_type, delta_field = "text_delta", "text"
+        else:
+            start = dict(block, input={})
+            delta_type, delta_field = "input_json_delta", "partial_json"
+
+        writer.write(chunk(sse_frame("content_block_start", {"type": "content_block_start", "index": index, "content_block": start})))
+        for delta in deltas:
+            writer.write(chunk(sse_frame("content_block_delta", {
+                "type": "content_block_delta", "index": index, "delta": {"type": delta_type, delta_field: delta},
+            })))
+            if self.token_delay:
+                await writer.drain()
+                await asyncio.sleep(self.token_delay)
+        writer.write(chunk(sse_frame("content_block_stop", {"type": "content_block_stop", "index": index})))
+
+    # ----- lifecycle -----
+
+    async def start(self) -> "MockAnthropicServer":
+        """Start serving on the current event loop."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self) -> "MockAnthropicServer":
+        """Start serving on a dedicated background thread and event loop."""
+        started = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="mock-anthropic", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop_thread(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "MockAnthropicServer":
+        return self.start_in_thread()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop_thread()
+
+
+def _text_of(content: Any) -> str:
+    """Flatten a system prompt or message content (string or block list) to text."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(b.get("text", "") for b in content if isinstance(b, dict))
+    return ""
+
+
+def _is_tool_result(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    return isinstance(content, list) and any(isinstance(b, dict) and b.get("type") == "tool_result" for b in content)
+
+
+def _sample_input(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate a minimal valid input for a tool's JSON schema (required properties only)."""
+    properties = schema.get("properties", {})
+    sample = {}
+    for name in schema.get("required", []):
+        prop = properties.get(name, {})
+        if "enum" in prop:
+            sample[name] = prop["enum"][0]
+        else:
+            sample[name] = SCHEMA_DEFAULTS.get(prop.get("type", "string"), "example")
+    return sample
+
+
+def _estimate_input_tokens(body: Dict[str, Any]) -> int:
+    """Rough input token count (~4 characters per token) for realistic usage numbers."""
+    chars = len(str(body.get("system", ""))) + len(str(body.get("messages", "")))
+    return max(1, chars // 4)
+
+
+def _error(kind: str, message: str) -> Dict[str, Any]:
+    return {"type": "error", "error": {"type": kind, "message": message}}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local mock of the Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output-tokens", type=int, default=50)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--latency", default="0", help="Time to first byte, e.g. 0.2, uniform:0.1,0.3 or lognormal:0.3,0.4")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--overload-rate", type=float, default=0.0, help="Fraction of requests answered with 529")
+    parser.add_argument("--retry-after", type=float, default=0.05)
+    parser.add_argument("--requests-per-minute", type=int, default=0, help="Enforce a request limit with rate-limit headers")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="Answer 529 beyond this many requests in flight")
+    parser.add_argument("--fixtures", help="JSON file with a list of {\"match\": ..., \"text\": ...} canned replies")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+
+    server = MockAnthropicServer(
+        host=args.host,
+        port=args.port,
+        output_tokens=args.output_tokens,
+        token_delay=args.token_delay,
+        latency=args.latency,
+        rate_limit_rate=args.rate_limit_rate,
+        overload_rate=args.overload_rate,
+        retry_after=args.retry_after,
+        fixtures=fixtures,
+        seed=args.seed,
+        requests_per_minute=args.requests_per_minute,
+        max_concurrent=args.max_concurrent,
+    )
+
+    async def serve() -> None:
+        await server.start()
+        print(f"Mock Anthropic API listening on {server.base_url}", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
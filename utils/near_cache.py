@@ -0,0 +1,403 @@
+"""
+Response cache that also matches near-duplicate prompts.
+
+Exact-key caching misses prompts that differ only in whitespace, casing,
+punctuation or a few reordered words. This cache has two tiers:
+
+    exact: the request (model, system, parameters, messages), with only
+           runs of whitespace in the prompt collapsed
+    near:  MinHash signatures of the prompt's word shingles, indexed in an
+           LSH table; a cached answer is served when the estimated Jaccard
+           similarity reaches the workload's threshold
+
+The near tier is opt-in per workload, because only some workloads tolerate
+an answer to a slightly different prompt. By default the numbers in a prompt
+must match exactly, so "$150K" never matches "$250K". A sample of near hits
+is audited against a fresh API call. When a workload's false-hit rate climbs
+past ``max_false_hit_rate``, its near tier is switched off.
+
+Everything runs in-process. NumPy is used to compute signatures when it is
+installed (``pip install numpy``); otherwise a pure-Python path gives
+identical results.
+
+Usage:
+    from utils import get_client
+    from utils.near_cache import NearDuplicateCache
+
+    cache = NearDuplicateCache(max_entries=50_000, audit_rate=0.05)
+    cache.enable("extract-contacts", threshold=0.9)
+
+    response = cache.create(
+        get_client(), workload="extract-contacts",
+        model="claude-sonnet-4-20250514", max_tokens=1024, system=EXTRACT_PROMPT,
+        messages=[{"role": "user", "content": text}],
+    )
+    print(cache.stats())      # exact/near hits, misses, audits and false hits per workload
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: signatures are computed in pure Python
+    np = None
+
+
+MERSENNE_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def canonical(text: str) -> str:
+    """Key form of a prompt for the exact tier: only whitespace runs are collapsed."""
+    return " ".join(text.split())
+
+
+def normalize(text: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form of a prompt (near tier only)."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return " ".join(_WORD.findall(text))
+
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    """32-bit hashes of the word ``size``-grams of a normalized text."""
+    words = text.split()
+    if len(words) < size:
+        grams = [" ".join(words)] if words else [""]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return {zlib.crc32(gram.encode("utf-8")) for gram in grams}
+
+
+class MinHasher:
+    """MinHash signatures over shingle hashes (same results with or without NumPy)."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._a = [rng.randrange(1, MERSENNE_PRIME) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, MERSENNE_PRIME) for _ in range(num_perm)]
+        if np is not None:
+            self._a_np = np.array(self._a, dtype=np.uint64)[:, None]
+            self._b_np = np.array(self._b, dtype=np.uint64)[:, None]
+
+    def signature(self, hashes: Set[int]) -> Tuple[int, ...]:
+        if np is not None:
+            values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[None, :]
+            # a < 2^31 and values < 2^32, so a * values fits in 64 bits
+            return tuple(((self._a_np * values + self._b_np) % MERSENNE_PRIME).min(axis=1).tolist())
+        return tuple(
+            min((a * value + b) % MERSENNE_PRIME for value in hashes)
+            for a, b in zip(self._a, self._b)
+        )
+
+
+def similarity(left: Sequence[int], right: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+class _Entry:
+    __slots__ = ("key", "workload", "context", "prompt", "signature", "numbers", "bands", "response")
+
+    def __init__(self, key: str, workload: str, context: str, prompt: str,
+                 signature: Tuple[int, ...], numbers: Tuple[str, ...], bands: List[Any], response: Any):
+        self.key = key
+        self.workload = workload
+        self.context = context
+        self.prompt = prompt
+        self.signature = signature
+        self.numbers = numbers
+        self.bands = bands
+        self.response = response
+
+
+class _Workload:
+    __slots__ = ("threshold", "enabled", "counts")
+
+    def __init__(self, threshold: float, enabled: bool):
+        self.threshold = threshold
+        self.enabled = enabled
+        self.counts = {"exact_hits": 0, "near_hits": 0, "misses": 0, "audits": 0, "false_hits": 0}
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+def _response_text(response: Any) -> str:
+    return "".join(block.text for block in response.content if getattr(block, "type", "") == "text")
+
+
+def answers_agree(cached: str, fresh: str) -> bool:
+    """Default audit check: same JSON value, or the same normalized text."""
+    try:
+        return json.loads(cached) == json.loads(fresh)
+    except ValueError:
+        return normalize(cached) == normalize(fresh)
+
+
+class NearDuplicateCache:
+    """In-memory response cache with an exact tier and an opt-in MinHash/LSH near-duplicate tier."""
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 3,
+        exact_numbers: bool = True,
+        audit_rate: float = 0.0,
+        max_false_hit_rate: float = 0.05,
+        min_audits: int = 20,
+        agree: Callable[[str, str], bool] = answers_agree,
+        seed: int = 1,
+    ):
+        """
+        Args:
+            max_entries: Cached responses kept (least recently used are evicted)
+            num_perm: MinHash permutations per signature
+            bands: LSH bands (``num_perm`` must divide evenly); more bands find
+                candidates at lower similarity
+            shingle_size: Words per shingle
+            exact_numbers: Near hits require the prompt's numbers to match exactly
+            audit_rate: Fraction of near hits re-asked from the API to check them
+            max_false_hit_rate: Audited false-hit rate that turns a workload's near tier off
+            min_audits: Audits required before that rate is acted on
+            agree: ``agree(cached_text, fresh_text)`` decides if an audited hit was right
+            seed: Seed for the MinHash permutations
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.exact_numbers = exact_numbers
+        self.audit_rate = audit_rate
+        self.max_false_hit_rate = max_false_hit_rate
+        self.min_audits = min_audits
+        self.agree = agree
+        self.hasher = MinHasher(num_perm, seed)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: Dict[Any, Set[str]] = {}
+        self._workloads: Dict[str, _Workload] = {}
+        self._audits: Deque[Dict[str, Any]] = deque(maxlen=200)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # -- configuration ---------------------------------------------------
+
+    def enable(self, workload: str, threshold: float = 0.9) -> None:
+        """Serve near-duplicate hits for a workload at or above ``threshold`` similarity."""
+        with self._lock:
+            state = self._workload(workload)
+            state.threshold = threshold
+            state.enabled = True
+
+    def disable(self, workload: str) -> None:
+        """Serve only exact hits for a workload."""
+        with self._lock:
+            self._workload(workload).enabled = False
+
+    def _workload(self, workload: str) -> _Workload:
+        state = self._workloads.get(workload)
+        if state is None:
+            state = self._workloads[workload] = _Workload(threshold=1.0, enabled=False)
+        return state
+
+    # -- keys ------------------------------------------------------------
+
+    @staticmethod
+    def split_request(params: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        (context, prompt) of a request: everything that must match exactly
+        (model, system, sampling parameters, earlier turns) and the last user
+        message, which may match approximately.
+        """
+        messages = list(params.get("messages", []))
+        prompt = _text_of(messages[-1]["content"]) if messages else ""
+        context = {key: value for key, value in params.items() if key not in ("messages", "stream", "timeout")}
+        context["history"] = messages[:-1]
+        return json.dumps(context, sort_keys=True, default=str), prompt
+
+    def _key(self, workload: str, context: str, prompt: str) -> str:
+        # Case, punctuation and signs change meaning ("a - b" vs "a + b"): the
+        # exact tier keys on the prompt itself, lossy matching is the near tier's job
+        payload = "\0".join((workload, context, canonical(prompt))).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _bands(self, workload: str, context: str, signature: Tuple[int, ...]) -> List[Any]:
+        scope = hash((workload, context))
+        return [(scope, band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    # -- lookup / store ----------------------------------------------------
+
+    def lookup(self, workload: str, params: Dict[str, Any]) -> Tuple[Optional[Any], Dict[str, Any]]:
+        """
+        Find a cached response for a request.
+
+        Returns:
+            tuple: (response or None, info) where info has ``tier`` ("exact",
+            "near" or None), ``similarity`` and the ``matched`` prompt for near hits
+        """
+        context, prompt = self.split_request(params)
+        key = self._key(workload, context, prompt)
+        with self._lock:
+            state = self._workload(workload)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                state.counts["exact_hits"] += 1
+                return entry.response, {"tier": "exact", "similarity": 1.0, "matched": entry.prompt}
+            if not state.enabled:
+                state.counts["misses"] += 1
+                return None, {"tier": None}
+
+        normalized = normalize(prompt)
+        signature = self.hasher.signature(shingles(normalized, self.shingle_size))
+        numbers = tuple(_NUMBER.findall(normalized))
+        with self._lock:
+            best, best_similarity = None, 0.0
+            candidates: Set[str] = set()
+            for band in self._bands(workload, context, signature):
+                candidates |= self._buckets.get(band, set())
+            for candidate_key in candidates:
+                candidate = self._entries[candidate_key]
+                if self.exact_numbers and candidate.numbers != numbers:
+                    continue
+                score = similarity(signature, candidate.signature)
+                if score > best_similarity:
+                    best, best_similarity = candidate, score
+            if best is None or best_similarity < state.threshold:
+                state.counts["misses"] += 1
+                return None, {"tier": None}
+            self._entries.move_to_end(best.key)
+            state.counts["near_hits"] += 1
+            return best.response, {"tier": "near", "similarity": best_similarity, "matched": best.prompt}
+
+    def store(self, workload: str, params: Dict[str, Any], response: Any) -> None:
+        """Cache a response under its request."""
+        context, prompt = self.split_request(params)
+        normalized = normalize(prompt)
+        key = self._key(workload, context, prompt)
+        with self._lock:
+            near = self._workload(workload).enabled
+        # Only workloads with the near tier on pay for signatures
+        signature = self.hasher.signature(shingles(normalized, self.shingle_size)) if near else ()
+        bands = self._bands(workload, context, signature) if near else []
+        entry = _Entry(key, workload, context, prompt, signature, tuple(_NUMBER.findall(normalized)), bands, response)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    # -- API wrapper ---------------------------------------------------------
+
+    def create(self, client: Any, workload: str, **params: Any) -> Any:
+        """
+        ``messages.create`` through the cache.
+
+        Args:
+            client: ClaudeClient or Anthropic client
+            workload: Cache namespace; near hits only if ``enable``d for it
+            **params: Messages API parameters (``model`` defaults to the ClaudeClient's)
+
+        Returns:
+            Message: Cached or fresh SDK response
+        """
+        # A ClaudeClient's create() keeps its scheduler, limiter and ledger in the loop
+        send = client.create if hasattr(client, "chat") else client.messages.create
+        if "model" not in params and hasattr(client, "model"):
+            params["model"] = client.model
+        cached, info = self.lookup(workload, params)
+        if cached is None:
+            response = send(**params)
+            self.store(workload, params, response)
+            return response
+        if info["tier"] == "near" and self.audit_rate and self._rng.random() < self.audit_rate:
+            fresh = send(**params)
+            self._audit(workload, params, info, cached, fresh)
+            return fresh
+        return cached
+
+    def _audit(self, workload: str, params: Dict[str, Any], info: Dict[str, Any], cached: Any, fresh: Any) -> None:
+        agreed = self.agree(_response_text(cached), _response_text(fresh))
+        _, prompt = self.split_request(params)
+        if not agreed:
+            # The prompt deserved its own answer: cache it so it won't be mismatched again
+            self.store(workload, params, fresh)
+        with self._lock:
+            state = self._workload(workload)
+            state.counts["audits"] += 1
+            state.counts["false_hits"] += not agreed
+            self._audits.append({
+                "workload": workload,
+                "prompt": prompt[:500],
+                "matched": info["matched"][:500],
+                "similarity": round(info["similarity"], 3),
+                "agreed": agreed,
+            })
+            audits, false_hits = state.counts["audits"], state.counts["false_hits"]
+            if state.enabled and audits >= self.min_audits and false_hits / audits > self.max_false_hit_rate:
+                state.enabled = False
+                print(f"⚠️  Near-duplicate cache disabled for {workload!r}: "
+                      f"{false_hits}/{audits} audited hits disagreed with a fresh answer")
+
+    # -- reporting -------------------------------------------------------------
+
+    def audits(self) -> List[Dict[str, Any]]:
+        """Recent audit records: prompt, matched prompt, similarity and whether the answers agreed."""
+        with self._lock:
+            return list(self._audits)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Cache metrics.
+
+        Returns:
+            dict: entries, buckets, whether NumPy is used, and per workload:
+            near tier enabled/threshold, exact and near hits, misses, hit rate,
+            audits, false hits and false_hit_rate
+        """
+        with self._lock:
+            report: Dict[str, Any] = {
+                "entries": len(self._entries),
+                "buckets": len(self._buckets),
+                "numpy": np is not None,
+                "workloads": {},
+            }
+            for name, state in self._workloads.items():
+                counts = dict(state.counts)
+                lookups = counts["exact_hits"] + counts["near_hits"] + counts["misses"]
+                report["workloads"][name] = dict(
+                    counts,
+                    near_enabled=state.enabled,
+                    threshold=state.threshold,
+                    hit_rate=round((counts["exact_hits"] + counts["near_hits"]) / lookups, 3) if lookups else 0.0,
+                    false_hit_rate=round(counts["false_hits"] / counts["audits"], 3) if counts["audits"] else None,
+                )
+        return report
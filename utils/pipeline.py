@@ -0,0 +1,697 @@
+"""
+Pipelines of CPU-bound and network stages with bounded queues between them.
+
+Chunking, hashing, validation and JSON post-processing are CPU work. When it
+runs in threads next to network handling, both compete for the GIL. A
+Pipeline runs each kind of stage where it belongs:
+
+    cpu(fn)        a process pool. Large str/bytes inputs and outputs travel
+                   through shared memory instead of being pickled down a pipe.
+    network(fn)    coroutines on one event loop (e.g. AsyncClaudeClient calls)
+    thread(fn)     a thread pool, for blocking I/O such as file writes or sync clients
+
+Every stage reads from a bounded queue and writes to the next one. A slow
+stage therefore stalls the ones before it instead of letting items pile up
+in memory, so memory stays flat however long the input is. A stage function
+gets one item and returns its result. None drops the item, and with
+``flatten=True`` a returned iterable fans out into several items. Results
+come out in completion order.
+
+CPU stage functions must be picklable, i.e. defined at module level. Under
+the "spawn" start method (macOS, Windows) the calling script also needs an
+``if __name__ == "__main__":`` guard.
+
+For the common read -> chunk -> call -> parse -> write job, ``source()``
+starts a fluent pipeline. Nothing runs until it is iterated or sunk, and
+inputs are read lazily, so unbounded JSONL/CSV files work in constant memory:
+
+    from utils.pipeline import source
+
+    stats = (
+        source("tickets.jsonl", buffer=64)                       # JSONL/CSV rows, files of a directory...
+        .chunk(tokens=1500, field="body")                        # one item per chunk
+        .map_llm(system=CLASSIFY_PROMPT, prompt="{body}", concurrency=16, requests_per_minute=500)
+        .parse_json()                                            # the reply, fence-tolerant
+        .sink("labels.jsonl")                                    # runs; returns counts and per-stage stats
+    )
+
+Usage:
+    from utils import AsyncClaudeClient
+    from utils.pipeline import Pipeline
+
+    client = AsyncClaudeClient()
+
+    async def summarize(chunk):
+        return await client.chat(f"Summarize:\\n\\n{chunk}", max_tokens=300)
+
+    pipeline = (
+        Pipeline(buffer=64)
+        .cpu(split_into_chunks, flatten=True)   # module-level function, in worker processes
+        .network(summarize, concurrency=16)     # on the event loop
+        .cpu(clean_up_summary)
+    )
+    for summary in pipeline.run(read_documents()):      # or: async for ... in pipeline.stream(...)
+        print(summary)
+    print(pipeline.stats())                             # items, errors, busy time and rate per stage
+"""
+
+import asyncio
+import csv
+import functools
+import inspect
+import json
+import os
+import sys
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Union
+
+# Inputs/outputs of CPU stages at least this large go through shared memory
+SHARED_MIN_BYTES = 256 * 1024
+
+KINDS = ("cpu", "network", "thread", "inline")
+
+# Rough size of a token, as in the router and the mock server
+CHARS_PER_TOKEN = 4
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+_DONE = object()
+
+
+class SharedText:
+    """Handle to str/bytes held in a shared-memory block; only the handle is pickled."""
+
+    __slots__ = ("name", "size", "binary")
+
+    def __init__(self, name: str, size: int, binary: bool):
+        self.name = name
+        self.size = size
+        self.binary = binary
+
+    @classmethod
+    def create(cls, value: Union[str, bytes]) -> "SharedText":
+        data = value if isinstance(value, bytes) else value.encode("utf-8")
+        block = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            block.buf[:len(data)] = data
+        finally:
+            block.close()
+        return cls(block.name, len(data), isinstance(value, bytes))
+
+    def read(self) -> Union[str, bytes]:
+        block = shared_memory.SharedMemory(name=self.name)
+        try:
+            data = bytes(block.buf[:self.size])
+        finally:
+            block.close()
+        return data if self.binary else data.decode("utf-8")
+
+    def unlink(self) -> None:
+        try:
+            block = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        block.close()
+        block.unlink()
+
+    def __getstate__(self) -> tuple:
+        return (self.name, self.size, self.binary)
+
+    def __setstate__(self, state: tuple) -> None:
+        self.name, self.size, self.binary = state
+
+
+def _share(value: Any, min_bytes: int) -> Any:
+    """``value``, or a SharedText for large str/bytes (and for large items of a list)."""
+    if isinstance(value, (str, bytes)) and len(value) >= min_bytes:
+        return SharedText.create(value)
+    if isinstance(value, list):
+        return [_share(item, min_bytes) for item in value]
+    return value
+
+
+def _unshare(value: Any) -> Any:
+    """Read back (and free) what ``_share`` produced."""
+    if isinstance(value, SharedText):
+        try:
+            return value.read()
+        finally:
+            value.unlink()
+    if isinstance(value, list):
+        return [_unshare(item) for item in value]
+    return value
+
+
+def _call_shared(fn: Callable[[Any], Any], value: Any, min_bytes: int) -> Any:
+    """Runs in a worker process: read a shared input, call fn, share a large output."""
+    if isinstance(value, SharedText):
+        value = value.read()
+    result = fn(value)
+    if isinstance(result, Iterator):
+        result = list(result)  # generators cannot be pickled
+    return _share(result, min_bytes)
+
+
+def read_items(path: str) -> Iterator[Any]:
+    """
+    Lazily read a pipeline source.
+
+    JSONL files yield one object per line and CSV files one dict per row.
+    A directory yields {"id": path, "text": content} per file (recursively,
+    sorted), and any other file yields one such record. "-" yields the
+    lines of stdin.
+    """
+    if path == "-":
+        for line in sys.stdin:
+            yield line.rstrip("\n")
+        return
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                yield from read_items(os.path.join(root, name))
+        return
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline="" if extension == ".csv" else None, encoding="utf-8", errors="replace") as f:
+        if extension in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif extension == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            yield {"id": path, "text": f.read()}
+
+
+def split_text(text: str, max_chars: int, overlap: int = 0) -> List[str]:
+    """Split text into pieces of at most ``max_chars``, preferring paragraph, line, sentence and word breaks."""
+    pieces = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + max_chars)
+        if end < len(text):
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, start + max_chars // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        piece = text[start:end].strip()
+        if piece:
+            pieces.append(piece)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return pieces
+
+
+def _chunk_item(item: Any, field: str, max_chars: int, overlap: int) -> List[Any]:
+    """Chunk stage: a str becomes str pieces; a dict becomes copies with ``field`` replaced and chunk/chunks set."""
+    if not isinstance(item, dict):
+        return split_text(str(item), max_chars, overlap)
+    pieces = split_text(str(item.get(field) or ""), max_chars, overlap)
+    return [dict(item, **{field: piece, "chunk": index, "chunks": len(pieces)}) for index, piece in enumerate(pieces)]
+
+
+def _response_text(response: Any) -> str:
+    return "".join(block.text for block in response.content if block.type == "text")
+
+
+class PipelineError(Exception):
+    """A stage failed on an item (with ``on_error="raise"``)."""
+
+    def __init__(self, stage: str, item: Any, error: BaseException):
+        super().__init__(f"Stage {stage!r} failed: {error!r}")
+        self.stage = stage
+        self.item = item
+        self.error = error
+
+
+class Stage:
+    """One step of a pipeline, with its counters."""
+
+    __slots__ = ("name", "kind", "fn", "concurrency", "flatten", "items_in", "items_out", "errors", "busy",
+                 "started", "finished")
+
+    def __init__(self, name: str, kind: str, fn: Callable[[Any], Any], concurrency: int, flatten: bool):
+        self.name = name
+        self.kind = kind
+        self.fn = fn
+        self.concurrency = max(1, concurrency)
+        self.flatten = flatten
+        self.reset()
+
+    def reset(self) -> None:
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = ((self.finished or time.monotonic()) - self.started) if self.started else 0.0
+        return {
+            "kind": self.kind,
+            "concurrency": self.concurrency,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy, 3),
+            "items_per_second": round(self.items_in / elapsed, 2) if elapsed > 0 else 0.0,
+            # Share of the stage's worker capacity spent working; near 1.0 = the bottleneck
+            "utilization": round(self.busy / (elapsed * self.concurrency), 3) if elapsed > 0 else 0.0,
+        }
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: PipelineError):
+        self.error = error
+
+
+class Pipeline:
+    """Ordered stages joined by bounded queues, run on one event loop."""
+
+    def __init__(
+        self,
+        buffer: int = 32,
+        processes: Optional[int] = None,
+        threads: int = 8,
+        shared_min_bytes: int = SHARED_MIN_BYTES,
+        on_error: str = "raise",
+        mp_context: Optional[Any] = None,
+        source: Optional[Union[str, Iterable[Any], AsyncIterable[Any]]] = None,
+    ):
+        """
+        Args:
+            buffer: Capacity of each queue between stages (items)
+            processes: Worker processes for cpu stages (default: CPU count)
+            threads: Worker threads for thread stages
+            shared_min_bytes: str/bytes at least this large cross process
+                boundaries through shared memory
+            on_error: "raise" to stop at the first failing item, "skip" to drop it
+                (counted per stage, the last 100 kept in ``errors``)
+            mp_context: Optional multiprocessing context for the process pool
+            source: Default input: a path (see ``read_items``) or an iterable
+        """
+        if on_error not in ("raise", "skip"):
+            raise ValueError("on_error must be 'raise' or 'skip'")
+        self.buffer = max(1, buffer)
+        self.processes = processes or os.cpu_count() or 1
+        self.threads = threads
+        self.shared_min_bytes = shared_min_bytes
+        self.on_error = on_error
+        self.mp_context = mp_context
+        self.source = source
+        self.stages: List[Stage] = []
+        self.errors: Deque[PipelineError] = deque(maxlen=100)
+        self._read = Stage("source", "source", None, 1, False)
+
+    def add(self, kind: str, fn: Callable[[Any], Any], concurrency: int, name: Optional[str] = None,
+            flatten: bool = False) -> "Pipeline":
+        """Append a stage (see ``cpu``, ``network``, ``thread`` and ``map``)."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown stage kind {kind!r} (expected one of {', '.join(KINDS)})")
+        name = name or getattr(fn, "__name__", kind)
+        if any(stage.name == name for stage in self.stages):
+            name = f"{name}-{len(self.stages)}"
+        self.stages.append(Stage(name, kind, fn, concurrency, flatten))
+        return self
+
+    def cpu(self, fn: Callable[[Any], Any], concurrency: Optional[int] = None, name: Optional[str] = None,
+            flatten: bool = False) -> "Pipeline":
+        """CPU-bound stage in the process pool; ``fn`` must be a module-level function."""
+        return self.add("cpu", fn, concurrency or self.processes, name, flatten)
+
+    def network(self, fn: Callable[[Any], Any], concurrency: int = 8, name: Optional[str] = None,
+                flatten: bool = False) -> "Pipeline":
+        """I/O-bound stage; ``fn`` is a coroutine function, ``concurrency`` calls run at once."""
+        return self.add("network", fn, concurrency, name, flatten)
+
+    def thread(self, fn: Callable[[Any], Any], concurrency: int = 4, name: Optional[str] = None,
+               flatten: bool = False) -> "Pipeline":
+        """Blocking stage in the thread pool (file writes, sync clients...)."""
+        return self.add("thread", fn, concurrency, name, flatten)
+
+    def map(self, fn: Callable[[Any], Any], name: Optional[str] = None, flatten: bool = False) -> "Pipeline":
+        """Cheap transform, run directly on the event loop (no executor hop)."""
+        return self.add("inline", fn, 1, name, flatten)
+
+    def filter(self, predicate: Callable[[Any], bool], name: Optional[str] = None) -> "Pipeline":
+        """Keep items for which ``predicate`` is true."""
+        return self.map(lambda item: item if predicate(item) else None, name or getattr(predicate, "__name__", "filter"))
+
+    # -- fluent stages -----------------------------------------------------
+
+    def chunk(self, tokens: int = 1000, overlap: int = 0, field: str = "text", kind: str = "cpu") -> "Pipeline":
+        """
+        Split each item's text into pieces of about ``tokens`` tokens (one item per piece).
+
+        Args:
+            tokens: Target piece size (estimated at 4 characters per token)
+            overlap: Tokens repeated at the start of the next piece
+            field: Text field of dict items (str items are split as a whole)
+            kind: "cpu" (process pool) or "inline" (on the loop; for small items,
+                or scripts without a ``__main__`` guard)
+        """
+        fn = functools.partial(_chunk_item, field=field, max_chars=tokens * CHARS_PER_TOKEN,
+                               overlap=overlap * CHARS_PER_TOKEN)
+        if kind == "inline":
+            return self.add("inline", fn, 1, "chunk", flatten=True)
+        return self.add(kind, fn, self.processes, "chunk", flatten=True)
+
+    def map_llm(
+        self,
+        prompt: str = "{text}",
+        system: Optional[str] = None,
+        client: Optional[Any] = None,
+        model: Optional[str] = None,
+        max_tokens: int = 1024,
+        concurrency: int = 8,
+        output: str = "response",
+        requests_per_minute: Optional[float] = None,
+        name: str = "map_llm",
+        **params: Any,
+    ) -> "Pipeline":
+        """
+        Ask Claude about every item.
+
+        Async clients (AsyncClaudeClient, AsyncAnthropic) run as a network stage;
+        sync ones (ClaudeClient, Anthropic) in the thread pool.
+
+        Args:
+            prompt: User message template, filled from dict items (``str.format``
+                syntax) or as ``{text}`` for str items
+            system: Optional system prompt
+            client: Client to call (default: an AsyncClaudeClient from the environment)
+            model: Model override (default: the client's)
+            max_tokens: Maximum tokens per reply
+            concurrency: Requests in flight at once
+            output: Field the reply is stored in for dict items (str items become the reply)
+            requests_per_minute: Optional steady request rate
+            **params: Further Messages API parameters (temperature, ...)
+        """
+        from .rate_limiter import RateLimiter
+
+        if client is None:
+            from .client import AsyncClaudeClient
+
+            client = AsyncClaudeClient()
+        limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+        chat = getattr(client, "chat", None)
+
+        def render(item: Any) -> str:
+            return prompt.format_map(item if isinstance(item, dict) else {"text": item})
+
+        def finish(item: Any, text: str) -> Any:
+            return dict(item, **{output: text}) if isinstance(item, dict) else text
+
+        if chat is not None:  # ClaudeClient / AsyncClaudeClient (limiter, ledger, scheduler apply)
+            ask = chat
+            extra = dict(params, **({"model": model} if model else {}))
+
+            def request(item: Any) -> Any:
+                return ask(render(item), system=system, max_tokens=max_tokens, **extra)
+
+            def text_of(reply: Any) -> str:
+                return reply
+        else:  # Anthropic / AsyncAnthropic
+            ask = client.messages.create
+
+            def request(item: Any) -> Any:
+                kwargs = dict(params, model=model or DEFAULT_MODEL, max_tokens=max_tokens,
+                              messages=[{"role": "user", "content": render(item)}])
+                if system:
+                    kwargs["system"] = system
+                return ask(**kwargs)
+
+            text_of = _response_text
+
+        if inspect.iscoroutinefunction(ask):
+            async def call(item: Any) -> Any:
+                if limiter is not None:
+                    await limiter.acquire_async()
+                return finish(item, text_of(await request(item)))
+
+            return self.network(call, concurrency, name)
+
+        def call_sync(item: Any) -> Any:
+            if limiter is not None:
+                limiter.acquire()
+            return finish(item, text_of(request(item)))
+
+        return self.thread(call_sync, concurrency, name)
+
+    def parse_json(self, field: str = "response", name: str = "parse_json") -> "Pipeline":
+        """Parse JSON replies (tolerating ```json fences): ``field`` of dict items, or str items whole."""
+        from .routing import parse_json
+
+        def parse(item: Any) -> Any:
+            if isinstance(item, dict):
+                return dict(item, **{field: parse_json(item[field])})
+            return parse_json(item)
+
+        return self.map(parse, name)
+
+    def sink(self, target: Union[str, Callable[[Any], Any]],
+             items: Optional[Union[Iterable[Any], AsyncIterable[Any]]] = None) -> Dict[str, Any]:
+        """
+        Run the pipeline and write every result as a JSON line to ``target`` (or pass it to a callable).
+
+        Returns:
+            dict: written, seconds and per-stage ``stages`` stats
+        """
+        started = time.monotonic()
+        written = 0
+        f = None
+        if callable(target):
+            write = target
+        else:
+            directory = os.path.dirname(os.path.abspath(target))
+            os.makedirs(directory, exist_ok=True)
+            f = open(target, "w", encoding="utf-8")
+
+            def write(result: Any) -> None:
+                f.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+        try:
+            for result in self.run(items):
+                write(result)
+                written += 1
+        finally:
+            if f is not None:
+                f.close()
+        return {"written": written, "seconds": round(time.monotonic() - started, 3), "stages": self.stats()}
+
+    # -- running -----------------------------------------------------------
+
+    def _items(self, items: Optional[Union[str, Iterable[Any], AsyncIterable[Any]]]) -> Union[Iterable[Any], AsyncIterable[Any]]:
+        items = self.source if items is None else items
+        if items is None:
+            raise ValueError("No input: pass items, or start the pipeline with source()")
+        return read_items(items) if isinstance(items, str) else items
+
+    async def stream(self, items: Optional[Union[Iterable[Any], AsyncIterable[Any]]] = None) -> AsyncIterator[Any]:
+        """Run the pipeline over ``items`` (default: its source), yielding results as they complete."""
+        items = self._items(items)
+        loop = asyncio.get_running_loop()
+        kinds = {stage.kind for stage in self.stages}
+        processes = None
+        if "cpu" in kinds:
+            if os.name == "posix":
+                # Workers must share this process's tracker, or each would report (and
+                # unlink) the shared blocks it touched when it exits
+                resource_tracker.ensure_running()
+            processes = ProcessPoolExecutor(self.processes, mp_context=self.mp_context)
+        threads = None
+        if "thread" in kinds:
+            wanted = sum(stage.concurrency for stage in self.stages if stage.kind == "thread")
+            threads = ThreadPoolExecutor(max(self.threads, wanted), thread_name_prefix="pipeline")
+        queues: List["asyncio.Queue[Any]"] = [asyncio.Queue(self.buffer) for _ in range(len(self.stages) + 1)]
+        self._read.reset()
+        for stage in self.stages:
+            stage.reset()
+
+        tasks = [loop.create_task(self._feed(items, queues[0], queues[-1]))]
+        for index, stage in enumerate(self.stages):
+            executor = processes if stage.kind == "cpu" else threads
+            remaining = [stage.concurrency]
+            for _ in range(stage.concurrency):
+                tasks.append(loop.create_task(
+                    self._work(stage, executor, queues[index], queues[index + 1], queues[-1], remaining)
+                ))
+        try:
+            while True:
+                result = await queues[-1].get()
+                if result is _DONE:
+                    break
+                if isinstance(result, _Failure):
+                    raise result.error
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if processes is not None:
+                processes.shutdown(wait=True, cancel_futures=True)
+            if threads is not None:
+                threads.shutdown(wait=False, cancel_futures=True)
+
+    async def _feed(self, items: Union[Iterable[Any], AsyncIterable[Any]], outbox: "asyncio.Queue[Any]",
+                    results: "asyncio.Queue[Any]") -> None:
+        read = self._read
+        read.started = time.monotonic()
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:  # type: ignore[union-attr]
+                    read.items_in += 1
+                    read.items_out += 1
+                    await outbox.put(item)
+            else:
+                iterator = iter(items)  # type: ignore[arg-type]
+                # Lists and the like are in memory; other iterators (files, generators)
+                # may block, so they are read in a worker thread, off the event loop
+                blocking = not isinstance(items, (list, tuple, range, deque))
+                loop = asyncio.get_running_loop()
+                while True:
+                    started = time.monotonic()
+                    try:
+                        if blocking:
+                            item = await loop.run_in_executor(None, next, iterator, _DONE)
+                        else:
+                            item = next(iterator, _DONE)
+                    finally:
+                        read.busy += time.monotonic() - started
+                    if item is _DONE:
+                        break
+                    read.items_in += 1
+                    read.items_out += 1
+                    await outbox.put(item)
+        except Exception as e:  # a failing source always stops the pipeline
+            read.errors += 1
+            await results.put(_Failure(PipelineError("source", None, e)))
+            return
+        read.finished = time.monotonic()
+        await outbox.put(_DONE)
+
+    async def _work(self, stage: Stage, executor: Optional[Executor], inbox: "asyncio.Queue[Any]",
+                    outbox: "asyncio.Queue[Any]", results: "asyncio.Queue[Any]", remaining: List[int]) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                remaining[0] -= 1
+                if remaining[0]:
+                    await inbox.put(_DONE)  # let this stage's other workers see it too
+                else:
+                    stage.finished = time.monotonic()
+                    await outbox.put(_DONE)
+                return
+            if stage.started is None:
+                stage.started = time.monotonic()
+            stage.items_in += 1
+            started = time.monotonic()
+            try:
+                if stage.kind == "inline":
+                    result = stage.fn(item)
+                elif stage.kind == "network":
+                    result = await stage.fn(item)
+                elif stage.kind == "thread":
+                    result = await loop.run_in_executor(executor, stage.fn, item)
+                else:
+                    payload = _share(item, self.shared_min_bytes)
+                    try:
+                        shared = await loop.run_in_executor(executor, _call_shared, stage.fn, payload, self.shared_min_bytes)
+                    finally:
+                        if isinstance(payload, SharedText):
+                            payload.unlink()
+                    result = _unshare(shared)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stage.errors += 1
+                failure = PipelineError(stage.name, item, e)
+                self.errors.append(failure)
+                if self.on_error == "raise":
+                    await results.put(_Failure(failure))
+                    return
+                continue
+            finally:
+                stage.busy += time.monotonic() - started
+            if result is None:
+                continue
+            for value in (result if stage.flatten else (result,)):
+                stage.items_out += 1
+                await outbox.put(value)
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.run()
+
+    def run(self, items: Optional[Union[Iterable[Any], AsyncIterable[Any]]] = None) -> Iterator[Any]:
+        """
+        Synchronous generator over ``stream`` (default input: the source); the
+        pipeline runs on an event loop in a background thread.
+
+        Stopping iteration early (break, close) shuts the pipeline down.
+        """
+        items = self._items(items)
+        handoff: "queue.Queue[Any]" = queue.Queue(self.buffer)
+        stop = threading.Event()
+
+        async def drive() -> None:
+            results = self.stream(items)
+            try:
+                async for result in results:
+                    while True:
+                        if stop.is_set():
+                            return
+                        try:
+                            handoff.put_nowait(result)
+                            break
+                        except queue.Full:
+                            await asyncio.sleep(0.005)  # the consumer is behind; keep the loop serving
+                handoff.put(_DONE)
+            except BaseException as e:
+                handoff.put(_Failure(e))  # type: ignore[arg-type]
+            finally:
+                await results.aclose()
+
+        driver = threading.Thread(target=asyncio.run, args=(drive(),), name="pipeline", daemon=True)
+        driver.start()
+        try:
+            while True:
+                result = handoff.get()
+                if result is _DONE:
+                    break
+                if isinstance(result, _Failure):
+                    raise result.error
+                yield result
+        finally:
+            stop.set()
+            while driver.is_alive():
+                try:
+                    handoff.get_nowait()  # unblock a final put
+                except queue.Empty:
+                    driver.join(0.05)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Counters per stage (and for reading the source): items in/out, errors, busy seconds, rate and utilization."""
+        stats = {"source": self._read.stats()}
+        stats.update((stage.name, stage.stats()) for stage in self.stages)
+        return stats
+
+
+def source(items: Union[str, Iterable[Any], AsyncIterable[Any]], **options: Any) -> Pipeline:
+    """
+    Start a fluent pipeline.
+
+    Args:
+        items: A path (JSONL, CSV, a directory, any file or "-"; see ``read_items``)
+            or any (async) iterable, read lazily
+        **options: Pipeline options (buffer, processes, on_error...)
+    """
+    return Pipeline(source=items, **options)
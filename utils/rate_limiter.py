@@ -0,0 +1,89 @@
+"""
+Client-side rate limiting for bulk workloads.
+
+Spreads requests evenly under a requests-per-minute (and optionally
+tokens-per-minute) budget, so large batches don't burst into 429s.
+
+Usage:
+    from utils import RateLimiter
+
+    limiter = RateLimiter(requests_per_minute=50)
+    for prompt in prompts:
+        limiter.acquire()                # blocks until a request slot is free
+        client.chat(prompt)
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """Thread-safe token bucket for requests (and optionally tokens) per minute."""
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: Optional[float] = None,
+        burst: Optional[float] = None,
+    ):
+        """
+        Args:
+            requests_per_minute: Sustained request rate
+            tokens_per_minute: Optional sustained token rate (see ``acquire(tokens=...)``)
+            burst: Requests allowed back-to-back after an idle period
+                (default: one second's worth, at least 1)
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_rate = requests_per_minute / 60.0
+        self._request_capacity = burst if burst is not None else max(1.0, self._request_rate)
+        self._requests = self._request_capacity
+        self._token_rate = tokens_per_minute / 60.0 if tokens_per_minute else None
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self._request_capacity, self._requests + elapsed * self._request_rate)
+        if self._token_rate:
+            self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self._token_rate)
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Take a slot now and return how long the caller must wait before using it.
+        Reservations queue up, so concurrent callers are spaced out fairly.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._requests -= 1
+            wait = max(0.0, -self._requests / self._request_rate)
+            if self._token_rate and tokens:
+                self._tokens -= tokens
+                wait = max(wait, -self._tokens / self._token_rate)
+            return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until a request (and ``tokens`` tokens) may be sent.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        """Asyncio version of ``acquire``."""
+        import asyncio
+
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
@@ -0,0 +1,452 @@
+"""
+Process-wide registry of pooled Anthropic clients.
+
+Creating ``Anthropic(api_key=...)`` builds a fresh connection pool, so code
+that constructs clients per task pays a TCP + TLS handshake every time.
+The registry hands out one shared client per (api_key, base_url), backed
+by a tuned keep-alive pool, and exposes pool utilization metrics.
+
+Usage:
+    from utils import configure_pool, get_client, pool_stats, warm_pool
+
+    configure_pool(max_connections=50, keepalive_expiry=300)
+    warm_pool(connections=4)          # optional: open connections at startup
+
+    client = get_client()             # same object on every call
+    client.messages.create(...)
+    print(pool_stats())
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+
+DEFAULT_BASE_URL = "https://api.anthropic.com"
+RATELIMIT_PREFIX = "anthropic-ratelimit-"
+
+
+def _h2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class PoolConfig:
+    """Connection pool settings applied to clients created by the registry."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 120.0,
+        http2: Optional[bool] = None,
+        connect_timeout: float = 5.0,
+        timeout: float = 600.0,
+    ):
+        """
+        Args:
+            max_connections: Maximum concurrent connections per pool
+            max_keepalive_connections: Idle connections kept open for reuse
+            keepalive_expiry: Seconds an idle connection is kept before closing
+            http2: Use HTTP/2 (None = only if the ``h2`` package is installed)
+            connect_timeout: Seconds allowed to establish a connection
+            timeout: Overall read/write timeout in seconds
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = _h2_available() if http2 is None else http2
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+class PoolStats:
+    """Request counters and the latest rate-limit headers for one pool (thread-safe)."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.last_status: Optional[int] = None
+        self.ratelimit: Dict[str, int] = {}
+        self.ratelimit_updated: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, error: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += error
+
+    def observe(self, response: httpx.Response) -> None:
+        """Record the status and ``anthropic-ratelimit-*`` headers of a response."""
+        limits = {}
+        for header, value in response.headers.items():
+            if header.startswith(RATELIMIT_PREFIX) and not header.endswith("-reset"):
+                try:
+                    limits[header[len(RATELIMIT_PREFIX):]] = int(value)
+                except ValueError:
+                    continue
+        with self._lock:
+            self.last_status = response.status_code
+            if limits:
+                self.ratelimit.update(limits)
+                self.ratelimit_updated = time.monotonic()
+
+    def headroom(self, max_age: float = 60.0) -> Optional[float]:
+        """
+        Fraction of the rate limit left (0-1) across requests and tokens, from
+        the most recent response; None if unknown or older than ``max_age`` seconds.
+        """
+        with self._lock:
+            if self.ratelimit_updated is None or time.monotonic() - self.ratelimit_updated > max_age:
+                return None
+            fractions = []
+            for kind in ("requests", "tokens", "input-tokens", "output-tokens"):
+                limit = self.ratelimit.get(f"{kind}-limit")
+                remaining = self.ratelimit.get(f"{kind}-remaining")
+                if limit and remaining is not None:
+                    fractions.append(max(0.0, remaining / limit))
+            return min(fractions) if fractions else None
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, on_close: Callable[[], None]):
+        self._inner = inner
+        self._on_close = on_close
+
+    def __iter__(self) -> Any:
+        return iter(self._inner)
+
+    def close(self) -> None:
+        try:
+            self._inner.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class _AsyncMeteredStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._inner = inner
+        self._on_close = on_close
+
+    def __aiter__(self) -> Any:
+        return self._inner.__aiter__()
+
+    async def aclose(self) -> None:
+        try:
+            await self._inner.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class _MeteredTransport(httpx.BaseTransport):
+    """Counts requests in flight (until the response body is closed)."""
+
+    def __init__(self, inner: httpx.BaseTransport, stats: PoolStats):
+        self.inner = inner
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        try:
+            response = self.inner.handle_request(request)
+        except Exception:
+            self.stats.finished(error=True)
+            raise
+        self.stats.observe(response)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_MeteredStream(response.stream, self.stats.finished),
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class _AsyncMeteredTransport(httpx.AsyncBaseTransport):
+    """Async variant of _MeteredTransport."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, stats: PoolStats):
+        self.inner = inner
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except Exception:
+            self.stats.finished(error=True)
+            raise
+        self.stats.observe(response)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncMeteredStream(response.stream, self.stats.finished),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class _Entry:
+    __slots__ = ("client", "http", "network", "stats", "base_url", "config")
+
+    def __init__(self, client: Any, http: Any, network: Any, stats: PoolStats, base_url: str, config: PoolConfig):
+        self.client = client
+        self.http = http
+        self.network = network
+        self.stats = stats
+        self.base_url = base_url
+        self.config = config
+
+
+_config = PoolConfig()
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, str], _Entry] = {}
+_async_clients: Dict[Tuple[str, str, Any], _Entry] = {}
+_transport_wrappers: Tuple[Optional[Callable[[Any], Any]], Optional[Callable[[Any], Any]]] = (None, None)
+
+
+def _socket_options() -> List[Tuple[int, int, int]]:
+    """TCP keep-alive probes so idle pooled connections survive NATs and load balancers."""
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    for name, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 30), ("TCP_KEEPCNT", 5)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+def _resolve(api_key: Optional[str], base_url: Optional[str]) -> Tuple[str, str]:
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise ValueError("API key must be provided or set in ANTHROPIC_API_KEY environment variable")
+    base_url = (base_url or os.getenv("ANTHROPIC_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+    return api_key, base_url
+
+
+def configure_pool(**settings: Any) -> PoolConfig:
+    """
+    Set pool options for clients created from now on (see PoolConfig for the
+    accepted keyword arguments). Call it at startup, before the first
+    ``get_client()``; existing clients keep their settings until ``reset()``.
+
+    Returns:
+        PoolConfig: The new configuration
+    """
+    global _config
+    with _lock:
+        _config = PoolConfig(**settings)
+        return _config
+
+
+def set_transport_wrappers(
+    sync_wrapper: Optional[Callable[[Any], Any]] = None,
+    async_wrapper: Optional[Callable[[Any], Any]] = None,
+) -> None:
+    """
+    Wrap the network transport of clients created from now on (e.g. to
+    record/replay with a cassette). Pass no arguments to remove the wrappers.
+    """
+    global _transport_wrappers
+    with _lock:
+        _transport_wrappers = (sync_wrapper, async_wrapper)
+
+
+def get_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> Any:
+    """
+    Get the shared Anthropic client for an API key and base URL.
+
+    Args:
+        api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
+        base_url: API base URL (defaults to ANTHROPIC_BASE_URL env var, then the public API)
+
+    Returns:
+        Anthropic: A client whose connection pool is shared process-wide
+    """
+    from anthropic import Anthropic, DefaultHttpxClient
+
+    key = _resolve(api_key, base_url)
+    with _lock:
+        entry = _clients.get(key)
+        if entry is None:
+            config = _config
+            stats = PoolStats()
+            network = httpx.HTTPTransport(
+                limits=config.limits(), http2=config.http2, socket_options=_socket_options()
+            )
+            transport: Any = _MeteredTransport(network, stats)
+            if _transport_wrappers[0] is not None:
+                transport = _transport_wrappers[0](transport)
+            http_client = DefaultHttpxClient(transport=transport, timeout=config.timeouts())
+            client = Anthropic(api_key=key[0], base_url=key[1], http_client=http_client)
+            entry = _clients[key] = _Entry(client, http_client, network, stats, key[1], config)
+        return entry.client
+
+
+def get_async_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> Any:
+    """
+    Get the shared AsyncAnthropic client for an API key and base URL.
+
+    Async connections belong to the event loop that opened them, so clients
+    are shared per running loop; pools of closed loops are dropped.
+
+    Returns:
+        AsyncAnthropic: A client whose connection pool is shared process-wide
+    """
+    from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+
+    try:
+        loop: Any = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    key = _resolve(api_key, base_url) + (loop,)
+    with _lock:
+        for stale in [k for k in _async_clients if k[2] is not None and k[2].is_closed()]:
+            del _async_clients[stale]
+        entry = _async_clients.get(key)
+        if entry is None:
+            config = _config
+            stats = PoolStats()
+            network = httpx.AsyncHTTPTransport(
+                limits=config.limits(), http2=config.http2, socket_options=_socket_options()
+            )
+            transport: Any = _AsyncMeteredTransport(network, stats)
+            if _transport_wrappers[1] is not None:
+                transport = _transport_wrappers[1](transport)
+            http_client = DefaultAsyncHttpxClient(transport=transport, timeout=config.timeouts())
+            client = AsyncAnthropic(api_key=key[0], base_url=key[1], http_client=http_client)
+            entry = _async_clients[key] = _Entry(client, http_client, network, stats, key[1], config)
+        return entry.client
+
+
+def warm_pool(connections: int = 4, api_key: Optional[str] = None, base_url: Optional[str] = None) -> int:
+    """
+    Open connections ahead of the first real request so it skips the handshake.
+
+    Sends ``connections`` concurrent HEAD requests to the base URL; any HTTP
+    response leaves a warm keep-alive connection in the pool.
+
+    Returns:
+        int: Number of connections successfully opened (0 when ``connections`` <= 0)
+    """
+    if connections <= 0:
+        return 0
+    get_client(api_key, base_url)
+    key = _resolve(api_key, base_url)
+    with _lock:
+        http = _clients[key].http
+    url = key[1] + "/"
+    barrier = threading.Barrier(connections)
+
+    def touch(_: int) -> bool:
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            http.head(url)
+            return True
+        except httpx.HTTPError:
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        return sum(pool.map(touch, range(connections)))
+
+
+def stats_for(api_key: Optional[str] = None, base_url: Optional[str] = None) -> Optional[PoolStats]:
+    """Live PoolStats of the sync pool for an API key and base URL (None if not created yet)."""
+    with _lock:
+        entry = _clients.get(_resolve(api_key, base_url))
+    return entry.stats if entry is not None else None
+
+
+def _connection_counts(network: Any) -> Dict[str, Optional[int]]:
+    # httpcore exposes its connection list; fall back gracefully if that changes
+    connections = getattr(getattr(network, "_pool", None), "connections", None)
+    if connections is None:
+        return {"open_connections": None, "idle_connections": None}
+    return {
+        "open_connections": len(connections),
+        "idle_connections": sum(1 for c in connections if c.is_idle()),
+    }
+
+
+def key_id(api_key: str) -> str:
+    """Short, stable label for an API key that reveals nothing of the key (for logs and stats)."""
+    return "sha256:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def pool_stats() -> List[Dict[str, Any]]:
+    """
+    Utilization metrics for every pool in the registry.
+
+    Returns:
+        list: One dict per pool with the base URL and ``key_id`` (a hash of
+        the API key), request counts, in-flight/peak requests, open/idle
+        connections and utilization (in-flight / max_connections)
+    """
+    with _lock:
+        entries = [("sync", k, e) for k, e in _clients.items()] + [("async", k, e) for k, e in _async_clients.items()]
+
+    report = []
+    for kind, key, entry in entries:
+        stats = entry.stats
+        report.append(dict(
+            {
+                "kind": kind,
+                "base_url": entry.base_url,
+                "key_id": key_id(key[0]),
+                "http2": entry.config.http2,
+                "max_connections": entry.config.max_connections,
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "in_flight": stats.in_flight,
+                "peak_in_flight": stats.peak_in_flight,
+                "utilization": round(stats.in_flight / entry.config.max_connections, 3),
+                "last_status": stats.last_status,
+                "ratelimit_headroom": stats.headroom(),
+            },
+            **_connection_counts(entry.network),
+        ))
+    return report
+
+
+def reset() -> None:
+    """Close every sync pool and forget all clients (async pools are dropped, not awaited)."""
+    with _lock:
+        entries = list(_clients.values())
+        _clients.clear()
+        _async_clients.clear()
+    for entry in entries:
+        entry.client.close()
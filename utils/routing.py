@@ -0,0 +1,377 @@
+"""
+Model routing: try a smaller, faster model first and escalate when needed.
+
+Most extraction and classification requests are handled just as well by a
+small model at a fraction of the latency and cost. A ModelRouter picks the
+starting model from rules (task type, prompt size, schema complexity). It
+escalates to the next larger model only when the answer is truncated, is not
+valid JSON with the required fields, fails your validator, scores below
+a confidence threshold, or the smaller model's call fails (not found,
+overloaded, unreachable). Every decision is recorded, so the escalation rate
+and the latency and cost saved can be checked rather than assumed.
+
+Usage:
+    from utils import get_client
+    from utils.routing import ModelRouter
+
+    router = ModelRouter(get_client())
+    data = router.extract(
+        f"Extract the contacts:\\n\\n{text}",
+        system="Return ONLY valid JSON: {\\"contacts\\": [...]}",
+        required=["contacts"],
+    )
+    answer = router.chat("Write a limerick about routers", task="creative")  # goes straight to the large model
+    print(router.stats())   # escalation rate, reasons, latency per model, latency/cost saved
+"""
+
+import json
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from .ledger import estimate_cost
+
+DEFAULT_MODELS = ("claude-haiku-4-5-20251001", "claude-sonnet-4-20250514")
+CHEAP_TASKS = ("extract", "classify", "format", "summarize")
+
+
+class Rule:
+    """Start requests that match every given criterion on ``model``."""
+
+    __slots__ = ("model", "tasks", "max_prompt_tokens", "max_schema_fields")
+
+    def __init__(
+        self,
+        model: str,
+        tasks: Optional[Sequence[str]] = None,
+        max_prompt_tokens: Optional[int] = None,
+        max_schema_fields: Optional[int] = None,
+    ):
+        """
+        Args:
+            model: Starting model for matching requests
+            tasks: Task types this rule covers (None = any)
+            max_prompt_tokens: Largest estimated prompt size (None = any)
+            max_schema_fields: Most fields in the output schema (None = any)
+        """
+        self.model = model
+        self.tasks = tuple(tasks) if tasks is not None else None
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_schema_fields = max_schema_fields
+
+    def matches(self, task: Optional[str], prompt_tokens: int, schema_fields: int) -> bool:
+        if self.tasks is not None and task not in self.tasks:
+            return False
+        if self.max_prompt_tokens is not None and prompt_tokens > self.max_prompt_tokens:
+            return False
+        return self.max_schema_fields is None or schema_fields <= self.max_schema_fields
+
+
+class Decision:
+    """How one request was routed."""
+
+    __slots__ = ("task", "models", "reasons", "latencies", "cost", "baseline_cost")
+
+    def __init__(self, task: Optional[str]):
+        self.task = task
+        self.models: List[str] = []
+        self.reasons: List[str] = []      # why each escalation happened
+        self.latencies: List[float] = []  # seconds per attempt
+        self.cost = 0.0
+        self.baseline_cost = 0.0          # the final answer's tokens priced on the largest model
+
+    @property
+    def model(self) -> str:
+        """Model that produced the returned answer."""
+        return self.models[-1]
+
+    @property
+    def escalated(self) -> bool:
+        return len(self.models) > 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "task": self.task,
+            "models": self.models,
+            "reasons": self.reasons,
+            "latencies": [round(latency, 3) for latency in self.latencies],
+            "cost": round(self.cost, 6),
+        }
+
+
+def _schema_fields(schema: Any) -> int:
+    """Leaf fields in a JSON Schema or an example-shaped schema dict."""
+    if isinstance(schema, dict):
+        if isinstance(schema.get("properties"), dict):
+            schema = schema["properties"]
+        return sum(_schema_fields(value) for value in schema.values()) or 1
+    if isinstance(schema, list):
+        return sum(_schema_fields(value) for value in schema) or 1
+    return 1
+
+
+def _required(schema: Optional[Dict[str, Any]], required: Optional[Sequence[str]]) -> Sequence[str]:
+    if required is not None:
+        return required
+    if not schema:
+        return ()
+    if "properties" in schema:
+        return schema.get("required", ())
+    return list(schema)
+
+
+def parse_json(text: str) -> Any:
+    """Parse a JSON reply, tolerating a surrounding ```json fence."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return json.loads(text)
+
+
+class ModelRouter:
+    """Route requests to the cheapest model that passes the checks."""
+
+    def __init__(
+        self,
+        client: Optional[Any] = None,
+        models: Sequence[str] = DEFAULT_MODELS,
+        rules: Optional[Sequence[Rule]] = None,
+        min_confidence: float = 0.5,
+        history: int = 1000,
+        log_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            client: ClaudeClient or Anthropic client (default: the shared registry client)
+            models: Models from smallest to largest; escalation moves one step up
+            rules: Checked in order; the first match picks the starting model.
+                Requests no rule matches start on the largest model. Default:
+                extract/classify/format/summarize tasks with prompts up to 4,000
+                tokens and schemas up to 20 fields start on the smallest model.
+            min_confidence: Escalate when a ``confidence`` callback scores below this
+            history: Recent decisions kept for ``decisions()``
+            log_path: Optional JSONL file every decision is appended to
+        """
+        if client is None:
+            from .registry import get_client
+            client = get_client()
+        if not models:
+            raise ValueError("At least one model is required")
+        # A ClaudeClient's create() keeps its scheduler, limiter and ledger in the loop
+        self._send = client.create if hasattr(client, "chat") else client.messages.create
+        self.models = list(models)
+        self.rules = list(rules) if rules is not None else [
+            Rule(self.models[0], tasks=CHEAP_TASKS, max_prompt_tokens=4000, max_schema_fields=20)
+        ]
+        self.min_confidence = min_confidence
+        self.log_path = log_path
+        self._decisions: Deque[Decision] = deque(maxlen=history)
+        self._counts: Counter = Counter()
+        self._latency: Dict[str, List[float]] = {}   # model -> [total seconds, attempts]
+        self._totals = {"cost": 0.0, "baseline_cost": 0.0, "seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def route(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        task: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Starting model for a request (no API call)."""
+        prompt_tokens = (len(prompt) + len(system or "")) // 4
+        fields = _schema_fields(schema) if schema else 0
+        for rule in self.rules:
+            if rule.matches(task, prompt_tokens, fields):
+                return rule.model
+        return self.models[-1]
+
+    def _check(
+        self,
+        response: Any,
+        text: str,
+        expect_json: bool,
+        required: Sequence[str],
+        validate: Optional[Callable[[Any], Any]],
+        confidence: Optional[Callable[[Any], float]],
+    ) -> Tuple[Optional[str], Any]:
+        """(escalation reason or None, parsed result)."""
+        if response.stop_reason == "max_tokens":
+            return "truncated", None
+        result: Any = text
+        if expect_json:
+            try:
+                result = parse_json(text)
+            except ValueError:
+                return "invalid_json", None
+            if required and (not isinstance(result, dict) or any(key not in result for key in required)):
+                return "missing_fields", None
+        if validate is not None:
+            try:
+                if validate(result) is False:
+                    return "validation", None
+            except Exception:
+                return "validation", None
+        if confidence is not None:
+            try:
+                if confidence(result) < self.min_confidence:
+                    return "low_confidence", None
+            except Exception:
+                return "low_confidence", None
+        return None, result
+
+    def create(
+        self,
+        messages: List[Dict[str, Any]],
+        system: Optional[str] = None,
+        task: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        required: Optional[Sequence[str]] = None,
+        expect_json: bool = False,
+        validate: Optional[Callable[[Any], Any]] = None,
+        confidence: Optional[Callable[[Any], float]] = None,
+        max_tokens: int = 1024,
+        **params: Any,
+    ) -> Tuple[Any, Any, Decision]:
+        """
+        Send a request, escalating through ``models`` until the checks pass.
+
+        The largest model's answer is returned even if it fails the checks
+        (for JSON, unless it cannot be parsed: then ValueError is raised).
+        An API or connection error escalates too, except on the last model,
+        where it propagates.
+
+        Args:
+            messages: Conversation to send
+            system: Optional system prompt
+            task: Task type used by the rules (e.g. "extract", "classify")
+            schema: Expected output shape; its size feeds the rules and its
+                top-level keys (or JSON Schema ``required``) must be present
+            required: Keys the JSON answer must contain (overrides ``schema``)
+            expect_json: Parse the answer as JSON (implied by schema/required)
+            validate: Called with the answer; returning False or raising escalates
+            confidence: Called with the answer; a score below ``min_confidence`` or raising escalates
+            max_tokens: Maximum tokens per attempt
+            **params: Other Messages API parameters (temperature, ...)
+
+        Returns:
+            tuple: (SDK response, parsed JSON or text, Decision)
+        """
+        prompt = "".join(str(m.get("content", "")) for m in messages)
+        start = self.route(prompt, system, task, schema)
+        tiers = self.models[self.models.index(start):] if start in self.models else [start, self.models[-1]]
+        keys = _required(schema, required)
+        expect_json = expect_json or bool(keys) or schema is not None
+        if system:
+            params["system"] = system
+
+        from anthropic import APIConnectionError, APIStatusError
+
+        decision = Decision(task)
+        for attempt, model in enumerate(tiers):
+            began = time.perf_counter()
+            try:
+                response = self._send(model=model, max_tokens=max_tokens, messages=messages, **params)
+            except (APIStatusError, APIConnectionError) as e:
+                if attempt == len(tiers) - 1:
+                    raise
+                # A retired, overloaded or unreachable tier is skipped rather than failing the request
+                decision.models.append(model)
+                decision.latencies.append(time.perf_counter() - began)
+                status = getattr(e, "status_code", None)
+                decision.reasons.append(f"api_error_{status}" if status is not None else "connection_error")
+                continue
+            decision.models.append(model)
+            decision.latencies.append(time.perf_counter() - began)
+            decision.cost += estimate_cost(model, response.usage)
+            text = "".join(block.text for block in response.content if getattr(block, "type", "") == "text")
+            reason, result = self._check(response, text, expect_json, keys, validate, confidence)
+            if reason is None or attempt == len(tiers) - 1:
+                decision.baseline_cost = estimate_cost(self.models[-1], response.usage)
+                self._record(decision)
+                if reason is not None:
+                    # Out of models: return the largest model's answer (JSON errors propagate)
+                    result = parse_json(text) if expect_json else text
+                return response, result, decision
+            decision.reasons.append(reason)
+        raise AssertionError("unreachable")
+
+    def chat(self, message: str, system: Optional[str] = None, task: Optional[str] = None, **kwargs: Any) -> str:
+        """Routed single message; returns the response text."""
+        _, text, _ = self.create([{"role": "user", "content": message}], system=system, task=task, **kwargs)
+        return text if isinstance(text, str) else json.dumps(text)
+
+    def extract(
+        self,
+        message: str,
+        system: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        required: Optional[Sequence[str]] = None,
+        task: str = "extract",
+        **kwargs: Any,
+    ) -> Any:
+        """Routed JSON extraction; returns the parsed JSON."""
+        _, data, _ = self.create(
+            [{"role": "user", "content": message}], system=system, task=task,
+            schema=schema, required=required, expect_json=True, **kwargs,
+        )
+        return data
+
+    def _record(self, decision: Decision) -> None:
+        with self._lock:
+            self._decisions.append(decision)
+            self._counts["requests"] += 1
+            self._counts[f"start:{decision.models[0]}"] += 1
+            self._counts[f"final:{decision.model}"] += 1
+            if decision.escalated:
+                self._counts["escalations"] += 1
+            for reason in decision.reasons:
+                self._counts[f"reason:{reason}"] += 1
+            for model, latency in zip(decision.models, decision.latencies):
+                totals = self._latency.setdefault(model, [0.0, 0])
+                totals[0] += latency
+                totals[1] += 1
+            self._totals["cost"] += decision.cost
+            self._totals["baseline_cost"] += decision.baseline_cost
+            self._totals["seconds"] += sum(decision.latencies)
+            # Decisions are appended under the lock, so log lines never interleave
+            if self.log_path is not None:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(decision.as_dict()) + "\n")
+
+    def decisions(self) -> List[Decision]:
+        """Most recent routing decisions, oldest first."""
+        with self._lock:
+            return list(self._decisions)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Routing metrics.
+
+        Returns:
+            dict: requests, escalations, escalation_rate, requests per starting
+            and final model, escalation reasons, mean latency per model (ms),
+            latency_saved_s (versus sending everything to the largest model, once
+            its latency has been observed), and cost vs. baseline_cost in USD
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            latency = {model: totals[0] / totals[1] for model, totals in self._latency.items()}
+            totals = dict(self._totals)
+        requests = counts.get("requests", 0)
+        largest = latency.get(self.models[-1])
+        saved = requests * largest - totals["seconds"] if largest is not None else None
+        return {
+            "requests": requests,
+            "escalations": counts.get("escalations", 0),
+            "escalation_rate": round(counts.get("escalations", 0) / requests, 3) if requests else 0.0,
+            "started_on": {k[6:]: v for k, v in counts.items() if k.startswith("start:")},
+            "answered_by": {k[6:]: v for k, v in counts.items() if k.startswith("final:")},
+            "reasons": {k[7:]: v for k, v in counts.items() if k.startswith("reason:")},
+            "latency_ms": {model: round(seconds * 1000, 1) for model, seconds in latency.items()},
+            "latency_saved_s": round(saved, 3) if saved is not None else None,
+            "cost": round(totals["cost"], 6),
+            "baseline_cost": round(totals["baseline_cost"], 6),
+        }
@@ -0,0 +1,465 @@
+"""
+Run tools in a pool of pre-warmed, resource-limited worker processes.
+
+Tools that run untrusted or heavy code (calculators evaluating expressions,
+file operations, database queries) should not run in the agent's process. A
+crash, a runaway loop or a memory blow-up there takes the whole conversation
+down. A subprocess per call is isolated but slow: every call pays for
+interpreter startup and imports. A SandboxPool keeps ``size`` workers
+started and warmed up (``preload`` modules already imported) and sends each
+call to an idle one:
+
+    - calls and results travel over the worker's stdin/stdout pipes as
+      length-prefixed JSON frames (4-byte length + payload). The parent never
+      unpickles anything a worker sends.
+    - each call gets ``cpu_seconds`` of CPU time (RLIMIT_CPU, raised per
+      call) and the worker's address space is capped at ``memory_mb``
+      (RLIMIT_AS). ``timeout`` bounds the wall-clock time in the parent.
+    - a worker is replaced after ``max_calls`` calls, and whenever it
+      crashes, hits a limit, times out or raises MemoryError. The replacement
+      is started at once, so a warm worker is usually waiting.
+
+Functions from importable modules are sent by reference ("module:name") and
+the worker calls the undecorated function. A SandboxPool created while a
+worker imports such a module is inert: it starts no processes and runs calls
+in place. Functions defined in the running script (``__main__``) are sent as
+source code once per worker, so they must be self-contained (imports inside
+the function). Arguments and results must be JSON-serializable.
+
+Workers get a scrubbed environment (PATH, locale, temp dirs, PYTHONPATH), so
+API keys and other secrets of the parent are not visible to tool code. Pass
+``pass_env=[...]`` or ``env={...}`` to hand over what a tool needs.
+
+Resource limits need POSIX (Linux, macOS). Elsewhere, workers still give
+process isolation and recycling, but without limits or timeouts.
+
+Usage:
+    from utils import ToolRegistry
+    from utils.sandbox import SandboxPool
+
+    sandbox = SandboxPool(size=4, max_calls=200, cpu_seconds=2, memory_mb=256, timeout=10)
+    tools = ToolRegistry()
+
+    @tools.tool(blocking=True)          # schema from the signature, call runs in a worker
+    @sandbox.isolate
+    def evaluate(expression: str) -> float:
+        import ast
+        ...
+
+    results, errors = tools.execute(response)   # crashes and limits come back as error results
+    print(sandbox.stats())                      # calls, crashes, timeouts, recycled, latency...
+    sandbox.close()
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import queue
+import re
+import struct
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Set
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits
+    resource = None
+
+_FRAME = struct.Struct(">I")
+
+# Largest frame accepted from a worker
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+# Seconds a new worker may take to report ready
+START_TIMEOUT = 30.0
+
+_DEF = re.compile(r"^(async\s+)?def\s")
+
+# Set in a worker's environment; a SandboxPool created there starts no processes
+WORKER_ENV = "UTILS_SANDBOX_WORKER"
+
+# Parent variables workers inherit by default
+SAFE_ENV = ("PATH", "LANG", "LANGUAGE", "LC_ALL", "LC_CTYPE", "TZ", "TMPDIR", "TEMP", "TMP", "SYSTEMROOT")
+
+
+def in_worker() -> bool:
+    """Whether this process is a sandbox worker."""
+    return os.environ.get(WORKER_ENV) == "1"
+
+
+class SandboxError(RuntimeError):
+    """A sandboxed call did not complete: the worker crashed, hit a limit or timed out."""
+
+
+class ToolError(Exception):
+    """A sandboxed tool raised; ``type_name`` and ``traceback`` describe the remote exception."""
+
+    def __init__(self, type_name: str, message: str, traceback: str = ""):
+        super().__init__(f"{type_name}: {message}")
+        self.type_name = type_name
+        self.traceback = traceback
+
+
+# -- framing -----------------------------------------------------------------
+
+def _encode(message: Any) -> bytes:
+    payload = json.dumps(message, separators=(",", ":"), default=str).encode("utf-8")
+    return _FRAME.pack(len(payload)) + payload
+
+
+def _write(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _read_exact(fd: int, size: int, deadline: Optional[float]) -> Optional[bytes]:
+    """``size`` bytes from ``fd`` (None on EOF); raises TimeoutError past ``deadline``."""
+    chunks = []
+    while size:
+        if deadline is not None and os.name == "posix":
+            import select
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise TimeoutError
+        chunk = os.read(fd, min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_frame(fd: int, deadline: Optional[float] = None) -> Optional[Any]:
+    header = _read_exact(fd, _FRAME.size, deadline)
+    if header is None:
+        return None
+    (size,) = _FRAME.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise SandboxError(f"Worker sent a {size}-byte frame (limit {MAX_FRAME_BYTES})")
+    payload = _read_exact(fd, size, deadline)
+    return None if payload is None else json.loads(payload)
+
+
+# -- parent side ---------------------------------------------------------------
+
+def target_of(fn: Callable) -> Dict[str, str]:
+    """How a worker finds ``fn``: by module reference, or by source for ``__main__`` functions."""
+    fn = inspect.unwrap(fn)
+    module = fn.__module__
+    if module != "__main__" and "<locals>" not in fn.__qualname__:
+        return {"ref": f"{module}:{fn.__qualname__}"}
+    lines = textwrap.dedent(inspect.getsource(fn)).splitlines()
+    start = next(index for index, line in enumerate(lines) if _DEF.match(line))  # drop decorators
+    code = "\n".join(lines[start:]) + "\n"
+    return {"name": fn.__name__, "code": code, "hash": hashlib.sha1(code.encode("utf-8")).hexdigest()[:16]}
+
+
+class _Worker:
+    """One worker process and what the parent knows about it."""
+
+    __slots__ = ("process", "calls", "ready", "sources")
+
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+        self.calls = 0
+        self.ready = False
+        self.sources: Set[str] = set()
+
+    def kill(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            pipe.close()
+
+
+class SandboxPool:
+    """Pre-warmed worker processes that run tool calls with resource limits."""
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_calls: int = 100,
+        cpu_seconds: Optional[float] = 5.0,
+        memory_mb: Optional[int] = 512,
+        timeout: Optional[float] = 30.0,
+        preload: Iterable[str] = (),
+        pass_env: Iterable[str] = (),
+        env: Optional[Dict[str, str]] = None,
+        stats_window: int = 1024,
+    ):
+        """
+        Args:
+            size: Worker processes kept running
+            max_calls: Calls a worker serves before it is replaced
+            cpu_seconds: CPU time allowed per call (None = unlimited)
+            memory_mb: Address-space limit per worker (None = unlimited)
+            timeout: Wall-clock seconds per call before the worker is killed
+            preload: Modules each worker imports at startup
+            pass_env: Names of further parent environment variables workers inherit
+                (by default only PATH, locale and temp-dir variables)
+            env: Extra environment variables for the workers
+            stats_window: Recent call latencies kept for percentiles
+        """
+        if size < 1 or max_calls < 1:
+            raise ValueError("size and max_calls must be at least 1")
+        self.size = size
+        self.max_calls = max_calls
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.preload = list(preload)
+        # Secrets such as ANTHROPIC_API_KEY stay in the parent unless passed on purpose
+        self.env = {name: os.environ[name] for name in (*SAFE_ENV, *pass_env) if name in os.environ}
+        self.env.update(env or {})
+        # Workers import functions by reference from the same paths as the parent
+        self.env["PYTHONPATH"] = os.pathsep.join(path for path in sys.path if path)
+        self.env[WORKER_ENV] = "1"
+        self.inert = in_worker()
+        self._idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._latencies: Deque[float] = deque(maxlen=stats_window)
+        self._counts = {"calls": 0, "errors": 0, "crashes": 0, "timeouts": 0, "recycled": 0, "spawned": 0}
+        if self.inert:
+            return  # importing a module inside a worker must never start more workers
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        command = [sys.executable, "-m", "utils.sandbox", "--worker", json.dumps({
+            "cpu_seconds": self.cpu_seconds, "memory_mb": self.memory_mb, "preload": self.preload,
+        })]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=self.env)
+        with self._lock:
+            self._counts["spawned"] += 1
+        return _Worker(process)
+
+    def _replace(self, worker: _Worker, counter: Optional[str] = None) -> None:
+        """Kill ``worker`` and put a fresh one in the pool."""
+        worker.kill()
+        with self._lock:
+            self._counts["recycled"] += 1
+            if counter:
+                self._counts[counter] += 1
+            closed = self._closed
+        if not closed:
+            self._release(self._spawn())
+
+    def _release(self, worker: _Worker) -> None:
+        """Put ``worker`` back in the pool, or stop it if the pool has been closed."""
+        with self._lock:
+            # Checked under the lock, so close() either drains this worker or it is killed here
+            if not self._closed:
+                self._idle.put(worker)
+                return
+        worker.kill()
+
+    def _crash_reason(self, worker: _Worker) -> str:
+        code = worker.process.wait()
+        if code < 0:
+            import signal
+
+            try:
+                name = signal.Signals(-code).name
+            except ValueError:
+                name = f"signal {-code}"
+            return f"CPU limit of {self.cpu_seconds}s exceeded" if name == "SIGXCPU" else f"killed by {name}"
+        return f"exited with status {code}"
+
+    def _wait_ready(self, worker: _Worker) -> None:
+        message = _read_frame(worker.process.stdout.fileno(), time.monotonic() + START_TIMEOUT)
+        if not message or message[0] != "ready":
+            raise SandboxError(f"Worker failed to start ({self._crash_reason(worker)})")
+        worker.ready = True
+
+    def call(self, fn: Callable, kwargs: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Run ``fn(**kwargs)`` in a worker.
+
+        Returns:
+            The function's result, as decoded from JSON
+
+        Raises:
+            ToolError: The function raised (the worker is kept, unless it was a MemoryError)
+            SandboxError: The worker crashed, exceeded its CPU time or timed out
+        """
+        if self.inert:  # already inside a sandbox worker
+            return inspect.unwrap(fn)(**(kwargs or {}))
+        if self._closed:
+            raise SandboxError("SandboxPool is closed")
+        target = target_of(fn)
+        worker = self._idle.get()
+        try:
+            if not worker.ready:
+                self._wait_ready(worker)
+            started = time.monotonic()  # latency excludes a new worker's startup
+            request: Dict[str, Any] = {"kwargs": kwargs or {}}
+            if "ref" in target:
+                request["ref"] = target["ref"]
+            else:
+                request["source"] = target["hash"]
+                if target["hash"] not in worker.sources:
+                    request.update(name=target["name"], code=target["code"])
+            _write(worker.process.stdin.fileno(), _encode(request))
+            deadline = started + self.timeout if self.timeout is not None else None
+            reply = _read_frame(worker.process.stdout.fileno(), deadline)
+        except TimeoutError:
+            self._replace(worker, "timeouts")
+            raise SandboxError(f"Tool call timed out after {self.timeout}s") from None
+        except (OSError, SandboxError, ValueError) as e:
+            reason = self._crash_reason(worker) if worker.process.poll() is not None else str(e)
+            self._replace(worker, "crashes")
+            raise SandboxError(f"Sandbox worker failed: {reason}") from None
+        if reply is None:
+            reason = self._crash_reason(worker)
+            self._replace(worker, "crashes")
+            raise SandboxError(f"Sandbox worker died: {reason}")
+
+        elapsed = time.monotonic() - started
+        worker.calls += 1
+        if "source" in request:
+            worker.sources.add(request["source"])
+        status = reply.get("status")
+        with self._lock:
+            self._counts["calls"] += 1
+            self._latencies.append(elapsed)
+            if status != "ok":
+                self._counts["errors"] += 1
+        if status == "memory" or worker.calls >= self.max_calls:
+            self._replace(worker)
+        else:
+            self._release(worker)
+        if status == "ok":
+            return reply["result"]
+        raise ToolError(reply.get("type", "Error"), reply.get("message", ""), reply.get("traceback", ""))
+
+    def isolate(self, fn: Callable) -> Callable:
+        """
+        Decorator: calls of ``fn`` run in the pool (keyword arguments only).
+
+        The wrapper keeps ``fn``'s signature and annotations, so a ToolRegistry
+        builds the same schema as for ``fn`` itself.
+        """
+        if not self.inert:
+            target_of(fn)  # fail at decoration time if the function cannot be sent
+
+        @functools.wraps(fn)
+        def sandboxed(**kwargs: Any) -> Any:
+            return self.call(fn, kwargs)
+
+        return sandboxed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Pool metrics.
+
+        Returns:
+            dict: size, idle workers, calls, errors raised by tools, crashes,
+            timeouts, recycled and spawned workers, and call latency p50/p95 in ms
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            report = dict(self._counts, size=self.size, idle=self._idle.qsize())
+        for pct in (50, 95):
+            value = latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))] if latencies else 0.0
+            report[f"latency_p{pct}_ms"] = round(value * 1000, 2)
+        return report
+
+    def close(self) -> None:
+        """Stop every idle worker (workers busy with a call are stopped when it returns)."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            worker.kill()
+
+    def __enter__(self) -> "SandboxPool":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# -- worker side -----------------------------------------------------------------
+
+def _limit_cpu(seconds: Optional[float]) -> None:
+    """Allow ``seconds`` more CPU time from now (SIGXCPU kills the worker past it)."""
+    if resource is None or seconds is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _serve(options: Dict[str, Any]) -> None:
+    """Worker loop: read call frames on stdin, answer on the original stdout."""
+    import asyncio
+    import importlib
+    import traceback
+
+    out = os.dup(1)
+    os.dup2(2, 1)  # print() in tools goes to stderr, not into the protocol stream
+    inp = sys.stdin.fileno()
+
+    for module in options.get("preload") or ():
+        importlib.import_module(module)
+    memory_mb = options.get("memory_mb")
+    if resource is not None and memory_mb:
+        limit = int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+    sources: Dict[str, Callable] = {}
+    _write(out, _encode(["ready", os.getpid()]))
+    while True:
+        request = _read_frame(inp)
+        if request is None:
+            return
+        try:
+            if "ref" in request:
+                module, _, name = request["ref"].partition(":")
+                fn: Any = importlib.import_module(module)
+                for part in name.split("."):
+                    fn = getattr(fn, part)
+                fn = inspect.unwrap(fn)  # the @isolate wrapper would call back into a pool
+            else:
+                fn = sources.get(request["source"])
+                if fn is None:
+                    namespace: Dict[str, Any] = {"__name__": "__sandbox__"}
+                    exec(compile(request["code"], f"<tool {request['name']}>", "exec"), namespace)
+                    fn = sources[request["source"]] = namespace[request["name"]]
+            _limit_cpu(options.get("cpu_seconds"))
+            result = fn(**request["kwargs"])
+            if inspect.iscoroutine(result):
+                result = asyncio.run(result)
+            reply = {"status": "ok", "result": result}
+        except MemoryError:
+            reply = {"status": "memory", "type": "MemoryError", "message": f"memory limit of {memory_mb} MB exceeded"}
+        except Exception as e:
+            reply = {
+                "status": "error", "type": type(e).__name__, "message": str(e),
+                "traceback": "".join(traceback.format_exception(type(e), e, e.__traceback__, limit=-3)),
+            }
+        _write(out, _encode(reply))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+        _serve(json.loads(sys.argv[2]))
+    else:
+        sys.exit("utils.sandbox is started by SandboxPool (python -m utils.sandbox --worker OPTIONS)")
@@ -0,0 +1,219 @@
+"""
+Priority scheduling of API requests across traffic classes.
+
+Interactive chat and bulk jobs often share one API quota. A RequestScheduler
+caps the requests in flight and decides who goes next when a slot frees up,
+so batch work queues behind interactive users instead of competing with them.
+
+Policies:
+    strict:   always serve the highest-priority class that has waiters
+    weighted: share slots in proportion to class weights (stride scheduling),
+              but fall back to strict priority when the top class's queue
+              reaches ``preempt_threshold``, which holds back queued batch work
+
+Usage:
+    from utils import ClaudeClient
+    from utils.scheduler import RequestScheduler
+
+    scheduler = RequestScheduler(max_concurrent=8, policy="weighted", weights={"interactive": 4, "batch": 1})
+    chat = ClaudeClient(scheduler=scheduler)                           # interactive by default
+    jobs = ClaudeClient(scheduler=scheduler, traffic_class="batch")
+
+    chat.chat("Hi!", deadline=10)       # give up if not answered within 10s
+    print(scheduler.stats())            # per-class queue depth, in-flight and wait times
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Sequence
+
+
+DEFAULT_CLASSES = ("interactive", "batch")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request could not start before its deadline."""
+
+
+class _Waiter:
+    __slots__ = ("traffic_class", "deadline", "enqueued", "event", "granted", "expired")
+
+    def __init__(self, traffic_class: str, deadline: Optional[float]):
+        self.traffic_class = traffic_class
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.event = threading.Event()
+        self.granted = False
+        self.expired = False
+
+
+class _ClassStats:
+    __slots__ = ("in_flight", "granted", "expired", "waits")
+
+    def __init__(self, window: int):
+        self.in_flight = 0
+        self.granted = 0
+        self.expired = 0
+        self.waits: Deque[float] = deque(maxlen=window)
+
+
+class RequestScheduler:
+    """Thread-safe admission control with per-class queues."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        classes: Sequence[str] = DEFAULT_CLASSES,
+        policy: str = "strict",
+        weights: Optional[Dict[str, float]] = None,
+        preempt_threshold: Optional[int] = None,
+        stats_window: int = 1024,
+    ):
+        """
+        Args:
+            max_concurrent: Requests allowed in flight across all classes
+            classes: Traffic classes, highest priority first
+            policy: "strict" or "weighted"
+            weights: Share of slots per class for "weighted" (default: 1 each)
+            preempt_threshold: Top-class queue depth at which "weighted" serves
+                it strictly first (default: ``max_concurrent``)
+            stats_window: Recent waits kept per class for percentiles
+        """
+        if policy not in ("strict", "weighted"):
+            raise ValueError(f"policy must be 'strict' or 'weighted', got {policy!r}")
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self.classes = list(classes)
+        self.policy = policy
+        self.weights = {name: float((weights or {}).get(name, 1.0)) for name in self.classes}
+        self.preempt_threshold = preempt_threshold if preempt_threshold is not None else max_concurrent
+        self._queues: Dict[str, Deque[_Waiter]] = {name: deque() for name in self.classes}
+        self._pass: Dict[str, float] = {name: 0.0 for name in self.classes}
+        self._stats: Dict[str, _ClassStats] = {name: _ClassStats(stats_window) for name in self.classes}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _check_class(self, traffic_class: str) -> None:
+        if traffic_class not in self._queues:
+            raise ValueError(f"Unknown traffic class {traffic_class!r} (expected one of {', '.join(self.classes)})")
+
+    def _pick(self) -> Optional[str]:
+        """Class to serve next (lock held)."""
+        active = [name for name in self.classes if self._queues[name]]
+        if not active:
+            return None
+        if self.policy == "strict" or len(self._queues[self.classes[0]]) >= self.preempt_threshold:
+            return active[0]
+        # Stride scheduling: lowest pass wins, each grant advances it by 1/weight
+        floor = min(self._pass[name] for name in active)
+        chosen = min(active, key=lambda name: (self._pass[name], self.classes.index(name)))
+        self._pass[chosen] = max(self._pass[chosen], floor) + 1.0 / self.weights[chosen]
+        return chosen
+
+    def _grant(self, waiter: _Waiter, now: float) -> None:
+        stats = self._stats[waiter.traffic_class]
+        stats.in_flight += 1
+        stats.granted += 1
+        stats.waits.append(now - waiter.enqueued)
+        self._in_flight += 1
+        waiter.granted = True
+        waiter.event.set()
+
+    def _dispatch(self) -> None:
+        """Fill free slots from the queues (lock held)."""
+        now = time.monotonic()
+        while self._in_flight < self.max_concurrent:
+            name = self._pick()
+            if name is None:
+                return
+            waiter = self._queues[name].popleft()
+            if waiter.deadline is not None and waiter.deadline <= now:
+                waiter.expired = True
+                self._stats[name].expired += 1
+                waiter.event.set()
+                continue
+            self._grant(waiter, now)
+
+    def acquire(self, traffic_class: str = DEFAULT_CLASSES[0], timeout: Optional[float] = None) -> float:
+        """
+        Wait for a slot.
+
+        Args:
+            traffic_class: Class of the request
+            timeout: Seconds the request may wait in the queue (None = forever)
+
+        Returns:
+            float: Seconds spent queued
+
+        Raises:
+            DeadlineExceeded: No slot became free within ``timeout``
+        """
+        self._check_class(traffic_class)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        waiter = _Waiter(traffic_class, deadline)
+        with self._lock:
+            if self._in_flight < self.max_concurrent and not any(self._queues.values()):
+                self._grant(waiter, waiter.enqueued)
+                return 0.0
+            self._queues[traffic_class].append(waiter)
+            self._dispatch()
+
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        waiter.event.wait(remaining)
+        with self._lock:
+            if not waiter.granted:
+                if not waiter.expired:
+                    self._queues[traffic_class].remove(waiter)
+                    self._stats[traffic_class].expired += 1
+                raise DeadlineExceeded(f"{traffic_class} request waited {timeout}s without a free slot")
+        return time.monotonic() - waiter.enqueued
+
+    def release(self, traffic_class: str = DEFAULT_CLASSES[0]) -> None:
+        """Free a slot taken with ``acquire`` and hand it to the next waiter."""
+        with self._lock:
+            self._stats[traffic_class].in_flight -= 1
+            self._in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, traffic_class: str = DEFAULT_CLASSES[0], timeout: Optional[float] = None) -> Iterator[float]:
+        """Context manager around ``acquire``/``release``; yields the queued seconds."""
+        waited = self.acquire(traffic_class, timeout)
+        try:
+            yield waited
+        finally:
+            self.release(traffic_class)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Scheduler metrics.
+
+        Returns:
+            dict: in_flight and max_concurrent totals, plus per class: queued
+            (current depth), in_flight, granted, expired and wait p50/p95/max in ms
+        """
+        with self._lock:
+            report: Dict[str, Any] = {"in_flight": self._in_flight, "max_concurrent": self.max_concurrent, "classes": {}}
+            for name in self.classes:
+                stats = self._stats[name]
+                waits = sorted(stats.waits)
+                report["classes"][name] = {
+                    "queued": len(self._queues[name]),
+                    "in_flight": stats.in_flight,
+                    "granted": stats.granted,
+                    "expired": stats.expired,
+                    "wait_p50_ms": _percentile_ms(waits, 50),
+                    "wait_p95_ms": _percentile_ms(waits, 95),
+                    "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+                }
+        return report
+
+
+def _percentile_ms(ordered: Sequence[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index] * 1000, 1)
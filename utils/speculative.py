@@ -0,0 +1,382 @@
+"""
+Speculative prefetch of the next turn in a multi-turn chat.
+
+While the user reads a reply and types the next message, the connection
+sits idle. A SpeculativeChat uses that time to guess the user's next
+message and request its answer early. If the message the user then sends
+matches a guess, the prefetched reply is served without waiting for the API.
+
+Guesses come from two places, best first:
+
+    rules:   (regex, follow-ups) pairs matched against the assistant's latest
+             reply, e.g. a reply ending in "Want an example?" -> "Yes, show me
+             an example". A callable taking the History works too.
+    suggest: an optional call to a cheap model asking for the most likely
+             next user messages (``suggest_model``)
+
+Only the top ``k`` guesses are prefetched, and only while there is spare
+capacity. Speculation is skipped when ``max_inflight`` prefetches are already
+running, when the client's AdaptiveLimiter is close to its limit, or when the
+client's RequestScheduler has no free slot for ``traffic_class``. Prefetches
+are keyed by the conversation state (model, system and the serialized
+history), so a reply is only served for the exact history it was generated
+for. A message matches a guess when the two are equal after lowercasing and
+dropping punctuation and extra whitespace.
+
+Speculation costs tokens. ``stats()`` reports the hit rate and every
+speculative token. Prefetches that were never served count as wasted, and
+suggestion calls are reported as overhead. With a ClaudeClient, real and
+speculative calls all go through its ``create``, so its limiter counts the
+prefetches and its ledger records them (tagged ``speculation=prefetch`` or
+``speculation=suggest``) and applies its budgets.
+
+Usage:
+    from utils import ClaudeClient
+    from utils.speculative import SpeculativeChat
+
+    chat = SpeculativeChat(
+        ClaudeClient(), k=2,
+        rules=[(r"(?i)want (?:me to show )?an example\\?\\s*$", ["Yes, show me an example"])],
+        suggest_model="claude-haiku-4-5-20251001",   # optional: let a cheap model guess too
+    )
+    print(chat.send("How do Python generators work?"))
+    print(chat.send("Yes, show me an example"))     # served from the prefetch if it was guessed
+    print(chat.stats())                              # hits, misses, hit_rate, wasted_tokens...
+    chat.close()
+"""
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .history import History, create_message
+from .scheduler import DeadlineExceeded
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+SUGGEST_PROMPT = (
+    "Here is a conversation between a user and an assistant:\n\n{transcript}\n\n"
+    "Write the {k} messages the user is most likely to send next, most likely first. "
+    "One per line, no numbering, no quotes, nothing else."
+)
+
+# Characters of each turn shown to the suggestion model
+TRANSCRIPT_CHARS = 1500
+
+Rule = Union[Tuple[str, Sequence[str]], Callable[[History], Sequence[str]]]
+
+
+def normalize(text: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form of a message."""
+    return " ".join(_WORD.findall(unicodedata.normalize("NFKC", text).lower()))
+
+
+def _tokens(usage: Any) -> int:
+    return usage.input_tokens + usage.output_tokens
+
+
+class _Prefetch:
+    """One speculative request and what became of it."""
+
+    __slots__ = ("message", "future", "started", "seconds", "tokens", "finished", "served", "dropped")
+
+    def __init__(self, message: str):
+        self.message = message
+        self.future: Optional[Future] = None
+        self.started = time.monotonic()
+        self.seconds = 0.0
+        self.tokens = 0
+        self.finished = False
+        self.served = False
+        self.dropped = False
+
+
+class SpeculativeChat:
+    """A History-backed chat session that prefetches likely next turns with spare capacity."""
+
+    def __init__(
+        self,
+        client: Any,
+        k: int = 2,
+        rules: Sequence[Rule] = (),
+        suggest_model: Optional[str] = None,
+        max_inflight: int = 2,
+        headroom: int = 1,
+        wait_pending: bool = True,
+        traffic_class: str = "batch",
+        history: Optional[History] = None,
+        system: Optional[str] = None,
+        **params: Any,
+    ):
+        """
+        Args:
+            client: ClaudeClient or Anthropic client (sync)
+            k: Guesses prefetched after each reply
+            rules: (regex, follow-ups) pairs searched in the latest reply, or
+                callables taking the History and returning follow-ups
+            suggest_model: Model asked for guesses when the rules give fewer
+                than ``k`` (None = rules only)
+            max_inflight: Speculative requests allowed at once
+            headroom: Limiter slots kept free for real requests
+            wait_pending: On a match whose prefetch is still running, wait for
+                it instead of sending the message again
+            traffic_class: Scheduler class for speculative requests (when the
+                client has a scheduler with that class; otherwise the client's
+                default class). They never queue for a slot.
+            history: Conversation to continue (default: a new History)
+            system: System prompt for every turn
+            **params: Request parameters for every turn (model, max_tokens, temperature...)
+        """
+        if k < 0 or max_inflight < 1:
+            raise ValueError("Need k >= 0 and max_inflight >= 1")
+        self.client = client
+        self.k = k
+        self.rules = [
+            rule if callable(rule) else (re.compile(rule[0]), list(rule[1])) for rule in rules
+        ]
+        self.suggest_model = suggest_model
+        self.max_inflight = max_inflight
+        self.headroom = headroom
+        self.wait_pending = wait_pending
+        self.traffic_class = traffic_class
+        self.history = history if history is not None else History()
+        self.params = dict(params)
+        if system:
+            self.params["system"] = system
+        self.params.setdefault("model", getattr(client, "model", None) or "claude-sonnet-4-20250514")
+        self.params.setdefault("max_tokens", 4096)
+
+        self._state: Optional[str] = None
+        self._prefetches: Dict[str, _Prefetch] = {}
+        self._inflight = 0
+        self._generation = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight + 1, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self._counts = {
+            "turns": 0, "hits": 0, "late_hits": 0, "misses": 0, "prefetched": 0,
+            "skipped_busy": 0, "failed": 0, "speculative_tokens": 0, "wasted_tokens": 0,
+            "suggestion_tokens": 0,
+        }
+        self._saved = 0.0
+
+    # -- conversation --------------------------------------------------------
+
+    def send(self, message: str) -> str:
+        """
+        Send the user's next message and return the reply text.
+
+        The reply comes from a matching prefetch when there is one; either
+        way, guesses for the following turn are then prefetched in the background.
+        """
+        response = self._claim(message)
+        self.history.add_user(message)
+        if response is None:
+            response = self._call(None, messages=self.history, **self.params)
+        self.history.add_assistant(response)
+        self._speculate()
+        return "".join(block.text for block in response.content if block.type == "text")
+
+    def _claim(self, message: str) -> Optional[Any]:
+        """Response of the prefetch matching ``message`` for the current state, or None; drops the rest."""
+        claimed_at = time.monotonic()
+        with self._lock:
+            self._generation += 1
+            self._counts["turns"] += 1
+            prefetches, self._prefetches = self._prefetches, {}
+            prefetch = prefetches.pop(normalize(message), None) if self._state == self._key() else None
+            for other in prefetches.values():
+                self._drop(other)
+            if prefetch is not None and not prefetch.finished and not self.wait_pending:
+                self._drop(prefetch)
+                prefetch = None
+            if prefetch is None:
+                self._counts["misses"] += 1
+                return None
+            prefetch.served = True
+            late = not prefetch.finished
+        try:
+            response = prefetch.future.result()
+        except Exception:
+            with self._lock:
+                self._counts["misses"] += 1
+            return None
+        with self._lock:
+            self._counts["hits"] += 1
+            if late:
+                # Only the head start the prefetch had before the message arrived is saved
+                self._counts["late_hits"] += 1
+                self._saved += claimed_at - prefetch.started
+            else:
+                self._saved += prefetch.seconds
+        return response
+
+    def _drop(self, prefetch: _Prefetch) -> None:
+        """Mark a prefetch unused; its tokens are wasted once it completes (lock held)."""
+        prefetch.dropped = True
+        if prefetch.finished:
+            self._counts["wasted_tokens"] += prefetch.tokens
+
+    def _key(self) -> str:
+        """Conversation state the next prefetch must match (lock not needed: send() owns the history)."""
+        digest = hashlib.sha1(self.history.body(**{k: v for k, v in self.params.items() if k != "timeout"}))
+        return digest.hexdigest()
+
+    # -- speculation ---------------------------------------------------------
+
+    def guesses(self) -> List[str]:
+        """Follow-ups suggested by the rules for the current history, best first."""
+        reply = self.history[-1].text if len(self.history) else ""
+        found: List[str] = []
+        for rule in self.rules:
+            if callable(rule):
+                found.extend(rule(self.history))
+            elif rule[0].search(reply):
+                found.extend(rule[1])
+        return _unique(found)[: self.k]
+
+    def _idle(self) -> bool:
+        """Whether there is capacity to spare for one more speculative request (lock held)."""
+        if self._inflight >= self.max_inflight:
+            return False
+        limiter = getattr(self.client, "limiter", None)
+        return limiter is None or limiter.in_flight + self.headroom < limiter.limit
+
+    def _speculate(self) -> None:
+        if self.k == 0 or (not self.rules and not self.suggest_model):
+            return
+        with self._lock:
+            self._state = self._key()
+            if not self._idle():
+                self._counts["skipped_busy"] += 1
+                return
+            self._inflight += 1
+            generation = self._generation
+        self._pool.submit(self._plan, generation, self.history.copy(), self.guesses())
+
+    def _plan(self, generation: int, history: History, guesses: List[str]) -> None:
+        """Background: complete the guesses with the suggestion model, then prefetch them."""
+        try:
+            if self.suggest_model and len(guesses) < self.k:
+                guesses = _unique(guesses + self._suggest(history))[: self.k]
+        except Exception as e:
+            with self._lock:
+                self._counts["skipped_busy" if isinstance(e, DeadlineExceeded) else "failed"] += 1
+        finally:
+            with self._lock:
+                self._inflight -= 1
+        for guess in guesses:
+            with self._lock:
+                key = normalize(guess)
+                if generation != self._generation or not key or key in self._prefetches:
+                    continue
+                if not self._idle():
+                    self._counts["skipped_busy"] += 1
+                    return
+                self._inflight += 1
+                prefetch = self._prefetches[key] = _Prefetch(guess)
+                prefetch.future = self._pool.submit(self._prefetch, prefetch, history)
+
+    def _suggest(self, history: History) -> List[str]:
+        transcript = "\n\n".join(f"{turn.role.upper()}: {turn.text[:TRANSCRIPT_CHARS]}" for turn in history)
+        response = self._call(
+            "suggest",
+            model=self.suggest_model,
+            max_tokens=60 * self.k,
+            messages=[{"role": "user", "content": SUGGEST_PROMPT.format(transcript=transcript, k=self.k)}],
+        )
+        with self._lock:
+            self._counts["suggestion_tokens"] += _tokens(response.usage)
+        text = "".join(block.text for block in response.content if block.type == "text")
+        return [line.strip(" -*\"'") for line in text.splitlines() if line.strip(" -*\"'")]
+
+    def _prefetch(self, prefetch: _Prefetch, history: History) -> Any:
+        """Background: answer one guess on a copy of the history."""
+        fork = history.copy()
+        fork.add_user(prefetch.message)
+        try:
+            response = self._call("prefetch", messages=fork, **self.params)
+        except Exception as e:
+            with self._lock:
+                self._inflight -= 1
+                self._counts["skipped_busy" if isinstance(e, DeadlineExceeded) else "failed"] += 1
+                prefetch.finished = True
+            raise
+        with self._lock:
+            self._inflight -= 1
+            prefetch.finished = True
+            prefetch.seconds = time.monotonic() - prefetch.started
+            prefetch.tokens = _tokens(response.usage)
+            self._counts["prefetched"] += 1
+            self._counts["speculative_tokens"] += prefetch.tokens
+            if prefetch.dropped:
+                self._counts["wasted_tokens"] += prefetch.tokens
+        return response
+
+    def _call(self, speculation: Optional[str], **params: Any) -> Any:
+        """
+        One request. With a ClaudeClient it goes through ``create``, so the
+        scheduler, limiter and ledger see it. Speculative requests take a
+        ``traffic_class`` slot without queueing (DeadlineExceeded when none is
+        free) and are tagged ``speculation=...`` in the ledger.
+        """
+        if not hasattr(self.client, "chat"):
+            return create_message(self.client, params)
+        if speculation:
+            scheduler = getattr(self.client, "scheduler", None)
+            if scheduler is not None:
+                params["queue_timeout"] = 0
+                if self.traffic_class in scheduler.classes:
+                    params["traffic_class"] = self.traffic_class
+            if getattr(self.client, "ledger", None) is not None:
+                params["tags"] = {"speculation": speculation}
+        return self.client.create(**params)
+
+    # -- reporting -------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Speculation metrics.
+
+        Returns:
+            dict: turns, hits (late_hits among them: served after waiting),
+            misses, hit_rate, prefetched, skipped_busy, failed, seconds_saved,
+            and speculative, wasted and suggestion token counts
+        """
+        with self._lock:
+            turns = self._counts["turns"]
+            return dict(
+                self._counts,
+                hit_rate=round(self._counts["hits"] / turns, 3) if turns else 0.0,
+                seconds_saved=round(self._saved, 3),
+            )
+
+    def close(self) -> None:
+        """Wait for running speculation to finish; unserved prefetches count as wasted."""
+        with self._lock:
+            self._generation += 1
+            for prefetch in self._prefetches.values():
+                self._drop(prefetch)
+            self._prefetches = {}
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "SpeculativeChat":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _unique(messages: Sequence[str]) -> List[str]:
+    """Messages without (normalized) duplicates, order kept."""
+    seen = set()
+    unique = []
+    for message in messages:
+        key = normalize(message)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(message)
+    return unique
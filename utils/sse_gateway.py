@@ -0,0 +1,343 @@
+"""
+Server-sent-events gateway for fanning Claude streams out to browsers.
+
+Each generation makes one upstream streaming request through
+AsyncClaudeClient. Text deltas are coalesced into one SSE frame per flush
+interval and the encoded frame is shared by every subscriber, so a shared
+dashboard with many viewers costs one API call and one encode per frame.
+
+Routes:
+    POST /v1/generations                 start a generation, returns {"id": ...}
+    GET  /v1/generations/{id}/events     subscribe (replays earlier frames; honors Last-Event-ID)
+    POST /v1/stream                      start a generation and subscribe in one request
+    GET  /v1/stats                       gateway counters
+
+Usage:
+    python -m utils.sse_gateway --port 8080 --flush-interval 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from ._http import event_stream_head, json_response, read_request, sse_frame
+
+
+CORS_HEADERS = {"Access-Control-Allow-Origin": "*"}
+
+# Request fields forwarded to AsyncClaudeClient.chat_stream
+GENERATION_FIELDS = ("message", "system", "max_tokens", "temperature")
+
+
+class _Subscriber:
+    __slots__ = ("queue", "overflowed")
+
+    def __init__(self, backlog: int):
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=backlog)
+        self.overflowed = False
+
+
+class Generation:
+    """One upstream stream and the frames it has produced so far."""
+
+    def __init__(self, generation_id: str, params: Dict[str, Any]):
+        self.id = generation_id
+        self.params = params
+        self.frames: List[bytes] = []
+        self.subscribers: Set[_Subscriber] = set()
+        self.done = False
+        self.task: Optional["asyncio.Task[None]"] = None
+        self._pending: List[str] = []
+        self._has_data = asyncio.Event()
+
+    def add_text(self, text: str) -> None:
+        self._pending.append(text)
+        self._has_data.set()
+
+    async def wait_for_text(self) -> None:
+        await self._has_data.wait()
+
+    def publish(self, event: str, data: Any) -> bytes:
+        """Encode a frame once, keep it for late joiners and hand it to every subscriber."""
+        frame = sse_frame(event, data, event_id=len(self.frames))
+        self.frames.append(frame)
+        for sub in list(self.subscribers):
+            self._offer(sub, frame)
+        return frame
+
+    def flush(self) -> Optional[bytes]:
+        """Publish all pending deltas as a single frame."""
+        self._has_data.clear()
+        if not self._pending:
+            return None
+        text = "".join(self._pending)
+        self._pending.clear()
+        return self.publish("delta", {"text": text})
+
+    def finish(self) -> None:
+        self.done = True
+        for sub in list(self.subscribers):
+            self._offer(sub, None)
+
+    def _offer(self, sub: _Subscriber, frame: Optional[bytes]) -> None:
+        try:
+            sub.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Too slow to keep up; drop it rather than buffer without bound
+            sub.overflowed = True
+            self.subscribers.discard(sub)
+
+
+class SSEGateway:
+    """
+    Asyncio HTTP server multiplexing Claude streams to SSE subscribers.
+
+    Usage:
+        gateway = SSEGateway(AsyncClaudeClient(), flush_interval=0.05)
+        await gateway.start("127.0.0.1", 8080)
+        await gateway.serve_forever()
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        flush_interval: float = 0.05,
+        max_concurrent_generations: int = 256,
+        subscriber_backlog: int = 256,
+        retention: float = 60.0,
+        cancel_when_unsubscribed: bool = True,
+    ):
+        """
+        Args:
+            client: AsyncClaudeClient (or compatible) used for upstream requests
+            flush_interval: Seconds to coalesce text deltas into one frame (0 = next loop tick)
+            max_concurrent_generations: Upstream streams allowed in flight; the rest queue
+            subscriber_backlog: Frames buffered per subscriber before it is dropped as too slow
+            retention: Seconds a finished generation stays available for late subscribers
+            cancel_when_unsubscribed: Cancel the upstream stream once its last subscriber leaves
+        """
+        self.client = client
+        self.flush_interval = flush_interval
+        self.subscriber_backlog = subscriber_backlog
+        self.retention = retention
+        self.cancel_when_unsubscribed = cancel_when_unsubscribed
+        self.generations: Dict[str, Generation] = {}
+        self.stats = {
+            "generations_started": 0,
+            "generations_cancelled": 0,
+            "deltas_received": 0,
+            "frames_published": 0,
+            "socket_writes": 0,
+            "bytes_written": 0,
+            "subscribers_dropped": 0,
+        }
+        self._limit = asyncio.Semaphore(max_concurrent_generations)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # ----- generations -----
+
+    def start_generation(self, params: Dict[str, Any]) -> Generation:
+        """Start an upstream stream and return its Generation handle."""
+        if not isinstance(params, dict):
+            raise ValueError("Request body must be a JSON object")
+        message = params.get("message")
+        if not isinstance(message, str) or not message:
+            raise ValueError("'message' must be a non-empty string")
+
+        generation = Generation(uuid.uuid4().hex, {k: params[k] for k in GENERATION_FIELDS if k in params})
+        generation.task = asyncio.ensure_future(self._run(generation))
+        self.generations[generation.id] = generation
+        self.stats["generations_started"] += 1
+        return generation
+
+    async def _flush_loop(self, generation: Generation) -> None:
+        while True:
+            await generation.wait_for_text()
+            await asyncio.sleep(self.flush_interval)
+            generation.flush()
+
+    async def _run(self, generation: Generation) -> None:
+        flusher = asyncio.ensure_future(self._flush_loop(generation))
+        try:
+            async with self._limit:
+                stream = self.client.chat_stream(**generation.params)
+                async with stream:
+                    async for text in stream:
+                        generation.add_text(text)
+                        self.stats["deltas_received"] += 1
+                final = await stream.get_final_message()
+
+            flusher.cancel()
+            generation.flush()
+            generation.publish("done", {
+                "stop_reason": final.stop_reason,
+                "usage": {"input_tokens": final.usage.input_tokens, "output_tokens": final.usage.output_tokens},
+            })
+        except asyncio.CancelledError:
+            self.stats["generations_cancelled"] += 1
+            raise  # after the cleanup below; the task must end up cancelled
+        except Exception as e:
+            flusher.cancel()
+            generation.flush()
+            generation.publish("error", {"type": type(e).__name__, "message": str(e)})
+        finally:
+            flusher.cancel()
+            generation.finish()
+            self.stats["frames_published"] += len(generation.frames)
+            asyncio.get_running_loop().call_later(self.retention, self.generations.pop, generation.id, None)
+
+    # ----- subscribers -----
+
+    async def _subscribe(self, generation: Generation, writer: asyncio.StreamWriter, start: int = 0) -> None:
+        self._write(writer, event_stream_head(CORS_HEADERS) + b"".join(generation.frames[start:]))
+        if generation.done:
+            await writer.drain()
+            return
+
+        sub = _Subscriber(self.subscriber_backlog)
+        generation.subscribers.add(sub)
+        try:
+            finished = False
+            while not finished:
+                frames = [await sub.queue.get()]
+                while not sub.queue.empty():
+                    frames.append(sub.queue.get_nowait())
+                if sub.overflowed:
+                    self.stats["subscribers_dropped"] += 1
+                    break
+                if frames[-1] is None:
+                    frames.pop()
+                    finished = True
+                if frames:
+                    # Everything queued since the last write goes out in one syscall
+                    self._write(writer, b"".join(frames))
+                    await writer.drain()
+        finally:
+            generation.subscribers.discard(sub)
+            if self.cancel_when_unsubscribed and not generation.subscribers and not generation.done and generation.task:
+                generation.task.cancel()
+
+    def _write(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(data)
+        self.stats["socket_writes"] += 1
+        self.stats["bytes_written"] += len(data)
+
+    # ----- HTTP -----
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ValueError as e:
+                    writer.write(json_response(400, {"error": str(e)}, CORS_HEADERS, keep_alive=False))
+                    break
+                if request is None:
+                    break
+
+                streamed = await self._route(request, writer)
+                await writer.drain()
+                if streamed or not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, request: Any, writer: asyncio.StreamWriter) -> bool:
+        """Dispatch one request. Returns True if the response was an event stream."""
+        parts = [p for p in request.path.split("/") if p]
+
+        if request.method == "GET" and parts == ["v1", "stats"]:
+            writer.write(json_response(200, self.get_stats(), CORS_HEADERS))
+            return False
+
+        if request.method == "POST" and parts in (["v1", "generations"], ["v1", "stream"]):
+            try:
+                generation = self.start_generation(request.json())
+            except (ValueError, json.JSONDecodeError) as e:
+                writer.write(json_response(400, {"error": str(e)}, CORS_HEADERS))
+                return False
+            if parts[1] == "stream":
+                await self._subscribe(generation, writer)
+                return True
+            writer.write(json_response(201, {
+                "id": generation.id,
+                "events_url": f"/v1/generations/{generation.id}/events",
+            }, CORS_HEADERS))
+            return False
+
+        if request.method == "GET" and len(parts) == 4 and parts[:2] == ["v1", "generations"] and parts[3] == "events":
+            generation = self.generations.get(parts[2])
+            if generation is None:
+                writer.write(json_response(404, {"error": "Unknown generation"}, CORS_HEADERS))
+                return False
+            last_id = request.headers.get("last-event-id", request.query.get("last_event_id"))
+            start = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+            await self._subscribe(generation, writer, start)
+            return True
+
+        writer.write(json_response(404, {"error": f"No route for {request.method} {request.path}"}, CORS_HEADERS))
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus live generation and subscriber counts."""
+        active = [g for g in self.generations.values() if not g.done]
+        return dict(
+            self.stats,
+            generations_active=len(active),
+            subscribers_active=sum(len(g.subscribers) for g in self.generations.values()),
+        )
+
+    # ----- lifecycle -----
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> int:
+        """Start listening. Returns the bound port."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            raise RuntimeError("Call start() first")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        for generation in self.generations.values():
+            if generation.task and not generation.task.done():
+                generation.task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+def main() -> None:
+    from .client import AsyncClaudeClient
+
+    parser = argparse.ArgumentParser(description="Serve Claude streams to browsers over SSE")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    parser.add_argument("--max-generations", type=int, default=256)
+    parser.add_argument("--base-url", default=None, help="Upstream API base URL (e.g. a mock server)")
+    parser.add_argument("--model", default="claude-sonnet-4-20250514")
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        client = AsyncClaudeClient(model=args.model, base_url=args.base_url)
+        gateway = SSEGateway(client, flush_interval=args.flush_interval, max_concurrent_generations=args.max_generations)
+        port = await gateway.start(args.host, args.port)
+        print(f"SSE gateway listening on http://{args.host}:{port}", flush=True)
+        await gateway.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
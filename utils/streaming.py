@@ -0,0 +1,300 @@
+"""
+Streaming response handles for Claude API calls.
+Wraps the SDK's message stream with cancellation, backpressure and
+access to the final message metadata.
+"""
+
+import queue
+import threading
+import weakref
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+
+_DONE = object()
+
+
+class _StreamState:
+    """
+    What the reader thread shares with its ChatStream. The thread holds only
+    this, never the ChatStream, so an abandoned handle can be garbage
+    collected and its finalizer can close the stream.
+    """
+
+    def __init__(
+        self,
+        stream_manager: Any,
+        buffer_size: int,
+        on_finish: Optional[Callable[[Optional[BaseException]], None]],
+        on_message: Optional[Callable[[Any], None]],
+    ):
+        self.manager = stream_manager
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=buffer_size)
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.stream = None
+        self.final_message = None
+        self.error: Optional[BaseException] = None
+        self.on_finish = on_finish
+        self.on_message = on_message
+
+    def put(self, item: Any) -> bool:
+        """Block until the item is buffered; give up if the stream is cancelled."""
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def pump(self) -> None:
+        try:
+            with self.manager as stream:
+                with self.lock:
+                    self.stream = stream
+                if self.cancelled.is_set():
+                    return
+                for text in stream.text_stream:
+                    if not self.put(text):
+                        return
+                self.final_message = stream.get_final_message()
+            if self.on_message is not None:
+                self.on_message(self.final_message)
+        except BaseException as e:
+            if not self.cancelled.is_set():
+                self.error = e
+        finally:
+            if self.on_finish is not None:
+                self.on_finish(self.error)
+            self.put(_DONE)
+
+    def close(self) -> None:
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+
+        with self.lock:
+            stream = self.stream
+        if stream is not None:
+            stream.close()
+
+        # Unblock any consumer still waiting on the buffer
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self.queue.put_nowait(_DONE)
+        except queue.Full:
+            pass
+
+
+class ChatStream:
+    """
+    Handle for a streaming chat response.
+
+    A background reader pulls text deltas from the SDK stream into a bounded
+    buffer. When the consumer falls behind and the buffer fills, the reader
+    stops pulling from the socket, so a slow consumer throttles the upstream
+    instead of growing memory. Breaking out of iteration (or calling
+    ``close()``) closes the underlying connection immediately. So does
+    dropping the handle without doing either.
+
+    Usage:
+        with client.chat_stream("Write me a poem") as stream:
+            for text in stream:
+                print(text, end="", flush=True)
+
+        final = stream.get_final_message()
+        print(final.usage.output_tokens, final.stop_reason)
+    """
+
+    def __init__(
+        self,
+        stream_manager: Any,
+        buffer_size: int = 64,
+        on_finish: Optional[Callable[[Optional[BaseException]], None]] = None,
+        on_message: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[BaseException], None]] = None,
+    ):
+        """
+        Start reading from a stream.
+
+        Args:
+            stream_manager: Result of ``client.messages.stream(...)``
+            buffer_size: Maximum number of text chunks buffered ahead of the consumer
+            on_finish: Called once the upstream response has ended, failed or been
+                closed, with the error (None on success or cancellation)
+            on_message: Called with the final message when the stream completes
+            on_error: Called once, in the consumer's thread, with an upstream error
+                just before iteration (or ``get_final_message``) raises it
+        """
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be at least 1")
+
+        self._state = _StreamState(stream_manager, buffer_size, on_finish, on_message)
+        self._finished = False
+        self._on_error = on_error
+        self._thread = threading.Thread(target=self._state.pump, name="claude-chat-stream", daemon=True)
+        self._thread.start()
+        weakref.finalize(self, self._state.close)
+
+    def _raise_error(self) -> None:
+        error = self._state.error
+        if error is None:
+            return
+        if self._on_error is not None:
+            on_error, self._on_error = self._on_error, None
+            on_error(error)
+        raise error
+
+    def __iter__(self) -> Iterator[str]:
+        state = self._state
+        try:
+            while not self._finished:
+                item = state.queue.get()
+                if item is _DONE:
+                    self._finished = True
+                    break
+                yield item
+        finally:
+            if not self._finished:
+                self.close()
+
+        self._raise_error()
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        """Iterator over text chunks (mirrors the SDK's ``stream.text_stream``)."""
+        return iter(self)
+
+    def close(self) -> None:
+        """Cancel the stream and close the underlying HTTP connection."""
+        self._state.close()
+
+    @property
+    def cancelled(self) -> bool:
+        """True if the stream was closed before it completed."""
+        return self._state.cancelled.is_set() and self._state.final_message is None
+
+    def get_final_message(self) -> Any:
+        """
+        Get the complete message once the stream has finished.
+
+        Consumes any remaining text first if iteration has not completed.
+
+        Returns:
+            Message: The final SDK message, including ``usage`` and ``stop_reason``
+        """
+        if not self._finished and not self._state.cancelled.is_set():
+            for _ in self:
+                pass
+
+        self._raise_error()
+        if self._state.final_message is None:
+            raise RuntimeError("Stream was cancelled before the final message was received")
+        return self._state.final_message
+
+    def get_final_text(self) -> str:
+        """Get the full response text once the stream has finished."""
+        message = self.get_final_message()
+        return "".join(block.text for block in message.content if block.type == "text")
+
+    def __enter__(self) -> "ChatStream":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class AsyncChatStream:
+    """
+    Async handle for a streaming chat response.
+
+    Text is pulled from the socket only as fast as the consumer iterates, so
+    backpressure is implicit. Leaving the ``async with`` block (or calling
+    ``aclose()``) closes the underlying connection.
+
+    Usage:
+        async with client.chat_stream("Write me a poem") as stream:
+            async for text in stream:
+                print(text, end="", flush=True)
+
+        final = await stream.get_final_message()
+    """
+
+    def __init__(self, stream_manager: Any):
+        """
+        Args:
+            stream_manager: Result of ``async_client.messages.stream(...)``
+        """
+        self._manager = stream_manager
+        self._stream = None
+        self._final_message = None
+        self._closed = False
+
+    async def _open(self) -> Any:
+        if self._closed:
+            raise RuntimeError("Stream is closed")
+        if self._stream is None:
+            self._stream = await self._manager.__aenter__()
+        return self._stream
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        if self._final_message is not None:
+            return
+        stream = await self._open()
+        try:
+            async for text in stream.text_stream:
+                yield text
+            self._final_message = await stream.get_final_message()
+        finally:
+            if self._final_message is None:
+                await self.aclose()
+
+    @property
+    def text_stream(self) -> AsyncIterator[str]:
+        """Async iterator over text chunks (mirrors the SDK's ``stream.text_stream``)."""
+        return self.__aiter__()
+
+    async def aclose(self) -> None:
+        """Cancel the stream and close the underlying HTTP connection."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._stream is not None:
+            await self._stream.close()
+
+    @property
+    def cancelled(self) -> bool:
+        """True if the stream was closed before it completed."""
+        return self._closed and self._final_message is None
+
+    async def get_final_message(self) -> Any:
+        """
+        Get the complete message once the stream has finished.
+
+        Consumes any remaining text first if iteration has not completed.
+
+        Returns:
+            Message: The final SDK message, including ``usage`` and ``stop_reason``
+        """
+        if self._final_message is None and not self._closed:
+            async for _ in self:
+                pass
+        if self._final_message is None:
+            raise RuntimeError("Stream was cancelled before the final message was received")
+        return self._final_message
+
+    async def get_final_text(self) -> str:
+        """Get the full response text once the stream has finished."""
+        message = await self.get_final_message()
+        return "".join(block.text for block in message.content if block.type == "text")
+
+    async def __aenter__(self) -> "AsyncChatStream":
+        await self._open()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
@@ -0,0 +1,329 @@
+"""
+Progressive summaries of text that is still arriving.
+
+Summarizing a long document in one call (or map-reduce with a final reduce
+pass) shows nothing until all the input has been read. With live logs or
+transcripts, the input may never end. A ProgressiveSummarizer keeps a
+rolling summary instead. Incoming text is cut into chunks of about
+``chunk_tokens``, and each chunk is folded into the summary with one call:
+"here is the summary so far and the new text, rewrite the summary". Every
+update is emitted as a SummaryEvent, ready to push to a dashboard.
+
+Each prompt holds at most one summary (capped at ``summary_tokens``) plus one
+chunk. Prompt size and update latency therefore stay constant however much
+text has gone by, and so does the time to the first summary. A partial chunk
+is folded in after ``max_wait`` seconds, so slow streams still update.
+
+Usage:
+    from utils import ClaudeClient
+    from utils.summarizer import ProgressiveSummarizer
+
+    summarizer = ProgressiveSummarizer(ClaudeClient(), chunk_tokens=1500, summary_tokens=400, max_wait=30)
+    for event in summarizer.stream(open("service.log")):        # any iterable of text
+        print(f"[{event.index}] after {event.chars} chars:\\n{event.summary}\\n")
+
+    # asyncio (AsyncClaudeClient), e.g. feeding an SSE endpoint
+    async for event in summarizer.astream(transcript_lines()):
+        await publish(event.to_dict())
+"""
+
+import asyncio
+import inspect
+import time
+from collections import deque
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Union
+
+from .pipeline import CHARS_PER_TOKEN, DEFAULT_MODEL, split_text
+
+SYSTEM_PROMPT = (
+    "You maintain a running summary of a long text that arrives in pieces. "
+    "Merge each new piece into the summary: keep what still matters, add new facts, "
+    "events and decisions, and drop detail that is no longer important."
+)
+
+UPDATE_PROMPT = (
+    "<summary>\n{summary}\n</summary>\n\n<new_text>\n{text}\n</new_text>\n\n"
+    "Rewrite the summary so that it covers everything so far, in at most {words} words. "
+    "Reply with the summary only."
+)
+
+FIRST_PROMPT = (
+    "<new_text>\n{text}\n</new_text>\n\n"
+    "Summarize this text in at most {words} words. More text will follow. Reply with the summary only."
+)
+
+_DONE = object()
+
+
+class SummaryEvent:
+    """One update of the rolling summary."""
+
+    __slots__ = ("index", "summary", "chars", "chunk_chars", "seconds", "elapsed", "final")
+
+    def __init__(self, index: int, summary: str, chars: int, chunk_chars: int, seconds: float, elapsed: float,
+                 final: bool = False):
+        self.index = index
+        self.summary = summary
+        self.chars = chars
+        self.chunk_chars = chunk_chars
+        self.seconds = seconds
+        self.elapsed = elapsed
+        self.final = final
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready form (e.g. for an SSE ``data:`` line)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"SummaryEvent(index={self.index}, chars={self.chars}, final={self.final})"
+
+
+class _Chunker:
+    """Cuts appended text into chunks of about ``max_chars``, at paragraph/line/sentence breaks."""
+
+    __slots__ = ("max_chars", "buffer", "since")
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.buffer = ""
+        self.since: Optional[float] = None
+
+    def add(self, text: str) -> List[str]:
+        if not text:
+            return []
+        if not self.buffer:
+            self.since = time.monotonic()
+        self.buffer += text
+        if len(self.buffer) < self.max_chars:
+            return []
+        pieces = split_text(self.buffer, self.max_chars)
+        # The last piece may still grow; keep it buffered unless it is full
+        if pieces and len(pieces[-1]) < self.max_chars:
+            self.buffer = self.buffer[self.buffer.rfind(pieces[-1]):]
+            pieces = pieces[:-1]
+        else:
+            self.buffer = ""
+        self.since = time.monotonic() if self.buffer else None
+        return pieces
+
+    def due(self, max_wait: Optional[float]) -> bool:
+        """Whether the buffered text has waited ``max_wait`` seconds."""
+        return max_wait is not None and self.since is not None and time.monotonic() - self.since >= max_wait
+
+    def flush(self) -> Optional[str]:
+        text, self.buffer, self.since = self.buffer.strip(), "", None
+        return text or None
+
+
+class ProgressiveSummarizer:
+    """Rolling summary over a stream of text, updated per chunk with a bounded prompt."""
+
+    def __init__(
+        self,
+        client: Any = None,
+        chunk_tokens: int = 1500,
+        summary_tokens: int = 400,
+        max_wait: Optional[float] = None,
+        system: str = SYSTEM_PROMPT,
+        model: Optional[str] = None,
+        summary: str = "",
+        buffer: int = 4,
+        **params: Any,
+    ):
+        """
+        Args:
+            client: ClaudeClient / AsyncClaudeClient (limiter, ledger and scheduler
+                apply) or Anthropic / AsyncAnthropic (default: a ClaudeClient)
+            chunk_tokens: New text folded into the summary per update
+            summary_tokens: Upper bound on the summary (its max_tokens)
+            max_wait: Fold in a partial chunk once its oldest text has waited this
+                many seconds (None = only full chunks and the end of the stream)
+            system: System prompt for the updates
+            model: Model for the updates (default: the client's)
+            summary: Summary to continue from (e.g. saved from an earlier run)
+            buffer: Chunks ``astream`` reads ahead while an update is running
+            **params: Further Messages API parameters (temperature, ...)
+        """
+        if chunk_tokens < 1 or summary_tokens < 1 or buffer < 1:
+            raise ValueError("chunk_tokens, summary_tokens and buffer must be at least 1")
+        if client is None:
+            from .client import ClaudeClient
+
+            client = ClaudeClient()
+        self.client = client
+        self.chunk_chars = chunk_tokens * CHARS_PER_TOKEN
+        self.summary_tokens = summary_tokens
+        self.max_wait = max_wait
+        self.system = system
+        self.model = model
+        self.buffer = buffer
+        self.params = params
+        self.summary = summary
+        self.updates = 0
+        self.chars = 0
+        self._busy = 0.0
+
+    # -- one update --------------------------------------------------------------
+
+    def _prompt(self, text: str) -> str:
+        words = int(self.summary_tokens * 0.6)
+        if not self.summary:
+            return FIRST_PROMPT.format(text=text, words=words)
+        return UPDATE_PROMPT.format(summary=self.summary, text=text, words=words)
+
+    def _request(self, text: str) -> Any:
+        """The API call for one update (a coroutine for async clients)."""
+        chat = getattr(self.client, "chat", None)
+        if chat is not None:
+            extra = dict(self.params, **({"model": self.model} if self.model else {}))
+            return chat(self._prompt(text), system=self.system, max_tokens=self.summary_tokens, **extra)
+        return self.client.messages.create(
+            **self.params,
+            model=self.model or DEFAULT_MODEL,
+            max_tokens=self.summary_tokens,
+            system=self.system,
+            messages=[{"role": "user", "content": self._prompt(text)}],
+        )
+
+    def _apply(self, reply: Any, text: str, started: float, origin: float) -> SummaryEvent:
+        if not isinstance(reply, str):
+            reply = "".join(block.text for block in reply.content if block.type == "text")
+        seconds = time.monotonic() - started
+        self.summary = reply.strip()
+        self.updates += 1
+        self.chars += len(text)
+        self._busy += seconds
+        return SummaryEvent(self.updates, self.summary, self.chars, len(text), round(seconds, 3),
+                            round(time.monotonic() - origin, 3))
+
+    def update(self, text: str) -> SummaryEvent:
+        """Fold ``text`` into the summary (one call, sync clients)."""
+        started = time.monotonic()
+        return self._apply(self._request(text), text, started, started)
+
+    async def aupdate(self, text: str) -> SummaryEvent:
+        """Async ``update`` (AsyncClaudeClient / AsyncAnthropic)."""
+        started = time.monotonic()
+        return self._apply(await self._request(text), text, started, started)
+
+    def _final(self, origin: float) -> SummaryEvent:
+        return SummaryEvent(self.updates, self.summary, self.chars, 0, 0.0, round(time.monotonic() - origin, 3), True)
+
+    # -- streams -----------------------------------------------------------------
+
+    def stream(self, texts: Iterable[str]) -> Iterator[SummaryEvent]:
+        """
+        Summarize text as it arrives; yields an event per update, then a final one.
+
+        Args:
+            texts: Pieces of text (lines of a file, transcript segments...), read lazily
+
+        Yields:
+            SummaryEvent: The summary after each chunk; the last has ``final=True``
+        """
+        origin = time.monotonic()
+        chunker = _Chunker(self.chunk_chars)
+        for text in texts:
+            chunks = chunker.add(text)
+            if not chunks and chunker.due(self.max_wait):
+                chunks = [chunk for chunk in (chunker.flush(),) if chunk]
+            for chunk in chunks:
+                started = time.monotonic()
+                yield self._apply(self._request(chunk), chunk, started, origin)
+        rest = chunker.flush()
+        if rest:
+            started = time.monotonic()
+            yield self._apply(self._request(rest), rest, started, origin)
+        yield self._final(origin)
+
+    async def astream(self, texts: Union[AsyncIterable[str], Iterable[str]]) -> AsyncIterator[SummaryEvent]:
+        """
+        Async ``stream``. Input is read ahead while an update runs, into a
+        queue of at most ``buffer`` chunks. ``max_wait`` also fires while the
+        input is idle. Plain iterables other than lists and tuples (files,
+        generators) are read in a worker thread, so they cannot block the loop.
+        """
+        origin = time.monotonic()
+        chunks: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=self.buffer)
+        reader = asyncio.ensure_future(self._read(texts, chunks))
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is _DONE:
+                    break
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                started = time.monotonic()
+                reply = self._request(chunk)
+                if inspect.isawaitable(reply):
+                    reply = await reply
+                yield self._apply(reply, chunk, started, origin)
+            yield self._final(origin)
+        finally:
+            reader.cancel()
+
+    async def _read(self, texts: Union[AsyncIterable[str], Iterable[str]], chunks: "asyncio.Queue[Any]") -> None:
+        """Feed chunks of ``texts`` into ``chunks``, flushing partial ones after ``max_wait``."""
+        iterator = texts.__aiter__() if hasattr(texts, "__aiter__") else _aiter(texts)
+        chunker = _Chunker(self.chunk_chars)
+        pending: Optional["asyncio.Future[Any]"] = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                timeout = None
+                if self.max_wait is not None and chunker.since is not None:
+                    timeout = max(0.0, chunker.since + self.max_wait - time.monotonic())
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:  # input is idle: fold in what has waited long enough
+                    rest = chunker.flush()
+                    if rest:
+                        await chunks.put(rest)
+                    continue
+                try:
+                    text = pending.result()
+                except StopAsyncIteration:
+                    break
+                pending = None
+                for chunk in chunker.add(text):
+                    await chunks.put(chunk)
+            rest = chunker.flush()
+            if rest:
+                await chunks.put(rest)
+            await chunks.put(_DONE)
+        except asyncio.CancelledError:
+            if pending is not None:
+                pending.cancel()
+            raise
+        except Exception as e:  # surface source errors in astream
+            await chunks.put(e)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Summarizer metrics.
+
+        Returns:
+            dict: updates, chars summarized, summary length in chars, and
+            average update latency in seconds
+        """
+        return {
+            "updates": self.updates,
+            "chars": self.chars,
+            "summary_chars": len(self.summary),
+            "update_seconds": round(self._busy / self.updates, 3) if self.updates else 0.0,
+        }
+
+
+async def _aiter(items: Iterable[str]) -> AsyncIterator[str]:
+    iterator = iter(items)
+    if isinstance(items, (list, tuple, deque)):
+        for item in iterator:
+            yield item
+        return
+    # Files, tails and socket readers may block: read them in a worker thread, off the event loop
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(None, next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
@@ -0,0 +1,598 @@
+"""
+Tool registry: JSON schemas from type hints, validated inputs, async tools.
+
+Hand-written tool schemas drift from the functions they describe, and
+``func(**tool_input)`` only fails deep inside the tool, after a full round
+trip. A ToolRegistry builds each tool's ``input_schema`` from its signature
+and docstring once, when the tool is registered, and compiles a validator for
+it at the same time. Tool calls are checked (and numbers, enums and lists
+coerced) before the function runs. A bad input comes back to Claude as an
+``is_error`` tool result it can correct, instead of an exception.
+
+The tool list is built once and the same list object is reused for every
+request. It always serializes to the same bytes, so a prompt-cache prefix
+that covers the tools keeps hitting (``cache_control=True`` marks the last
+tool as a cache breakpoint).
+
+Coroutine functions are awaited directly on the running event loop. Plain
+functions run inline, or in the loop's executor if registered with
+``blocking=True``.
+
+Supported annotations: str, int, float, bool, None, Any, Optional/Union,
+Literal, Enum subclasses, list/List[X]/Sequence[X]/tuple, dict/Dict[str, X]
+and TypedDict. Parameter descriptions come from the docstring's ``Args:``
+section, or from ``Annotated[X, "description"]``.
+
+Usage:
+    from typing import Literal
+    from utils import ToolRegistry
+
+    tools = ToolRegistry(cache_control=True)
+
+    @tools.tool
+    def get_weather(location: str, unit: Literal["celsius", "fahrenheit"] = "celsius") -> dict:
+        \"\"\"
+        Get the current weather for a location.
+
+        Args:
+            location: The city and state, e.g. San Francisco, CA
+            unit: The temperature unit
+        \"\"\"
+        ...
+
+    @tools.tool(name="search_docs")
+    async def search(query: str, limit: int = 5) -> list:
+        ...
+
+    response = client.messages.create(model=..., max_tokens=1024, tools=tools.tools, messages=...)
+    results, errors = tools.execute(response)            # or: await tools.aexecute(response)
+    history.add_tool_results(results, errors)
+"""
+
+import asyncio
+import collections.abc
+import enum
+import functools
+import inspect
+import json
+import re
+import typing
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+try:  # Python 3.9+
+    from typing import Annotated
+except ImportError:
+    Annotated = None
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", type(None): "null"}
+
+_SECTION = re.compile(r"^\s*(Args|Arguments|Parameters|Returns|Raises|Yields|Examples?|Usage):\s*$")
+_ARG_LINE = re.compile(r"^\s*(\*{0,2}\w+)\s*(?:\([^)]*\))?\s*:\s*(.*)$")
+
+
+class ToolInputError(ValueError):
+    """A tool call named an unknown tool or had input that does not match its schema."""
+
+    def __init__(self, tool: str, problems: Sequence[str]):
+        self.tool = tool
+        self.problems = list(problems)
+        super().__init__(f"Invalid input for {tool}: " + "; ".join(self.problems))
+
+
+class _Invalid(Exception):
+    pass
+
+
+# Validator: value -> validated (possibly coerced) value, raising _Invalid
+Check = Callable[[Any], Any]
+
+
+def _type_name(value: Any) -> str:
+    for python_type, name in JSON_TYPES.items():
+        if type(value) is python_type:
+            return name
+    return "array" if isinstance(value, list) else "object" if isinstance(value, dict) else type(value).__name__
+
+
+def _any(value: Any) -> Any:
+    return value
+
+
+def _check_str(value: Any) -> str:
+    if not isinstance(value, str):
+        raise _Invalid(f"expected string, got {_type_name(value)}")
+    return value
+
+
+def _check_bool(value: Any) -> bool:
+    if not isinstance(value, bool):
+        raise _Invalid(f"expected boolean, got {_type_name(value)}")
+    return value
+
+
+def _check_int(value: Any) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise _Invalid(f"expected integer, got {_type_name(value)}")
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise _Invalid(f"expected integer, got {value}")
+        return int(value)
+    return value
+
+
+def _check_number(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise _Invalid(f"expected number, got {_type_name(value)}")
+    return value
+
+
+def _check_none(value: Any) -> None:
+    if value is not None:
+        raise _Invalid(f"expected null, got {_type_name(value)}")
+    return None
+
+
+SCALARS = {str: _check_str, bool: _check_bool, int: _check_int, float: _check_number, type(None): _check_none}
+
+
+def _unwrap(annotation: Any) -> Tuple[Any, Optional[str]]:
+    """(type, description) for ``Annotated[type, "description", ...]``; other annotations as-is."""
+    if Annotated is not None and typing.get_origin(annotation) is Annotated:
+        base, *extras = typing.get_args(annotation)
+        return base, next((extra for extra in extras if isinstance(extra, str)), None)
+    return annotation, None
+
+
+def compile_type(annotation: Any) -> Tuple[Dict[str, Any], Check]:
+    """
+    JSON schema and validator for a type annotation.
+
+    Raises:
+        TypeError: The annotation has no JSON equivalent
+    """
+    annotation, description = _unwrap(annotation)
+    schema, check = _compile(annotation)
+    if description:
+        schema = dict(schema, description=description)
+    return schema, check
+
+
+def _compile(annotation: Any) -> Tuple[Dict[str, Any], Check]:
+    if annotation is Any or annotation is inspect.Parameter.empty:
+        return {}, _any
+    if annotation in SCALARS:
+        return {"type": JSON_TYPES[annotation]}, SCALARS[annotation]
+    if inspect.isclass(annotation) and issubclass(annotation, enum.Enum):
+        return _compile_enum(annotation)
+    if _is_typeddict(annotation):
+        return _compile_typeddict(annotation)
+
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin is Union:
+        return _compile_union(args)
+    if origin is typing.Literal:
+        return _compile_literal(args)
+    if annotation in (list, tuple) or origin in (list, tuple, collections.abc.Sequence):
+        if origin is tuple and len(args) == 2 and args[1] is Ellipsis:
+            args = args[:1]
+        elif origin is tuple and args:
+            raise TypeError(f"Fixed-length tuples are not supported as tool inputs: {annotation!r}")
+        return _compile_array(args[0] if args else Any)
+    if annotation is dict or origin is dict:
+        if args and args[0] is not str:
+            raise TypeError(f"Tool input objects need string keys: {annotation!r}")
+        return _compile_mapping(args[1] if args else Any)
+    raise TypeError(f"No JSON schema for tool input type {annotation!r}")
+
+
+def _compile_enum(cls: type) -> Tuple[Dict[str, Any], Check]:
+    members = {member.value: member for member in cls}
+    values = list(members)
+
+    def check(value: Any) -> Any:
+        if isinstance(value, cls):
+            return value
+        try:
+            return members[value]
+        except (KeyError, TypeError):
+            raise _Invalid(f"expected one of {values}, got {value!r}") from None
+
+    return {"enum": values}, check
+
+
+def _compile_literal(values: Sequence[Any]) -> Tuple[Dict[str, Any], Check]:
+    allowed = list(values)
+    schema: Dict[str, Any] = {"enum": allowed}
+    types = {JSON_TYPES.get(type(value)) for value in allowed}
+    if len(types) == 1 and None not in types:
+        schema = {"type": types.pop(), "enum": allowed}
+
+    def check(value: Any) -> Any:
+        # bool is an int subclass: compare types too, so True never matches 1
+        if any(value == option and type(value) is type(option) for option in allowed):
+            return value
+        raise _Invalid(f"expected one of {allowed}, got {value!r}")
+
+    return schema, check
+
+
+def _compile_union(members: Sequence[Any]) -> Tuple[Dict[str, Any], Check]:
+    compiled = [_compile(member) for member in members if member is not type(None)]
+    nullable = len(compiled) < len(members)
+    if len(compiled) == 1 and nullable:
+        # Optional[X]: X's schema; null is still accepted
+        schema, inner = compiled[0]
+        return schema, lambda value: None if value is None else inner(value)
+    schemas = [schema for schema, _ in compiled] + ([{"type": "null"}] if nullable else [])
+    checks = [check for _, check in compiled]
+
+    def check(value: Any) -> Any:
+        if value is None and nullable:
+            return None
+        problems = []
+        for candidate in checks:
+            try:
+                return candidate(value)
+            except _Invalid as e:
+                problems.append(str(e))
+        raise _Invalid(" or ".join(problems))
+
+    return {"anyOf": schemas}, check
+
+
+def _compile_array(item: Any) -> Tuple[Dict[str, Any], Check]:
+    items, check_item = compile_type(item)
+
+    def check(value: Any) -> List[Any]:
+        if not isinstance(value, list):
+            raise _Invalid(f"expected array, got {_type_name(value)}")
+        if check_item is _any:
+            return value
+        checked = []
+        for index, element in enumerate(value):
+            try:
+                checked.append(check_item(element))
+            except _Invalid as e:
+                raise _Invalid(f"[{index}]: {e}") from None
+        return checked
+
+    return ({"type": "array", "items": items} if items else {"type": "array"}), check
+
+
+def _compile_mapping(value_type: Any) -> Tuple[Dict[str, Any], Check]:
+    values, check_value = compile_type(value_type)
+
+    def check(value: Any) -> Dict[str, Any]:
+        if not isinstance(value, dict):
+            raise _Invalid(f"expected object, got {_type_name(value)}")
+        if check_value is _any:
+            return value
+        checked = {}
+        for key, element in value.items():
+            try:
+                checked[key] = check_value(element)
+            except _Invalid as e:
+                raise _Invalid(f"{key}: {e}") from None
+        return checked
+
+    return ({"type": "object", "additionalProperties": values} if values else {"type": "object"}), check
+
+
+def _is_typeddict(annotation: Any) -> bool:
+    return inspect.isclass(annotation) and issubclass(annotation, dict) and hasattr(annotation, "__total__")
+
+
+def _compile_typeddict(cls: type) -> Tuple[Dict[str, Any], Check]:
+    hints = _hints(cls)
+    required = getattr(cls, "__required_keys__", set(hints) if cls.__total__ else set())
+    fields = {name: compile_type(hint) for name, hint in hints.items()}
+    schema = _object_schema({name: field[0] for name, field in fields.items()}, [name for name in hints if name in required])
+    validate = _object_check({name: field[1] for name, field in fields.items()}, required)
+
+    def check(value: Any) -> Dict[str, Any]:
+        if not isinstance(value, dict):
+            raise _Invalid(f"expected object, got {_type_name(value)}")
+        problems, checked = validate(value)
+        if problems:
+            raise _Invalid(", ".join(problems))
+        return checked
+
+    return schema, check
+
+
+def _object_schema(properties: Dict[str, Dict[str, Any]], required: List[str]) -> Dict[str, Any]:
+    schema: Dict[str, Any] = {"type": "object", "properties": properties}
+    if required:
+        schema["required"] = required
+    return schema
+
+
+def _object_check(checks: Dict[str, Check], required: Any) -> Callable[[Dict[str, Any]], Tuple[List[str], Dict[str, Any]]]:
+    """Validator for an object's fields: (problems, checked fields)."""
+    required = [name for name in checks if name in required]
+
+    def validate(value: Dict[str, Any]) -> Tuple[List[str], Dict[str, Any]]:
+        problems = [f"{name}: required" for name in required if name not in value]
+        checked = {}
+        for key, element in value.items():
+            check = checks.get(key)
+            if check is None:
+                problems.append(f"{key}: unexpected field")
+                continue
+            try:
+                checked[key] = check(element)
+            except _Invalid as e:
+                problems.append(f"{key}: {e}")
+        return problems, checked
+
+    return validate
+
+
+def _hints(obj: Any) -> Dict[str, Any]:
+    try:
+        return typing.get_type_hints(obj, include_extras=True)
+    except TypeError:  # Python 3.8: no include_extras (and no Annotated)
+        return typing.get_type_hints(obj)
+
+
+def parse_docstring(doc: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """(description, argument descriptions) from a Google-style docstring."""
+    lines = inspect.cleandoc(doc or "").splitlines()
+    sections: Dict[str, List[str]] = {"": []}
+    name = ""
+    for line in lines:
+        header = _SECTION.match(line)
+        if header:
+            name = header.group(1)
+            sections[name] = []
+        else:
+            sections[name].append(line)
+
+    arguments: Dict[str, str] = {}
+    body = sections.get("Args") or sections.get("Arguments") or sections.get("Parameters") or []
+    indent = min((len(line) - len(line.lstrip()) for line in body if line.strip()), default=0)
+    current = None
+    for line in body:
+        match = _ARG_LINE.match(line) if len(line) - len(line.lstrip()) == indent else None
+        if match:
+            current = match.group(1).lstrip("*")
+            arguments[current] = match.group(2).strip()
+        elif current is not None and line.strip():
+            arguments[current] = f"{arguments[current]} {line.strip()}".strip()
+    return "\n".join(sections[""]).strip(), arguments
+
+
+class Tool:
+    """One registered function with its definition and compiled input validator."""
+
+    __slots__ = ("name", "description", "fn", "definition", "is_async", "blocking", "_validate", "_takes_kwargs")
+
+    def __init__(self, fn: Callable, name: Optional[str] = None, description: Optional[str] = None, blocking: bool = False):
+        """
+        Args:
+            fn: The function (or coroutine function) to expose
+            name: Tool name (default: the function's name)
+            description: Tool description (default: the docstring, up to its Args section)
+            blocking: Run a plain function in the event loop's executor from ``acall``
+
+        Raises:
+            TypeError: A parameter's annotation has no JSON equivalent, or the
+                function takes positional-only or ``*args`` parameters
+        """
+        self.fn = fn
+        self.name = name or fn.__name__
+        self.is_async = inspect.iscoroutinefunction(fn)
+        self.blocking = blocking
+        doc_description, doc_arguments = parse_docstring(fn.__doc__)
+        self.description = description or doc_description or self.name
+
+        hints = _hints(fn)
+        properties: Dict[str, Dict[str, Any]] = {}
+        checks: Dict[str, Check] = {}
+        required: List[str] = []
+        self._takes_kwargs = False
+        for parameter in inspect.signature(fn).parameters.values():
+            if parameter.kind == parameter.VAR_KEYWORD:
+                self._takes_kwargs = True
+                continue
+            if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.VAR_POSITIONAL):
+                raise TypeError(f"Tool {self.name}: parameter {parameter.name} cannot be passed by keyword")
+            try:
+                schema, check = compile_type(hints.get(parameter.name, Any))
+            except TypeError as e:
+                raise TypeError(f"Tool {self.name}, parameter {parameter.name}: {e}") from None
+            if parameter.name in doc_arguments and "description" not in schema:
+                schema = dict(schema, description=doc_arguments[parameter.name])
+            if parameter.default is parameter.empty:
+                required.append(parameter.name)
+            elif parameter.default is not None and _is_json(parameter.default):
+                schema = dict(schema, default=parameter.default)
+            properties[parameter.name] = schema
+            checks[parameter.name] = check
+        self._validate = _object_check(checks, set(required))
+        self.definition = {
+            "name": self.name,
+            "description": self.description,
+            "input_schema": _object_schema(properties, required),
+        }
+
+    def validate(self, arguments: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Check a tool call's input against the schema.
+
+        Returns:
+            dict: Keyword arguments for the function (numbers, enums and lists coerced)
+
+        Raises:
+            ToolInputError: Missing, unexpected or mistyped fields (all of them listed)
+        """
+        if not isinstance(arguments, dict):
+            raise ToolInputError(self.name, [f"expected an object, got {_type_name(arguments)}"])
+        problems, checked = self._validate(arguments)
+        if self._takes_kwargs:
+            problems = [problem for problem in problems if not problem.endswith(": unexpected field")]
+            checked.update((key, value) for key, value in arguments.items() if key not in checked)
+        if problems:
+            raise ToolInputError(self.name, problems)
+        return checked
+
+    def __call__(self, arguments: Optional[Dict[str, Any]]) -> Any:
+        """Validate and run (coroutine tools are run to completion with ``asyncio.run``)."""
+        result = self.fn(**self.validate(arguments))
+        return asyncio.run(result) if self.is_async else result
+
+    async def acall(self, arguments: Optional[Dict[str, Any]]) -> Any:
+        """Validate and run on the event loop (blocking tools in its executor)."""
+        kwargs = self.validate(arguments)
+        if self.is_async:
+            return await self.fn(**kwargs)
+        if self.blocking:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(self.fn, **kwargs))
+        return self.fn(**kwargs)
+
+    def __repr__(self) -> str:
+        return f"Tool({self.name!r})"
+
+
+def _is_json(value: Any) -> bool:
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+class ToolRegistry:
+    """Named tools with cached definitions, for ``tools=`` and for running tool_use blocks."""
+
+    def __init__(self, cache_control: bool = False, catch: bool = True):
+        """
+        Args:
+            cache_control: Mark the last tool as a prompt-cache breakpoint
+            catch: ``execute``/``aexecute`` turn exceptions raised by tools into
+                error results (bad inputs always are)
+        """
+        self.cache_control = cache_control
+        self.catch = catch
+        self._tools: Dict[str, Tool] = {}
+        self._definitions: Optional[List[Dict[str, Any]]] = None
+
+    def tool(
+        self,
+        fn: Optional[Callable] = None,
+        *,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        blocking: bool = False,
+    ) -> Callable:
+        """
+        Decorator registering a function as a tool; the function is returned unchanged.
+
+        Usage:
+            @tools.tool
+            def add(a: float, b: float) -> float: ...
+
+            @tools.tool(name="lookup", blocking=True)
+            def lookup_customer(customer_id: str) -> dict: ...
+        """
+        def register(function: Callable) -> Callable:
+            self.add(Tool(function, name, description, blocking))
+            return function
+
+        return register(fn) if fn is not None else register
+
+    def add(self, tool: Tool) -> Tool:
+        """Register a Tool (replacing one of the same name)."""
+        self._tools[tool.name] = tool
+        self._definitions = None
+        return tool
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __getitem__(self, name: str) -> Tool:
+        return self._tools[name]
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    @property
+    def tools(self) -> List[Dict[str, Any]]:
+        """
+        Tool definitions for the ``tools`` request parameter.
+
+        Built once and then the same list until a tool is added; do not mutate it.
+        """
+        if self._definitions is None:
+            definitions = [tool.definition for tool in self._tools.values()]
+            if self.cache_control and definitions:
+                definitions[-1] = dict(definitions[-1], cache_control={"type": "ephemeral"})
+            self._definitions = definitions
+        return self._definitions
+
+    def _get(self, name: str) -> Tool:
+        tool = self._tools.get(name)
+        if tool is None:
+            raise ToolInputError(name, [f"unknown tool (available: {', '.join(self._tools) or 'none'})"])
+        return tool
+
+    def call(self, name: str, arguments: Optional[Dict[str, Any]]) -> Any:
+        """Validate and run one tool call."""
+        return self._get(name)(arguments)
+
+    async def acall(self, name: str, arguments: Optional[Dict[str, Any]]) -> Any:
+        """Async ``call``: coroutine tools are awaited on the running loop."""
+        return await self._get(name).acall(arguments)
+
+    def execute(self, response: Any) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Run every tool_use block of a response, in order.
+
+        Args:
+            response: A Message, or its content blocks
+
+        Returns:
+            tuple: (tool_use id -> result, ids whose result is an error message),
+            ready for ``History.add_tool_results``
+        """
+        results: Dict[str, Any] = {}
+        errors: List[str] = []
+        for block in _tool_uses(response):
+            try:
+                results[block.id] = self.call(block.name, block.input)
+            except Exception as e:
+                if not (self.catch or isinstance(e, ToolInputError)):
+                    raise
+                results[block.id] = _error_text(e)
+                errors.append(block.id)
+        return results, errors
+
+    async def aexecute(self, response: Any) -> Tuple[Dict[str, Any], List[str]]:
+        """Async ``execute``: the response's tool calls run concurrently."""
+        blocks = _tool_uses(response)
+        outcomes = await asyncio.gather(
+            *(self.acall(block.name, block.input) for block in blocks), return_exceptions=True
+        )
+        results: Dict[str, Any] = {}
+        errors: List[str] = []
+        for block, outcome in zip(blocks, outcomes):
+            if isinstance(outcome, BaseException):
+                if not isinstance(outcome, Exception) or not (self.catch or isinstance(outcome, ToolInputError)):
+                    raise outcome
+                results[block.id] = _error_text(outcome)
+                errors.append(block.id)
+            else:
+                results[block.id] = outcome
+        return results, errors
+
+
+def _tool_uses(response: Any) -> List[Any]:
+    content = getattr(response, "content", response)
+    return [block for block in content if getattr(block, "type", None) == "tool_use"]
+
+
+def _error_text(error: Exception) -> str:
+    if isinstance(error, ToolInputError):
+        return f"{error} - fix the input and call the tool again."
+    return f"{type(error).__name__}: {error}"